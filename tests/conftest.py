@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+# De modules staan plat in de hoofdmap van de repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import thuisbatterij_testdata
+from thuisbatterij_calculator import ThuisbatterijCalculator
+
+
+@pytest.fixture(scope='session')
+def p1_csv(tmp_path_factory):
+    """Twee weken synthetische P1 data per minuut, met weekenden en zonne-overschot."""
+    pad = tmp_path_factory.mktemp('data') / 'p1.csv'
+    thuisbatterij_testdata.genereer_p1_csv(str(pad), dagen=14, interval=60, start='2024-04-15', seed=1)
+    return str(pad)
+
+
+@pytest.fixture
+def maak_calculator():
+    """Maak een calculator zonder de caches in de thuismap; instellingen gaan als keywords mee."""
+    def maak(csv_file, laden=True, **instellingen):
+        calculator = ThuisbatterijCalculator(csv_file)
+        calculator.cache_map = None
+        calculator.resultaat_cache = None
+        for naam, waarde in instellingen.items():
+            setattr(calculator, naam, waarde)
+        if laden:
+            assert calculator.laad_data()
+        return calculator
+    return maak
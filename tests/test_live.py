@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import thuisbatterij_live
+
+
+CAPACITEITEN = [3, 5, 10]
+
+
+def draai_bestand(csv_file, simulatie, checkpoint=None):
+    bron = {'soort': 'csv', 'adres': csv_file}
+    batches = thuisbatterij_live.open_bron('csv', csv_file, simulatie.positie, volgen=False)
+    thuisbatterij_live.draai(simulatie, batches, checkpoint, bron)
+    return bron
+
+
+def test_hervatten_gelijk_aan_een_doorlopende_simulatie(p1_csv, tmp_path):
+    doorlopend = thuisbatterij_live.LiveSimulatie(CAPACITEITEN)
+    draai_bestand(p1_csv, doorlopend)
+
+    # Eerst een deel van het bestand, midden in een dag; de rest komt pas na de herstart
+    with open(p1_csv, 'r', encoding='utf-8') as f:
+        regels = f.readlines()
+    csv_file = str(tmp_path / 'live.csv')
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    with open(csv_file, 'w', encoding='utf-8') as f:
+        f.writelines(regels[:len(regels) // 2 + 137])
+    eerste = thuisbatterij_live.LiveSimulatie(CAPACITEITEN)
+    bron = draai_bestand(csv_file, eerste, checkpoint)
+
+    with open(csv_file, 'a', encoding='utf-8') as f:
+        f.writelines(regels[len(regels) // 2 + 137:])
+    hervat = thuisbatterij_live.LiveSimulatie.herstel(checkpoint, CAPACITEITEN, bron=bron)
+    assert hervat.aantal == eerste.aantal
+    draai_bestand(csv_file, hervat, checkpoint)
+
+    assert hervat.aantal == doorlopend.aantal
+    assert hervat.periode_uren == pytest.approx(doorlopend.periode_uren)
+    np.testing.assert_allclose(hervat.lading, doorlopend.lading, rtol=1e-9, atol=1e-9)
+    for emmer, waarden in doorlopend.energie_met_batterij.items():
+        np.testing.assert_allclose(hervat.energie_met_batterij[emmer], waarden, rtol=1e-9, atol=1e-9)
+        assert hervat.energie_zonder_batterij[emmer] == pytest.approx(
+            doorlopend.energie_zonder_batterij[emmer], rel=1e-9, abs=1e-9)
+
+
+def test_live_gelijk_aan_simulatie_van_het_bestand(p1_csv, maak_calculator):
+    simulatie = thuisbatterij_live.LiveSimulatie(CAPACITEITEN)
+    draai_bestand(p1_csv, simulatie)
+
+    calculator = maak_calculator(p1_csv)
+    calculator.simuleer_batterij(CAPACITEITEN)
+    resultaten = simulatie.resultaten()
+    for capaciteit in CAPACITEITEN:
+        assert resultaten[capaciteit]['jaarlijkse_besparing'] == pytest.approx(
+            calculator.batterij_resultaten[capaciteit]['jaarlijkse_besparing'], rel=1e-9)
+
+
+def test_checkpoint_met_andere_instellingen_wordt_geweigerd(p1_csv, tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    draai_bestand(p1_csv, thuisbatterij_live.LiveSimulatie(CAPACITEITEN), checkpoint)
+    with pytest.raises(ValueError, match='laad_efficiëntie'):
+        thuisbatterij_live.LiveSimulatie.herstel(checkpoint, CAPACITEITEN, {'laad_efficiëntie': 0.8})
@@ -0,0 +1,61 @@
+import shutil
+
+import pytest
+
+import thuisbatterij_resultaatcache
+import thuisbatterij_testdata
+
+
+CAPACITEITEN = [3, 5]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return thuisbatterij_resultaatcache.ResultaatCache(str(tmp_path / 'resultaten'))
+
+
+def simuleer(maak_calculator, csv_file, cache, **instellingen):
+    calculator = maak_calculator(csv_file, **instellingen)
+    calculator.resultaat_cache = cache
+    calculator.simuleer_batterij(CAPACITEITEN)
+    return calculator.batterij_resultaten
+
+
+def besparing(resultaten):
+    return [resultaten[capaciteit]['jaarlijkse_besparing'] for capaciteit in CAPACITEITEN]
+
+
+def test_zelfde_data_en_instellingen_uit_cache(p1_csv, maak_calculator, cache):
+    eerste = simuleer(maak_calculator, p1_csv, cache)
+    assert (cache.hits, cache.misses) == (0, len(CAPACITEITEN))
+
+    tweede = simuleer(maak_calculator, p1_csv, cache)
+    assert (cache.hits, cache.misses) == (len(CAPACITEITEN), len(CAPACITEITEN))
+    assert besparing(tweede) == pytest.approx(besparing(eerste), rel=1e-12)
+    # Uit de cache komen alleen de totalen, geen tijdreeksen
+    assert all(tweede[capaciteit]['batterij_laadstatus'] is None for capaciteit in CAPACITEITEN)
+
+
+def test_andere_efficiëntie_wordt_opnieuw_gesimuleerd(p1_csv, maak_calculator, cache):
+    simuleer(maak_calculator, p1_csv, cache)
+    resultaten = simuleer(maak_calculator, p1_csv, cache, laad_efficiëntie=0.8)
+    assert cache.hits == 0
+
+    zonder_cache = maak_calculator(p1_csv, laad_efficiëntie=0.8)
+    zonder_cache.simuleer_batterij(CAPACITEITEN)
+    assert besparing(resultaten) == pytest.approx(besparing(zonder_cache.batterij_resultaten), rel=1e-12)
+
+
+def test_gewijzigd_bestand_wordt_opnieuw_gesimuleerd(p1_csv, maak_calculator, cache, tmp_path):
+    csv_file = str(tmp_path / 'p1.csv')
+    shutil.copyfile(p1_csv, csv_file)
+    simuleer(maak_calculator, csv_file, cache)
+
+    # Zelfde pad en lengte, andere metingen
+    thuisbatterij_testdata.genereer_p1_csv(csv_file, dagen=14, interval=60, start='2024-04-15', seed=2)
+    resultaten = simuleer(maak_calculator, csv_file, cache)
+    assert cache.hits == 0
+
+    zonder_cache = maak_calculator(csv_file)
+    zonder_cache.simuleer_batterij(CAPACITEITEN)
+    assert besparing(resultaten) == pytest.approx(besparing(zonder_cache.batterij_resultaten), rel=1e-12)
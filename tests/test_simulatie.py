@@ -0,0 +1,123 @@
+import importlib.util
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+BACKENDS = ['numpy', pytest.param('numba', marks=pytest.mark.skipif(
+    importlib.util.find_spec('numba') is None, reason="numba is niet geïnstalleerd"))]
+
+CAPACITEITEN = [3, 5, 10]
+
+
+def originele_lus(csv_file, capaciteit, tarief_dag, tarief_nacht, teruglever_tarief, laad_efficiëntie):
+    """De oorspronkelijke simulatie rij voor rij, rechtstreeks op het CSV bestand."""
+    data = pd.read_csv(csv_file, parse_dates=['time'])
+    totaal_import = (data['Import T1 kWh'].diff().fillna(0) + data['Import T2 kWh'].diff().fillna(0)).to_numpy()
+    totaal_export = (data['Export T1 kWh'].diff().fillna(0) + data['Export T2 kWh'].diff().fillna(0)).to_numpy()
+    is_dagtarief = ((data['time'].dt.hour >= 7) & (data['time'].dt.hour < 23)).to_numpy()
+
+    batterij_lading = capaciteit * 0.5
+    laadstatus = []
+    originele_kosten = 0.0
+    nieuwe_kosten = 0.0
+    for importeer, exporteer, dag in zip(totaal_import, totaal_export, is_dagtarief):
+        tarief = tarief_dag if dag else tarief_nacht
+        originele_kosten += importeer * tarief - exporteer * teruglever_tarief
+        netto_verbruik = importeer - exporteer
+        if netto_verbruik > 0:
+            energie_uit_batterij = min(netto_verbruik, batterij_lading)
+            batterij_lading -= energie_uit_batterij
+            nieuwe_kosten += (netto_verbruik - energie_uit_batterij) * tarief
+        else:
+            energie_naar_batterij = min(-netto_verbruik * laad_efficiëntie, capaciteit - batterij_lading)
+            batterij_lading += energie_naar_batterij
+            nieuwe_kosten -= (-netto_verbruik - energie_naar_batterij / laad_efficiëntie) * teruglever_tarief
+        laadstatus.append(batterij_lading)
+    return np.array(laadstatus), originele_kosten - nieuwe_kosten
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_kern_gelijk_aan_originele_lus(p1_csv, maak_calculator, backend):
+    calculator = maak_calculator(p1_csv, simulatie_backend=backend)
+    calculator.simuleer_batterij(CAPACITEITEN)
+
+    for capaciteit in CAPACITEITEN:
+        laadstatus, besparing = originele_lus(
+            p1_csv, capaciteit, calculator.tarief_dag, calculator.tarief_nacht,
+            calculator.teruglever_tarief, calculator.laad_efficiëntie
+        )
+        resultaat = calculator.batterij_resultaten[capaciteit]
+        np.testing.assert_allclose(resultaat['batterij_laadstatus'], laadstatus, rtol=0, atol=1e-9)
+        assert resultaat['jaarlijkse_besparing'] == pytest.approx(besparing, rel=1e-9)
+
+
+def test_backends_gelijk_met_vermogensgrenzen(p1_csv, maak_calculator):
+    pytest.importorskip('numba')
+    resultaten = {}
+    for backend in ('numpy', 'numba'):
+        calculator = maak_calculator(p1_csv, simulatie_backend=backend, laadvermogen=0.8,
+                                     ontlaadvermogen=1.2, c_rate=0.25, standby_vermogen=0.01)
+        calculator.simuleer_batterij(CAPACITEITEN)
+        resultaten[backend] = calculator.batterij_resultaten
+
+    for capaciteit in CAPACITEITEN:
+        np.testing.assert_allclose(resultaten['numba'][capaciteit]['batterij_laadstatus'],
+                                   resultaten['numpy'][capaciteit]['batterij_laadstatus'], rtol=0, atol=1e-9)
+        assert resultaten['numba'][capaciteit]['jaarlijkse_besparing'] == pytest.approx(
+            resultaten['numpy'][capaciteit]['jaarlijkse_besparing'], rel=1e-9)
+
+
+def test_streaming_gelijk_aan_in_geheugen(p1_csv, maak_calculator):
+    in_geheugen = maak_calculator(p1_csv)
+    in_geheugen.simuleer_batterij(CAPACITEITEN)
+
+    # Een blokgrootte die niet op een dag of tariefgrens valt, zodat de lading over blokken doorloopt
+    streaming = maak_calculator(p1_csv, laden=False)
+    assert streaming.simuleer_batterij_streaming(CAPACITEITEN, blokgrootte=3001)
+
+    for capaciteit in CAPACITEITEN:
+        verwacht = in_geheugen.batterij_resultaten[capaciteit]
+        resultaat = streaming.batterij_resultaten[capaciteit]
+        assert resultaat['jaarlijkse_besparing'] == pytest.approx(verwacht['jaarlijkse_besparing'], rel=1e-9)
+        for emmer, waarde in verwacht['energie']['met_batterij'].items():
+            assert resultaat['energie']['met_batterij'][emmer] == pytest.approx(waarde, rel=1e-9, abs=1e-9)
+
+
+def test_herprijs_gelijk_aan_nieuwe_simulatie(p1_csv, maak_calculator):
+    tarieven = {'tarief_dag': 0.40, 'tarief_nacht': 0.21, 'teruglever_tarief': 0.04,
+                'batterij_kosten_per_kwh': 300, 'batterij_levensduur': 12}
+    herprijsd = maak_calculator(p1_csv)
+    herprijsd.simuleer_batterij(CAPACITEITEN)
+    herprijsd.herprijs(**tarieven)
+
+    nieuw = maak_calculator(p1_csv, **tarieven)
+    nieuw.simuleer_batterij(CAPACITEITEN)
+
+    for capaciteit in CAPACITEITEN:
+        for naam in ('jaarlijkse_besparing', 'terugverdientijd', 'totale_besparing_levensduur'):
+            assert herprijsd.batterij_resultaten[capaciteit][naam] == pytest.approx(
+                nieuw.batterij_resultaten[capaciteit][naam], rel=1e-12)
+        # De laadstatus blijft geldig, de kostenreeksen horen bij de oude tarieven
+        assert herprijsd.batterij_resultaten[capaciteit]['batterij_laadstatus'] is not None
+        assert herprijsd.batterij_resultaten[capaciteit]['nieuwe_kosten'] is None
+
+
+def test_herprijs_met_andere_indeling_simuleert_opnieuw(p1_csv, maak_calculator):
+    kalender = {
+        'banden': ['piek', 'dal'],
+        'standaard': 'dal',
+        'regels': [{'band': 'piek', 'dagen': 'werkdag', 'van': '17:00', 'tot': '21:00'}],
+        'prijzen': {'piek': 0.45, 'dal': 0.22},
+    }
+    herprijsd = maak_calculator(p1_csv)
+    herprijsd.simuleer_batterij(CAPACITEITEN)
+    herprijsd.herprijs(tarief_kalender=kalender)
+
+    nieuw = maak_calculator(p1_csv, tarief_kalender=kalender)
+    nieuw.simuleer_batterij(CAPACITEITEN)
+
+    for capaciteit in CAPACITEITEN:
+        assert herprijsd.batterij_resultaten[capaciteit]['jaarlijkse_besparing'] == pytest.approx(
+            nieuw.batterij_resultaten[capaciteit]['jaarlijkse_besparing'], rel=1e-12)
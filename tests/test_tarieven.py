@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+import thuisbatterij_tarieven
+
+
+def oude_regel(tijden):
+    """De oorspronkelijke dag/nacht regel: dagtarief van 7 tot 23 uur, elke dag."""
+    uren = pd.DatetimeIndex(tijden).hour
+    return np.where((uren >= 7) & (uren < 23), 0, 1)
+
+
+def test_standaardkalender_volgt_de_oude_regel():
+    # Drie weken per 5 minuten, met weekenden, Pasen en een zomertijdovergang
+    tijden = pd.date_range('2024-03-25', '2024-04-15', freq='5min').to_numpy()
+    np.testing.assert_array_equal(thuisbatterij_tarieven.STANDAARD_KALENDER.tariefband(tijden), oude_regel(tijden))
+
+
+def test_tariefbanden_van_de_data_volgen_de_oude_regel(p1_csv, maak_calculator):
+    calculator = maak_calculator(p1_csv)
+    np.testing.assert_array_equal(calculator.tariefbanden(), oude_regel(calculator.data['time']))
+
+
+def test_weekend_en_feestdagen():
+    kalender = thuisbatterij_tarieven.TariefKalender({
+        'banden': ['dag', 'nacht'],
+        'standaard': 'nacht',
+        'regels': [{'band': 'dag', 'dagen': 'werkdag', 'van': '07:00', 'tot': '23:00'}],
+        'feestdagen': 'nl',
+    })
+    verwacht = {
+        '2024-12-23 12:00': 'dag',     # maandag
+        '2024-12-23 06:45': 'nacht',   # maandag voor 7 uur
+        '2024-12-23 23:00': 'nacht',   # maandag vanaf 23 uur
+        '2024-12-21 12:00': 'nacht',   # zaterdag
+        '2024-12-22 12:00': 'nacht',   # zondag
+        '2024-12-25 12:00': 'nacht',   # eerste kerstdag, een woensdag
+        '2025-04-21 12:00': 'nacht',   # tweede paasdag
+        '2025-04-26 12:00': 'nacht',   # Koningsdag valt op zondag en wordt op zaterdag gevierd
+        '2025-04-28 12:00': 'dag',     # de maandag erna is een gewone werkdag
+    }
+    tijden = np.array(list(verwacht), dtype='datetime64[ns]')
+    banden = [kalender.banden[band] for band in kalender.tariefband(tijden)]
+    assert dict(zip(verwacht, banden)) == verwacht
+
+
+def test_perioden_vanaf_een_datum():
+    kalender = thuisbatterij_tarieven.TariefKalender({
+        'banden': ['dag', 'nacht'],
+        'standaard': 'nacht',
+        'regels': [{'band': 'dag', 'van': '07:00', 'tot': '23:00'}],
+        'perioden': [{'vanaf': '2025-01-01', 'regels': []}],
+    })
+    tijden = np.array(['2024-12-31 12:00', '2025-01-01 12:00'], dtype='datetime64[ns]')
+    # Na de grens geldt de tweede periode, met alleen de standaardband
+    assert [kalender.import_emmers[band] for band in kalender.tariefband(tijden)] == [
+        'import_dag', 'import_nacht_2025-01-01']
@@ -0,0 +1,343 @@
+import numpy as np
+
+import thuisbatterij_simulatie
+
+
+def netto_afname(netto_verbruik, laadstatus, begin_lading, laad_efficiëntie):
+    """
+    Bereken de netto afname van het net per interval bij een gegeven laadstatus.
+
+    Laden kost 1/efficiëntie keer zoveel energie van het net als er in de batterij komt,
+    ontladen vermindert de afname verliesvrij.
+
+    Parameters:
+    netto_verbruik (ndarray): Import min export per interval zonder batterij in kWh.
+    laadstatus (ndarray): Lading van de batterij na elk interval in kWh.
+    begin_lading (float): Lading voor het eerste interval in kWh.
+    laad_efficiëntie (float): Laadefficiëntie (0-1).
+
+    Returns:
+    ndarray: Netto afname (positief = import, negatief = export) in kWh.
+    """
+    verschil = np.diff(np.concatenate(([begin_lading], laadstatus)))
+    return netto_verbruik + np.where(verschil > 0, verschil / laad_efficiëntie, verschil)
+
+
+def prijs_afname(afname, import_prijs, export_prijs):
+    """
+    Bereken de kosten van een netto afname met prijzen per interval.
+
+    Parameters:
+    afname (ndarray): Netto afname per interval in kWh.
+    import_prijs (ndarray): Prijs per kWh import per interval (€).
+    export_prijs (ndarray): Vergoeding per kWh export per interval (€).
+
+    Returns:
+    ndarray: Kosten per interval (€).
+    """
+    return np.where(afname > 0, afname * import_prijs, afname * export_prijs)
+
+
+def _buiten_rooster(netto, lading, capaciteit, laad_efficiëntie, max_laden, max_ontladen):
+    """
+    Volgende ladingen buiten de vaste niveaus: precies het netto verbruik opvangen (de
+    standaard strategie), met vol vermogen laden en met vol vermogen ontladen.
+    """
+    verschil = -netto if netto > 0 else -netto * laad_efficiëntie
+    verschil = min(max(verschil, -max_ontladen), max_laden)
+    return [np.clip(lading + stap, 0.0, capaciteit) for stap in (verschil, max_laden, -max_ontladen)]
+
+
+def _stapkosten(netto, huidige, volgende, import_prijs, export_prijs, laad_efficiëntie):
+    """Kosten van een interval bij een overgang van de huidige naar de volgende lading."""
+    verschil = volgende - huidige
+    afname = netto + np.where(verschil > 0, verschil / laad_efficiëntie, verschil)
+    return np.where(afname > 0, afname * import_prijs, afname * export_prijs)
+
+
+def _dispatch_lus(netto_verbruik, import_prijs, export_prijs, max_laden, max_ontladen, capaciteit,
+                  laad_efficiëntie, begin_lading, niveaus, horizon, vastleggen, laadstatus):
+    """
+    Rollende horizon met een expliciete lus over niveaus, bedoeld voor numba.
+
+    Rekent hetzelfde als _dispatch_numpy() en schrijft het schema in laadstatus.
+    """
+    aantal = netto_verbruik.shape[0]
+    stappen = niveaus.shape[0]
+    waarde = np.zeros((horizon + 1, stappen))
+    lading = begin_lading
+
+    # Extra afname per overgang, rij = huidige lading, kolom = volgende lading
+    extra_afname = np.empty((stappen, stappen))
+    for i in range(stappen):
+        for j in range(stappen):
+            verschil = niveaus[j] - niveaus[i]
+            extra_afname[i, j] = verschil / laad_efficiëntie if verschil > 0 else verschil
+    afstand = niveaus[1] - niveaus[0] if stappen > 1 else 0.0
+
+    for begin in range(0, aantal, vastleggen):
+        eind = min(begin + horizon, aantal)
+
+        # Achterwaarts: waardefunctie per interval, waarde[t - begin] geldt na interval t - 1
+        waarde[eind - begin, :] = 0.0
+        for t in range(eind - 1, begin - 1, -1):
+            netto = netto_verbruik[t]
+            volgen_verschil = -netto if netto > 0 else -netto * laad_efficiëntie
+            volgen_verschil = min(max(volgen_verschil, -max_ontladen[t]), max_laden[t])
+            # Alleen niveaus binnen het vermogen (met een niveau marge, de grens zelf wordt exact getoetst)
+            omhoog, omlaag = stappen, stappen
+            if afstand > 0:
+                omhoog = int(min(max_laden[t] / afstand, stappen)) + 1
+                omlaag = int(min(max_ontladen[t] / afstand, stappen)) + 1
+            for i in range(stappen):
+                laagste = max(i - omlaag, 0)
+                while niveaus[i] - niveaus[laagste] > max_ontladen[t] + 1e-12:
+                    laagste += 1
+                hoogste = min(i + omhoog, stappen - 1)
+                while niveaus[hoogste] - niveaus[i] > max_laden[t] + 1e-12:
+                    hoogste -= 1
+                beste = np.inf
+                for j in range(laagste, hoogste + 1):
+                    afname = netto + extra_afname[i, j]
+                    kosten = max(afname, 0.0) * import_prijs[t] + min(afname, 0.0) * export_prijs[t]
+                    beste = min(beste, kosten + waarde[t - begin + 1, j])
+
+                # Verbruik volgen, vol laden en vol ontladen buiten het rooster om
+                for optie in range(3):
+                    verschil = (volgen_verschil, max_laden[t], -max_ontladen[t])[optie]
+                    volgend = min(max(niveaus[i] + verschil, 0.0), capaciteit)
+                    verschil = volgend - niveaus[i]
+                    afname = netto + (verschil / laad_efficiëntie if verschil > 0 else verschil)
+                    kosten = afname * import_prijs[t] if afname > 0 else afname * export_prijs[t]
+
+                    # Lineaire interpolatie zoals np.interp, maar zonder zoeken op het gelijkmatige rooster
+                    if volgend >= niveaus[stappen - 1]:
+                        kosten += waarde[t - begin + 1, stappen - 1]
+                    elif volgend <= niveaus[0]:
+                        kosten += waarde[t - begin + 1, 0]
+                    else:
+                        k = min(int(volgend / afstand), stappen - 2)
+                        while k > 0 and niveaus[k] > volgend:
+                            k -= 1
+                        while niveaus[k + 1] <= volgend:
+                            k += 1
+                        helling = (waarde[t - begin + 1, k + 1] - waarde[t - begin + 1, k]) / (niveaus[k + 1] - niveaus[k])
+                        kosten += helling * (volgend - niveaus[k]) + waarde[t - begin + 1, k]
+                    beste = min(beste, kosten)
+                waarde[t - begin, i] = beste
+
+        # Voorwaarts: kies per interval de beste overgang vanuit de exacte lading
+        for t in range(begin, min(begin + vastleggen, aantal)):
+            netto = netto_verbruik[t]
+            volgen_verschil = -netto if netto > 0 else -netto * laad_efficiëntie
+            volgen_verschil = min(max(volgen_verschil, -max_ontladen[t]), max_laden[t])
+            beste = np.inf
+            keuze = lading
+            for j in range(stappen + 3):
+                if j < stappen:
+                    kandidaat = niveaus[j]
+                else:
+                    verschil = (volgen_verschil, max_laden[t], -max_ontladen[t])[j - stappen]
+                    kandidaat = min(max(lading + verschil, 0.0), capaciteit)
+                verschil = kandidaat - lading
+                if j < stappen and (verschil > max_laden[t] + 1e-12 or -verschil > max_ontladen[t] + 1e-12):
+                    continue
+                afname = netto + (verschil / laad_efficiëntie if verschil > 0 else verschil)
+                kosten = afname * import_prijs[t] if afname > 0 else afname * export_prijs[t]
+                if j < stappen:
+                    kosten += waarde[t - begin + 1, j]
+                else:
+                    kosten += np.interp(kandidaat, niveaus, waarde[t - begin + 1])
+                if kosten < beste:
+                    beste = kosten
+                    keuze = kandidaat
+            lading = keuze
+            laadstatus[t] = lading
+
+
+def _dispatch_numpy(netto_verbruik, import_prijs, export_prijs, max_laden, max_ontladen, capaciteit,
+                    laad_efficiëntie, begin_lading, niveaus, horizon, vastleggen, laadstatus):
+    """Rollende horizon met alle overgangen tussen niveaus tegelijk, zonder numba."""
+    aantal = len(netto_verbruik)
+    stappen = len(niveaus)
+
+    # Overgangen tussen niveaus: rij = huidige lading, kolom = volgende lading
+    verschil = niveaus[None, :] - niveaus[:, None]
+    extra_afname = np.where(verschil > 0, verschil / laad_efficiëntie, verschil)
+
+    lading = begin_lading
+
+    for begin in range(0, aantal, vastleggen):
+        eind = min(begin + horizon, aantal)
+
+        # Achterwaarts: waardefunctie per interval, waarde[t - begin] geldt na interval t - 1
+        waarde = np.zeros((eind - begin + 1, stappen))
+        for t in range(eind - 1, begin - 1, -1):
+            volgende_waarde = waarde[t - begin + 1]
+            afname = netto_verbruik[t] + extra_afname
+            kosten = np.where(afname > 0, afname * import_prijs[t], afname * export_prijs[t])
+            buiten_bereik = (verschil > max_laden[t] + 1e-12) | (-verschil > max_ontladen[t] + 1e-12)
+            kosten[buiten_bereik] = np.inf
+            beste = np.min(kosten + volgende_waarde[None, :], axis=1)
+
+            # Verbruik volgen, vol laden en vol ontladen buiten het rooster om
+            for volgend in _buiten_rooster(netto_verbruik[t], niveaus, capaciteit, laad_efficiëntie,
+                                           max_laden[t], max_ontladen[t]):
+                volgen = _stapkosten(netto_verbruik[t], niveaus, volgend, import_prijs[t], export_prijs[t], laad_efficiëntie)
+                beste = np.minimum(beste, volgen + np.interp(volgend, niveaus, volgende_waarde))
+            waarde[t - begin] = beste
+
+        # Voorwaarts: kies per interval de beste overgang vanuit de exacte lading
+        for t in range(begin, min(begin + vastleggen, aantal)):
+            volgende_waarde = waarde[t - begin + 1]
+            kandidaten = niveaus[(niveaus - lading <= max_laden[t] + 1e-12) & (lading - niveaus <= max_ontladen[t] + 1e-12)]
+            kandidaten = np.append(kandidaten, _buiten_rooster(netto_verbruik[t], lading, capaciteit, laad_efficiëntie,
+                                                               max_laden[t], max_ontladen[t]))
+            totaal = _stapkosten(netto_verbruik[t], lading, kandidaten, import_prijs[t], export_prijs[t], laad_efficiëntie)
+            totaal += np.interp(kandidaten, niveaus, volgende_waarde)
+            lading = float(kandidaten[np.argmin(totaal)])
+            laadstatus[t] = lading
+
+
+_numba_kernels = {}
+
+
+def _numba_kernel():
+    """Compileer de dispatch kernel bij het eerste gebruik (uit de cache van numba als die er is)."""
+    if 'dispatch' not in _numba_kernels:
+        import numba
+        _numba_kernels['dispatch'] = numba.njit(cache=True, nogil=True)(_dispatch_lus)
+    return _numba_kernels['dispatch']
+
+
+def optimaliseer_dispatch(netto_verbruik, import_prijs, export_prijs, capaciteit, laad_efficiëntie,
+                          begin_lading=None, stappen=51, horizon=192, vastleggen=96, max_stap=None,
+                          backend='auto', vermogen=None):
+    """
+    Bepaal het laad- en ontlaadschema met de laagste kosten via dynamisch programmeren.
+
+    De waardefunctie (minimale kosten tot het einde van de horizon) wordt berekend op een
+    aantal vaste ladingsniveaus, met een gecompileerde lus (numba) of met alle overgangen
+    tussen niveaus tegelijk (NumPy); beide geven hetzelfde schema.
+    Naast de overgangen naar een niveau zijn altijd ook het precies opvangen van het netto
+    verbruik en laden of ontladen met vol vermogen een keuze, met lineair geïnterpoleerde
+    waarde; zo is de standaard strategie altijd mogelijk, ook als een interval of het
+    vermogen minder energie toelaat dan de afstand tussen niveaus.
+    Het schema zelf wordt met de exacte (niet afgeronde) lading doorlopen.
+
+    Er wordt met een rollende horizon gewerkt: steeds 'horizon' intervallen vooruitkijken
+    en alleen de eerste 'vastleggen' intervallen vastleggen. Bij kwartierdata staan de
+    standaardwaarden voor twee dagen vooruitkijken en een dag vastleggen. De batterij mag
+    ook van het net laden en aan het net leveren als dat loont.
+
+    Parameters:
+    netto_verbruik (ndarray): Import min export per interval zonder batterij in kWh.
+    import_prijs (ndarray): Prijs per kWh import per interval (€).
+    export_prijs (ndarray): Vergoeding per kWh export per interval (€).
+    capaciteit (float): Capaciteit van de batterij in kWh.
+    laad_efficiëntie (float): Laadefficiëntie (0-1).
+    begin_lading (float, optional): Lading bij de start, standaard 50% van de capaciteit.
+    stappen (int): Aantal ladingsniveaus van de waardefunctie.
+    horizon (int): Aantal intervallen dat vooruit wordt gekeken.
+    vastleggen (int): Aantal intervallen dat per horizon wordt vastgelegd.
+    max_stap (float, optional): Maximale verandering van de lading per interval in kWh.
+    backend (str): 'auto', 'numba' of 'numpy', zie thuisbatterij_simulatie.kies_backend().
+    vermogen (dict, optional): Vermogensgrenzen per interval, zie thuisbatterij_simulatie.vermogensmodel().
+                               Het standby verbruik hoort al in netto_verbruik te zitten.
+
+    Returns:
+    dict: 'batterij_laadstatus', 'netto_afname' en 'kosten' per interval.
+    """
+    netto_verbruik = np.asarray(netto_verbruik, dtype=np.float64)
+    aantal = len(netto_verbruik)
+    import_prijs = np.broadcast_to(np.asarray(import_prijs, dtype=np.float64), (aantal,))
+    export_prijs = np.broadcast_to(np.asarray(export_prijs, dtype=np.float64), (aantal,))
+    if begin_lading is None:
+        begin_lading = capaciteit * 0.5
+    vastleggen = max(1, min(vastleggen, horizon))
+
+    niveaus = np.linspace(0.0, capaciteit, stappen)
+    laadstatus = np.empty(aantal)
+
+    # Grenzen aan de verandering van de lading per interval
+    max_laden = np.full(aantal, np.inf if max_stap is None else float(max_stap))
+    max_ontladen = max_laden.copy()
+    if vermogen is not None:
+        # Bij laden komt alleen het deel na het rendementsverlies in de batterij
+        laden, ontladen = thuisbatterij_simulatie.max_stroom(vermogen, capaciteit)
+        max_laden = np.minimum(max_laden, laden * laad_efficiëntie)
+        max_ontladen = np.minimum(max_ontladen, ontladen)
+
+    lus = _numba_kernel() if thuisbatterij_simulatie.kies_backend(backend) == 'numba' else _dispatch_numpy
+    lus(netto_verbruik, np.ascontiguousarray(import_prijs), np.ascontiguousarray(export_prijs),
+        max_laden, max_ontladen, float(capaciteit), float(laad_efficiëntie), float(begin_lading),
+        niveaus, horizon, vastleggen, laadstatus)
+
+    afname = netto_afname(netto_verbruik, laadstatus, begin_lading, laad_efficiëntie)
+    return {
+        'batterij_laadstatus': laadstatus,
+        'netto_afname': afname,
+        'kosten': prijs_afname(afname, import_prijs, export_prijs)
+    }
+
+
+def vergelijk_met_greedy(totaal_import, totaal_export, import_prijs, export_prijs, capaciteit,
+                         laad_efficiëntie, backend='auto', vermogen=None, **opties):
+    """
+    Vergelijk de optimale (prijsbewuste) inzet van de batterij met de standaard strategie.
+
+    De standaard strategie ontlaadt bij netto import en laadt bij netto export, zonder naar
+    prijzen te kijken. Beide worden met dezelfde prijzen per interval afgerekend.
+
+    Parameters:
+    totaal_import (ndarray): Geïmporteerde energie per interval in kWh.
+    totaal_export (ndarray): Geëxporteerde energie per interval in kWh.
+    import_prijs (ndarray): Prijs per kWh import per interval (€).
+    export_prijs (ndarray): Vergoeding per kWh export per interval (€).
+    capaciteit (float): Capaciteit van de batterij in kWh.
+    laad_efficiëntie (float): Laadefficiëntie (0-1).
+    backend (str): Backend voor beide strategieën ('auto', 'numba' of 'numpy').
+    vermogen (dict, optional): Vermogensgrenzen voor beide strategieën, zie
+                               thuisbatterij_simulatie.vermogensmodel().
+    **opties: Extra parameters voor optimaliseer_dispatch().
+
+    Returns:
+    dict: Kosten zonder batterij, met de standaard strategie en met optimale inzet,
+          de bijbehorende besparingen en de laadstatus van beide strategieën.
+    """
+    totaal_import = np.asarray(totaal_import, dtype=np.float64)
+    totaal_export = np.asarray(totaal_export, dtype=np.float64)
+    import_prijs = np.broadcast_to(np.asarray(import_prijs, dtype=np.float64), totaal_import.shape)
+    export_prijs = np.broadcast_to(np.asarray(export_prijs, dtype=np.float64), totaal_import.shape)
+    netto_verbruik = totaal_import - totaal_export
+    begin_lading = opties.pop('begin_lading', None)
+    if begin_lading is None:
+        begin_lading = capaciteit * 0.5
+
+    # Zonder batterij worden import en export binnen een interval los afgerekend
+    kosten_zonder_batterij = float(np.sum(totaal_import * import_prijs - totaal_export * export_prijs))
+
+    netto_verbruik = thuisbatterij_simulatie.verbruik_met_standby(netto_verbruik, vermogen)
+
+    greedy_laadstatus = thuisbatterij_simulatie.bereken_laadstatus(
+        netto_verbruik, [capaciteit], laad_efficiëntie, [begin_lading], backend, vermogen
+    )[0]
+    greedy_afname = netto_afname(netto_verbruik, greedy_laadstatus, begin_lading, laad_efficiëntie)
+    kosten_greedy = float(np.sum(prijs_afname(greedy_afname, import_prijs, export_prijs)))
+
+    optimaal = optimaliseer_dispatch(
+        netto_verbruik, import_prijs, export_prijs, capaciteit, laad_efficiëntie, begin_lading,
+        backend=backend, vermogen=vermogen, **opties
+    )
+    kosten_optimaal = float(np.sum(optimaal['kosten']))
+
+    return {
+        'capaciteit': capaciteit,
+        'kosten_zonder_batterij': kosten_zonder_batterij,
+        'kosten_greedy': kosten_greedy,
+        'kosten_optimaal': kosten_optimaal,
+        'besparing_greedy': kosten_zonder_batterij - kosten_greedy,
+        'besparing_optimaal': kosten_zonder_batterij - kosten_optimaal,
+        'greedy_laadstatus': greedy_laadstatus,
+        'batterij_laadstatus': optimaal['batterij_laadstatus']
+    }
@@ -0,0 +1,352 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import thuisbatterij_data
+import thuisbatterij_simulatie
+import thuisbatterij_testdata
+from thuisbatterij_calculator import ThuisbatterijCalculator
+
+
+# Stappen die gemeten worden, in volgorde van uitvoeren
+STAPPEN = ('laad_data', 'laad_data_cache', 'bereken_interval_waarden',
+           'simuleer_enkele_batterij', 'simuleer_batterij')
+
+STANDAARD_GROOTTES = ('1d', '7d', '30d', '1j')
+
+# Modules waarvan de opstarttijd gemeten wordt, en zware afhankelijkheden die ze niet direct horen te laden
+OPSTART_MODULES = ('thuisbatterij_kern', 'thuisbatterij_calculator', 'thuisbatterij_gui')
+ZWARE_MODULES = ('pandas', 'matplotlib', 'numba')
+
+# Meet in een vers proces alleen de import zelf, niet het starten van Python
+_OPSTART_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'tijd_s': time.perf_counter() - start,
+                  'zware_modules': [naam for naam in {zwaar!r} if naam in sys.modules]}}))
+"""
+STANDAARD_DATA_MAP = os.path.join(tempfile.gettempdir(), 'thuisbatterij_benchmark')
+
+# Eenheden voor de groottes, in dagen
+_EENHEDEN = {'d': 1, 'w': 7, 'm': 30, 'j': 365, 'y': 365}
+
+
+def parse_grootte(grootte):
+    """
+    Zet een grootte als '1d', '2w', '6m' of '3j' om naar een aantal dagen.
+
+    Returns:
+    int: Aantal dagen.
+    """
+    try:
+        return int(grootte[:-1]) * _EENHEDEN[grootte[-1].lower()]
+    except (KeyError, ValueError, IndexError):
+        raise ValueError(f"Onbekende grootte '{grootte}', gebruik bijvoorbeeld 1d, 2w, 6m of 3j.")
+
+
+def testbestand(dagen, interval, data_map=STANDAARD_DATA_MAP, seed=0):
+    """Geef het pad van een synthetische P1 export, en genereer die als hij nog niet bestaat."""
+    os.makedirs(data_map, exist_ok=True)
+    pad = os.path.join(data_map, f'p1_{dagen}d_{interval}s_seed{seed}.csv')
+    if not os.path.exists(pad):
+        tijdelijk = pad + '.tmp'
+        thuisbatterij_testdata.genereer_p1_csv(tijdelijk, dagen, interval, seed=seed)
+        os.replace(tijdelijk, pad)
+    return pad
+
+
+def _meet(functie, herhalingen, geheugen):
+    """Voer een stap uit en geef de snelste tijd en de piek van het gealloceerde geheugen terug."""
+    tijden = []
+    for _ in range(herhalingen):
+        start = time.perf_counter()
+        functie()
+        tijden.append(time.perf_counter() - start)
+
+    piek = None
+    if geheugen:
+        # Een aparte run, zodat tracemalloc de tijdmeting niet beïnvloedt
+        tracemalloc.start()
+        try:
+            functie()
+            piek = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        finally:
+            tracemalloc.stop()
+    return min(tijden), piek
+
+
+def meet_opstarttijd(modules=OPSTART_MODULES, herhalingen=5):
+    """
+    Meet per module hoe lang de import in een vers Python proces duurt.
+
+    Parameters:
+    modules (tuple): Te meten modules.
+    herhalingen (int): Aantal metingen per module; de snelste telt.
+
+    Returns:
+    dict: Per module 'tijd_s' en de 'zware_modules' die de import meteen laadt,
+          of 'fout' als de module niet te importeren is (bijv. PyQt5 ontbreekt).
+    """
+    map_pad = os.path.dirname(os.path.abspath(__file__))
+    resultaten = {}
+    for module in modules:
+        code = _OPSTART_CODE.format(module=module, zwaar=ZWARE_MODULES)
+        metingen = []
+        for _ in range(herhalingen):
+            proces = subprocess.run([sys.executable, '-c', code], cwd=map_pad, capture_output=True, text=True,
+                                    env={**os.environ, 'QT_QPA_PLATFORM': 'offscreen'})
+            if proces.returncode != 0:
+                melding = proces.stderr.strip().splitlines()
+                metingen = [{'fout': melding[-1] if melding else 'onbekende fout'}]
+                break
+            metingen.append(json.loads(proces.stdout))
+        resultaten[module] = min(metingen, key=lambda meting: meting.get('tijd_s', 0.0))
+    return resultaten
+
+
+def meet_grootte(csv_file, herhalingen=3, geheugen=True, capaciteiten=(3, 5, 7, 10, 15)):
+    """
+    Meet alle stappen van de calculator voor een CSV bestand.
+
+    Parameters:
+    csv_file (str): Pad naar de P1 export.
+    herhalingen (int): Aantal keer dat elke stap wordt uitgevoerd; de snelste telt.
+    geheugen (bool): Meet ook het piekgeheugen (in een extra run met tracemalloc).
+    capaciteiten (tuple): Capaciteiten voor simuleer_batterij.
+
+    Returns:
+    dict: 'rijen', 'data_mb' (de geladen data per datatype, in MB) en per stap 'tijd_s',
+          'rijen_per_s' en 'piek_mb'.
+    """
+    calculator = ThuisbatterijCalculator(csv_file)
+    # Meet het rekenwerk zelf, niet het ophalen van eerdere resultaten
+    calculator.resultaat_cache = None
+    stappen = {}
+
+    with tempfile.TemporaryDirectory(prefix='thuisbatterij-cache-') as cache_map, \
+            contextlib.redirect_stdout(io.StringIO()):
+        def laad_data():
+            calculator.cache_map = None
+            calculator.laad_data()
+
+        def laad_data_cache():
+            calculator.cache_map = cache_map
+            calculator.laad_data()
+
+        # De geladen data bevat geen meterstanden meer, dus het afleiden wordt op de ruwe kolommen gemeten
+        ruwe_data = thuisbatterij_data.lees_csv(csv_file)
+
+        metingen = {
+            'laad_data': laad_data,
+            'laad_data_cache': laad_data_cache,
+            'bereken_interval_waarden': lambda: thuisbatterij_data.bereken_interval_kolommen(ruwe_data),
+            'simuleer_enkele_batterij': lambda: calculator.simuleer_enkele_batterij(capaciteiten[len(capaciteiten) // 2]),
+            'simuleer_batterij': lambda: calculator.simuleer_batterij(list(capaciteiten)),
+        }
+
+        # Vul de cache eenmalig, zodat laad_data_cache het lezen uit de cache meet
+        laad_data_cache()
+        if calculator.data is None:
+            raise ValueError(f"Kon {csv_file} niet laden.")
+        rijen = len(calculator.data)
+        data_mb = {
+            dtype: thuisbatterij_data.compacte_data(calculator.data, dtype).memory_usage(deep=True).sum() / 1024 ** 2
+            for dtype in thuisbatterij_data.DATA_DTYPES
+        }
+
+        for stap in STAPPEN:
+            tijd, piek = _meet(metingen[stap], herhalingen, geheugen)
+            stappen[stap] = {
+                'tijd_s': tijd,
+                'rijen_per_s': rijen / tijd if tijd > 0 else None,
+                'piek_mb': piek,
+            }
+
+    return {'rijen': rijen, 'data_mb': data_mb, 'stappen': stappen}
+
+
+def omgeving():
+    """Beschrijf de omgeving van een meting, om baselines van verschillende machines te herkennen."""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'processor': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'backend': thuisbatterij_simulatie.kies_backend('auto'),
+    }
+
+
+def voer_benchmark_uit(groottes=STANDAARD_GROOTTES, interval=10, herhalingen=3, geheugen=True,
+                       data_map=STANDAARD_DATA_MAP):
+    """
+    Meet alle stappen voor een reeks datagroottes met synthetische P1 exports.
+
+    Parameters:
+    groottes (tuple): Groottes zoals '1d', '30d' of '3j'.
+    interval (int): Interval van de synthetische data in seconden.
+    herhalingen (int): Aantal herhalingen per stap.
+    geheugen (bool): Meet ook het piekgeheugen.
+    data_map (str): Map voor de gegenereerde bestanden (worden hergebruikt).
+
+    Returns:
+    dict: Omgeving, instellingen en de resultaten per grootte.
+    """
+    print("Opstarttijd meten...", flush=True)
+    opstarten = meet_opstarttijd(herhalingen=max(herhalingen, 5))
+
+    resultaten = {}
+    for grootte in groottes:
+        csv_file = testbestand(parse_grootte(grootte), interval, data_map)
+        print(f"{grootte}: meten met {os.path.basename(csv_file)}...", flush=True)
+        resultaten[grootte] = meet_grootte(csv_file, herhalingen, geheugen)
+    return {
+        'omgeving': omgeving(),
+        'interval': interval,
+        'herhalingen': herhalingen,
+        'opstarten': opstarten,
+        'resultaten': resultaten,
+    }
+
+
+def vergelijk(meting, baseline, tolerantie=0.25, min_tijd=0.05):
+    """
+    Vergelijk een meting met een baseline en geef de regressies terug.
+
+    Een stap is een regressie als de tijd of het piekgeheugen meer dan 'tolerantie'
+    (relatief) hoger is. Zeer korte stappen (onder min_tijd seconden) tellen voor de
+    tijd niet mee, omdat hun ruis groter is dan de tolerantie. De opstarttijd krijgt
+    min_tijd als extra marge, omdat een import van een tiende seconde sterk wisselt;
+    daar is het ook een regressie als een module bij het importeren een zware
+    afhankelijkheid meeneemt die hij eerst niet laadde.
+
+    Returns:
+    list: Beschrijvingen van de regressies.
+    """
+    regressies = []
+    for module, waarden in meting.get('opstarten', {}).items():
+        oud = baseline.get('opstarten', {}).get(module)
+        if oud is None or 'tijd_s' not in oud or 'tijd_s' not in waarden:
+            continue
+        tijd, oude_tijd = waarden['tijd_s'], oud['tijd_s']
+        if tijd > oude_tijd * (1 + tolerantie) + min_tijd:
+            regressies.append(f"opstarten {module}: tijd {oude_tijd:.3f}s -> {tijd:.3f}s")
+        nieuw = sorted(set(waarden['zware_modules']) - set(oud['zware_modules']))
+        if nieuw:
+            regressies.append(f"opstarten {module}: laadt nu ook {', '.join(nieuw)}")
+
+    for grootte, resultaat in meting['resultaten'].items():
+        oud = baseline.get('resultaten', {}).get(grootte)
+        if oud is None:
+            continue
+        data_mb, oude_data_mb = resultaat.get('data_mb', {}).get('float64'), oud.get('data_mb', {}).get('float64')
+        if data_mb is not None and oude_data_mb and data_mb > oude_data_mb * (1 + tolerantie) and data_mb - oude_data_mb > 1:
+            regressies.append(f"{grootte} data: geheugen {oude_data_mb:.1f}MB -> {data_mb:.1f}MB")
+        for stap, waarden in resultaat['stappen'].items():
+            oude_waarden = oud['stappen'].get(stap)
+            if oude_waarden is None:
+                continue
+            tijd, oude_tijd = waarden['tijd_s'], oude_waarden['tijd_s']
+            if max(tijd, oude_tijd) >= min_tijd and tijd > oude_tijd * (1 + tolerantie):
+                regressies.append(f"{grootte} {stap}: tijd {oude_tijd:.3f}s -> {tijd:.3f}s")
+            piek, oude_piek = waarden.get('piek_mb'), oude_waarden.get('piek_mb')
+            if piek is not None and oude_piek and piek > oude_piek * (1 + tolerantie) and piek - oude_piek > 1:
+                regressies.append(f"{grootte} {stap}: geheugen {oude_piek:.1f}MB -> {piek:.1f}MB")
+    return regressies
+
+
+def toon_meting(meting, baseline=None):
+    """Toon een meting als tabel, met de verhouding ten opzichte van de baseline."""
+    if meting.get('opstarten'):
+        oud = (baseline or {}).get('opstarten', {})
+        print(f"\n{'Module':<28} {'Import (s)':>10} {'t/baseline':>11}  Zware modules")
+        print("-" * 80)
+        for module, waarden in meting['opstarten'].items():
+            if 'fout' in waarden:
+                print(f"{module:<28} {'-':>10} {'-':>11}  {waarden['fout']}")
+                continue
+            oude_tijd = oud.get(module, {}).get('tijd_s')
+            verhouding = f"{waarden['tijd_s'] / oude_tijd:.2f}" if oude_tijd else '-'
+            zwaar = ', '.join(waarden['zware_modules']) or '-'
+            print(f"{module:<28} {waarden['tijd_s']:>10.3f} {verhouding:>11}  {zwaar}")
+
+    print(f"\n{'Grootte':<8} {'Rijen':>10} {'Stap':<26} {'Tijd (s)':>10} {'Rijen/s':>12} {'Piek (MB)':>10} {'t/baseline':>11}")
+    print("-" * 93)
+    for grootte, resultaat in meting['resultaten'].items():
+        oud = (baseline or {}).get('resultaten', {}).get(grootte, {}).get('stappen', {})
+        for stap, waarden in resultaat['stappen'].items():
+            snelheid = f"{waarden['rijen_per_s']:.0f}" if waarden['rijen_per_s'] else '-'
+            piek = f"{waarden['piek_mb']:.1f}" if waarden['piek_mb'] is not None else '-'
+            verhouding = f"{waarden['tijd_s'] / oud[stap]['tijd_s']:.2f}" if stap in oud and oud[stap]['tijd_s'] > 0 else '-'
+            print(f"{grootte:<8} {resultaat['rijen']:>10} {stap:<26} {waarden['tijd_s']:>10.3f} {snelheid:>12} {piek:>10} {verhouding:>11}")
+
+    print(f"\n{'Grootte':<8} {'Data float64 (MB)':>18} {'Data float32 (MB)':>18} {'Bytes per rij':>14}")
+    print("-" * 61)
+    for grootte, resultaat in meting['resultaten'].items():
+        data_mb = resultaat.get('data_mb')
+        if data_mb:
+            per_rij = data_mb['float64'] * 1024 ** 2 / resultaat['rijen'] if resultaat['rijen'] else 0
+            print(f"{grootte:<8} {data_mb['float64']:>18.1f} {data_mb['float32']:>18.1f} {per_rij:>14.0f}")
+
+
+def main(argumenten=None):
+    """Command line interface voor de benchmark."""
+    parser = argparse.ArgumentParser(description="Meet de snelheid en het geheugengebruik van de calculator.")
+    parser.add_argument('-g', '--groottes', nargs='+', default=list(STANDAARD_GROOTTES),
+                        help="datagroottes, bijv. 1d 7d 30d 1j 3j")
+    parser.add_argument('--interval', type=int, default=10, help="interval van de synthetische data in seconden")
+    parser.add_argument('-n', '--herhalingen', type=int, default=3, help="herhalingen per stap (de snelste telt)")
+    parser.add_argument('--geen-geheugen', action='store_true', help="sla het meten van het piekgeheugen over")
+    parser.add_argument('--data-map', default=STANDAARD_DATA_MAP, help="map voor de gegenereerde testdata")
+    parser.add_argument('-o', '--uitvoer', help="schrijf de meting als JSON naar dit bestand")
+    parser.add_argument('-b', '--baseline', default='benchmark_baseline.json', help="baseline om mee te vergelijken")
+    parser.add_argument('--schrijf-baseline', action='store_true', help="sla deze meting op als nieuwe baseline")
+    parser.add_argument('--tolerantie', type=float, default=0.25, help="toegestane relatieve verslechtering")
+    args = parser.parse_args(argumenten)
+
+    meting = voer_benchmark_uit(args.groottes, args.interval, args.herhalingen, not args.geen_geheugen, args.data_map)
+
+    baseline = None
+    if not args.schrijf_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('omgeving') != meting['omgeving']:
+            print("Let op: de baseline is in een andere omgeving gemeten.")
+
+    toon_meting(meting, baseline)
+
+    if args.uitvoer:
+        with open(args.uitvoer, 'w', encoding='utf-8') as f:
+            json.dump(meting, f, indent=2)
+    if args.schrijf_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(meting, f, indent=2)
+        print(f"\nBaseline opgeslagen in: {args.baseline}")
+        return 0
+
+    if baseline is not None:
+        regressies = vergelijk(meting, baseline, args.tolerantie)
+        if regressies:
+            print("\nRegressies ten opzichte van de baseline:")
+            for regressie in regressies:
+                print(f"  {regressie}")
+            return 1
+        print("\nGeen regressies ten opzichte van de baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,46 @@
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from datetime import datetime
+import json
 import os
+import shutil
+import tempfile
+import time
+import weakref
+import thuisbatterij_arbitrage
+import thuisbatterij_data
+import thuisbatterij_kern
+import thuisbatterij_live
+import thuisbatterij_lui
+import thuisbatterij_metingen
+import thuisbatterij_montecarlo
+import thuisbatterij_plot
+import thuisbatterij_resultaatcache
+import thuisbatterij_simulatie
+import thuisbatterij_tarieven
+
+# pandas en matplotlib bepalen de opstarttijd; ze worden pas geladen als de DataFrame API
+# of de grafieken echt gebruikt worden
+pd = thuisbatterij_lui.module('pandas')
+plt = thuisbatterij_lui.module('matplotlib.pyplot')
+
+
+def _verwijder_reeks_map(mappen, map_pad):
+    """
+    Verwijder een map met memory-mapped reeksen zodra geen van de reeksen nog leeft.
+
+    Een map die (nog) niet weg kan, bijv. omdat het bestand op Windows nog open is, blijft
+    in mappen staan zodat ruim_reeks_bestanden_op() het later opnieuw probeert.
+    """
+    if any(finalizer.alive for finalizer in mappen.get(map_pad, ())):
+        return
+    try:
+        shutil.rmtree(map_pad)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        return
+    mappen.pop(map_pad, None)
+
 
 class ThuisbatterijCalculator:
     def __init__(self, csv_file):
@@ -14,31 +52,87 @@ class ThuisbatterijCalculator:
         """
         self.csv_file = csv_file
         self.data = None
+        self.ruwe_data = None  # data op meterresolutie als self.data geresampled is
         self.batterij_resultaten = {}
         
         # Laadtarief parameters
         self.tarief_dag = 0.30  # prijs per kWh overdag (€)
         self.tarief_nacht = 0.25  # prijs per kWh 's nachts (€)
         self.teruglever_tarief = 0.10  # teruglevertarief per kWh (€)
+        self.tarief_kalender = None  # tariefkalender (dict, JSON bestand of TariefKalender), None = dag 7-23 uur
+        self._gecompileerde_kalender = None  # (specificatie als tekst, TariefKalender)
+        self._data_kalender = None  # sleutel van de kalender waarmee de tariefbanden van de data bepaald zijn
         
         # Batterij parameters
         self.batterij_kosten_per_kwh = 400  # aanschafkosten per kWh batterijcapaciteit (€)
         self.batterij_levensduur = 10  # levensduur in jaren
         self.laad_efficiëntie = 0.90  # laad- en ontlaadefficiëntie (90%)
+        self.laadvermogen = None  # maximaal laadvermogen in kW, None = onbegrensd
+        self.ontlaadvermogen = None  # maximaal ontlaadvermogen in kW, None = onbegrensd
+        self.c_rate = None  # maximaal vermogen als deel van de capaciteit per uur, bijv. 0.5
+        self.standby_vermogen = 0.0  # verbruik van de omvormer in kW
+        self.fase_limiet = None  # aansluitwaarde per fase in W, bijv. 5750 (3x25A), of een tuple per fase
+        self.batterij_fase = 'L1'  # fase van de omvormer: 'L1', 'L2', 'L3' of 'driefasig'
+        
+        # Simulatie parameters
+        self.simulatie_backend = 'auto'  # 'auto', 'numba' of 'numpy'
+        self.detailniveau = 'volledig'  # 'samenvatting', 'gedownsampled' of 'volledig'
+        self.reeks_punten = 5000  # aantal punten per reeks bij 'gedownsampled'
+        self.reeks_dtype = 'float64'  # bijv. 'float32' om geheugen te besparen
+        self.reeks_map = None  # map voor memory-mapped reeksen bij 'volledig', None = in het geheugen;
+                               # elke simulatie krijgt een submap die verdwijnt zodra geen reeks er meer naar verwijst
+        self._reeks_mappen = {}  # submap van reeks_map -> finalizers van de memmaps erin
+        self.simulatie_interval = None  # bijv. '5min' of '15min', None simuleert op de resolutie van de meter
+        self.data_dtype = 'float64'  # 'float32' halveert het geheugen van de import en export per interval
+        self.bij_blok = None  # callable(verwerkt, aantal) na elk tijdsblok van simuleer_batterijen(), bijv. voor voortgang
+        
+        # Inlees parameters
+        self.tijd_formaat = None  # bijv. '%Y-%m-%d %H:%M:%S', None probeert de gangbare formaten
+        self.cache_map = thuisbatterij_data.STANDAARD_CACHE_MAP  # None schakelt de cache uit
+        
+        # Eerder gesimuleerde capaciteiten op schijf, zie simuleer_batterij(); None schakelt dit uit
+        self.resultaat_cache = thuisbatterij_resultaatcache.ResultaatCache()
+        self._vingerafdruk = None  # (zwakke verwijzing naar de data, vingerafdruk), de hash is per dataset eenmalig
+        
+        # Metingen van duur, doorvoer en geheugen per stap; Metingen(geheugen=True, profiel=True) meet meer
+        self.metingen = thuisbatterij_metingen.Metingen()
         
     def laad_data(self):
-        """Laad de energiedata uit het CSV bestand."""
+        """Laad de energiedata uit het CSV bestand, of uit de cache als het bestand al eens geparst is."""
         try:
             print(f"Data laden uit: {self.csv_file}")
-            self.data = pd.read_csv(self.csv_file)
+            kalender = self.kalender()
+            cache_extra = {'tijd_formaat': self.tijd_formaat, 'tarief_kalender': kalender.sleutel()}
             
-            # Converteer de tijdkolom naar datetime
-            self.data['time'] = pd.to_datetime(self.data['time'])
-            
-            # Bereken het werkelijke verbruik en productie per interval
-            self.bereken_interval_waarden()
+            with thuisbatterij_metingen.stap(self.metingen, 'laad_data') as meting:
+                data = None
+                if self.cache_map:
+                    with thuisbatterij_metingen.stap(self.metingen, 'cache_lezen'):
+                        data = thuisbatterij_data.laad_uit_cache(self.csv_file, self.cache_map, cache_extra)
+                
+                if data is None:
+                    # Lees alleen de benodigde kolommen, met vaste types en tijdformaat
+                    self.data = thuisbatterij_data.lees_csv(self.csv_file, self.tijd_formaat, self.metingen)
+                    
+                    # Bereken het werkelijke verbruik en productie per interval
+                    self.bereken_interval_waarden()
+                    
+                    # De cache bewaart de compacte data altijd in float64, het type wordt hieronder gekozen
+                    if self.cache_map:
+                        with thuisbatterij_metingen.stap(self.metingen, 'cache_schrijven', len(self.data)):
+                            thuisbatterij_data.schrijf_naar_cache(self.csv_file, self.data, self.cache_map, cache_extra)
+                    data = self.data
+                
+                self.data = thuisbatterij_data.compacte_data(data, self.data_dtype)
+                self._data_kalender = kalender.sleutel()
+                if meting is not None:
+                    meting['rijen'] = len(self.data)
             
             print(f"Succesvol {len(self.data)} datapunten geladen.")
+            
+            self.ruwe_data = None
+            if self.simulatie_interval:
+                self.resample(self.simulatie_interval)
             return True
         except Exception as e:
             print(f"Fout bij het laden van de data: {e}")
@@ -46,33 +140,176 @@ class ThuisbatterijCalculator:
     
     def bereken_interval_waarden(self):
         """Bereken het verbruik en productie per tijdsinterval."""
-        # Maak kopieën van de cumulatieve waarden
-        self.data['import_t1_interval'] = self.data['Import T1 kWh'].diff().fillna(0)
-        self.data['import_t2_interval'] = self.data['Import T2 kWh'].diff().fillna(0)
-        self.data['export_t1_interval'] = self.data['Export T1 kWh'].diff().fillna(0)
-        self.data['export_t2_interval'] = self.data['Export T2 kWh'].diff().fillna(0)
-        
-        # Totaal import en export per interval
-        self.data['totaal_import'] = self.data['import_t1_interval'] + self.data['import_t2_interval']
-        self.data['totaal_export'] = self.data['export_t1_interval'] + self.data['export_t2_interval']
-        
-        # Bepaal dag/nacht tarief (aanname: 7-23 uur is dagtarief)
-        self.data['is_dagtarief'] = (self.data['time'].dt.hour >= 7) & (self.data['time'].dt.hour < 23)
-        
-        # Bereken kosten zonder batterij
-        import_kosten = np.where(
-            self.data['is_dagtarief'],
-            self.data['totaal_import'] * self.tarief_dag,
-            self.data['totaal_import'] * self.tarief_nacht
+        with thuisbatterij_metingen.stap(self.metingen, 'interval_waarden', len(self.data)):
+            self._bereken_interval_waarden()
+    
+    def _bereken_interval_waarden(self):
+        """Leid import, export en tariefband per interval af uit de cumulatieve meterstanden."""
+        # Totaal import en export en de band uit de tariefkalender; de meterstanden vervallen daarna
+        kolommen = {naam: self.data[naam] for naam in self.data}
+        kolommen.update(thuisbatterij_data.bereken_interval_kolommen(self.data, self.kalender()))
+        self.data = thuisbatterij_data.compacte_data(kolommen)
+    
+    def kalender(self):
+        """Geef de gecompileerde tariefkalender; die wordt alleen opnieuw gecompileerd als tarief_kalender verandert."""
+        specificatie = self.tarief_kalender
+        if isinstance(specificatie, dict):
+            # Een dict kan ter plekke aangepast zijn, dus vergelijk de inhoud en niet het object
+            specificatie = json.dumps(specificatie, sort_keys=True, default=str)
+        if self._gecompileerde_kalender is None or self._gecompileerde_kalender[0] != specificatie:
+            self._gecompileerde_kalender = (specificatie, thuisbatterij_tarieven.maak_kalender(self.tarief_kalender))
+        return self._gecompileerde_kalender[1]
+    
+    def tariefbanden(self):
+        """
+        Geef de tariefband per interval van de data.
+        
+        Is tarief_kalender na laad_data() vervangen door een kalender met een andere
+        indeling, dan worden de banden eerst opnieuw bepaald (en zo nodig opnieuw
+        geresampled). De data wordt daarbij niet ter plekke aangepast, want die kan
+        gedeeld zijn met andere calculators.
+        
+        Returns:
+        ndarray: Band per interval.
+        """
+        kalender = self.kalender()
+        if self._data_kalender != kalender.sleutel():
+            ruw = self.ruwe_data if self.ruwe_data is not None else self.data
+            ruw = ruw.assign(tariefband=kalender.tariefband(ruw['time']))
+            if self.ruwe_data is not None:
+                self.ruwe_data = ruw
+                self.data = thuisbatterij_data.resample_intervallen(ruw, self.simulatie_interval)
+            else:
+                self.data = ruw
+            self._data_kalender = kalender.sleutel()
+        return self.data['tariefband'].to_numpy()
+    
+    def bereken_netto_kosten(self):
+        """
+        Bereken de kosten zonder batterij per interval met de huidige tarieven.
+        
+        De kosten worden niet in de data bewaard, omdat ze alleen voor de kostenreeksen
+        nodig zijn en bij elke tariefwijziging veranderen.
+        
+        Returns:
+        ndarray: Netto kosten per interval (€).
+        """
+        tariefband = self.tariefbanden()
+        return thuisbatterij_simulatie.bereken_netto_kosten(
+            self.data['totaal_import'].to_numpy(),
+            self.data['totaal_export'].to_numpy(),
+            tariefband,
+            self.tarief_dag,
+            self.tarief_nacht,
+            self.teruglever_tarief,
+            self.kalender()
         )
-        export_opbrengst = self.data['totaal_export'] * self.teruglever_tarief
+    
+    def resample(self, interval):
+        """
+        Voeg de data samen tot een grover interval om sneller te simuleren.
+        
+        De data op meterresolutie blijft bewaard in ruwe_data, zodat opnieuw resamplen
+        (ook naar een fijner interval) zonder opnieuw laden kan. Met None wordt de
+        oorspronkelijke resolutie hersteld.
+        
+        Parameters:
+        interval (str of int): Bijv. '1min', '15min' of een aantal seconden, of None.
+        """
+        if self.data is None:
+            print("Laad eerst de data met de laad_data() methode.")
+            return
+        
+        if self.ruwe_data is None:
+            self.ruwe_data = self.data
+        
+        if interval is None:
+            self.data = self.ruwe_data
+            self.ruwe_data = None
+        else:
+            with thuisbatterij_metingen.stap(self.metingen, 'resamplen', len(self.ruwe_data)):
+                self.data = thuisbatterij_data.resample_intervallen(self.ruwe_data, interval)
+            print(f"Geresampled naar {interval}: {len(self.ruwe_data)} -> {len(self.data)} datapunten.")
+        self.simulatie_interval = interval
+    
+    def schat_resample_fout(self, interval, capaciteiten=[3, 5, 10, 15]):
+        """
+        Vergelijk de besparing op meterresolutie met die na resamplen naar een interval.
+        
+        De kosten zonder batterij zijn na resamplen exact gelijk; de afwijking zit alleen
+        in de batterij, die binnen een emmer niet eerst kan laden en dan ontladen.
         
-        self.data['netto_kosten'] = import_kosten - export_opbrengst
+        Parameters:
+        interval (str of int): Te onderzoeken interval, bijv. '5min'.
+        capaciteiten (list): Capaciteiten om mee te vergelijken in kWh.
+        
+        Returns:
+        dict: Per capaciteit de besparing op beide resoluties en de afwijking, plus de
+              rekentijden, de versnelling en de grootste relatieve afwijking.
+        """
+        if self.data is None:
+            print("Laad eerst de data met de laad_data() methode.")
+            return None
+        
+        self.tariefbanden()
+        kalender = self.kalender()
+        ruw = self.ruwe_data if self.ruwe_data is not None else self.data
+        start = time.perf_counter()
+        geresampled = thuisbatterij_data.resample_intervallen(ruw, interval)
+        tijd_resamplen = time.perf_counter() - start
+        
+        def simuleer(data):
+            start = time.perf_counter()
+            simulatie = thuisbatterij_simulatie.simuleer_batch(
+                data['totaal_import'].to_numpy(), data['totaal_export'].to_numpy(), data['tariefband'].to_numpy(),
+                capaciteiten, self.tarief_dag, self.tarief_nacht, self.teruglever_tarief, self.laad_efficiëntie,
+                backend=self.simulatie_backend, detailniveau='samenvatting', vermogen=self.vermogensmodel(data),
+                kalender=kalender
+            )
+            tijd = time.perf_counter() - start
+            originele_kosten = thuisbatterij_simulatie.prijs_energie(
+                thuisbatterij_simulatie.bereken_energie(
+                    data['totaal_import'].to_numpy(), data['totaal_export'].to_numpy(), data['tariefband'].to_numpy(),
+                    kalender
+                ),
+                self.tarief_dag, self.tarief_nacht, self.teruglever_tarief, kalender
+            )
+            return originele_kosten - simulatie['totale_nieuwe_kosten'], tijd
+        
+        capaciteiten = list(capaciteiten)
+        besparing_volledig, tijd_volledig = simuleer(ruw)
+        besparing_resampled, tijd_resampled = simuleer(geresampled)
+        
+        per_capaciteit = {}
+        for i, capaciteit in enumerate(capaciteiten):
+            afwijking = float(besparing_resampled[i] - besparing_volledig[i])
+            per_capaciteit[capaciteit] = {
+                'besparing_volledig': float(besparing_volledig[i]),
+                'besparing_resampled': float(besparing_resampled[i]),
+                'afwijking': afwijking,
+                'relatieve_afwijking': afwijking / abs(float(besparing_volledig[i])) if besparing_volledig[i] else 0.0
+            }
+        
+        return {
+            'interval': interval,
+            'rijen_volledig': len(ruw),
+            'rijen_resampled': len(geresampled),
+            'tijd_volledig': tijd_volledig,
+            'tijd_resampled': tijd_resampled,
+            'tijd_resamplen': tijd_resamplen,
+            'versnelling': tijd_volledig / tijd_resampled if tijd_resampled > 0 else float('inf'),
+            'max_relatieve_afwijking': max(abs(r['relatieve_afwijking']) for r in per_capaciteit.values()),
+            'capaciteiten': per_capaciteit
+        }
     
     def simuleer_batterij(self, capaciteiten=[3, 5, 7, 10, 15]):
         """
         Simuleer verschillende batterijcapaciteiten en bereken de rendabiliteit.
         
+        Capaciteiten die eerder met dezelfde data en instellingen zijn gesimuleerd komen
+        uit de resultaatcache; alleen de ontbrekende worden gesimuleerd. Resultaten uit de
+        cache hebben geen tijdreeksen, die worden bij het visualiseren alsnog berekend.
+        
         Parameters:
         capaciteiten (list): Lijst met te simuleren batterijcapaciteiten in kWh.
         """
@@ -80,9 +317,199 @@ class ThuisbatterijCalculator:
             print("Laad eerst de data met de laad_data() methode.")
             return
         
+        if self.resultaat_cache is None:
+            self.batterij_resultaten.update(self.simuleer_batterijen(capaciteiten))
+            return
+        
+        capaciteiten = list(capaciteiten)
+        with thuisbatterij_metingen.stap(self.metingen, 'resultaat_cache'):
+            sleutels = {capaciteit: self._resultaat_sleutel(capaciteit) for capaciteit in capaciteiten}
+            gevonden = self.resultaat_cache.haal(list(sleutels.values()))
+        
+        ontbrekend = [capaciteit for capaciteit in capaciteiten if sleutels[capaciteit] not in gevonden]
+        resultaten = self.simuleer_batterijen(ontbrekend)
+        self.resultaat_cache.bewaar({sleutels[capaciteit]: resultaten[capaciteit]['energie'] for capaciteit in ontbrekend})
+        
         for capaciteit in capaciteiten:
-            resultaat = self.simuleer_enkele_batterij(capaciteit)
-            self.batterij_resultaten[capaciteit] = resultaat
+            if capaciteit not in resultaten:
+                # Tarieven en kosten worden op de opgeslagen energie per tariefemmer toegepast
+                energie = gevonden[sleutels[capaciteit]]
+                resultaten[capaciteit] = self._maak_resultaat(capaciteit, energie['zonder_batterij'], energie['met_batterij'])
+            self.batterij_resultaten[capaciteit] = resultaten[capaciteit]
+    
+    def _resultaat_sleutel(self, capaciteit):
+        """Sleutel van een capaciteit in de resultaatcache: de data plus alle instellingen die de simulatie sturen."""
+        self.tariefbanden()
+        if self._vingerafdruk is None or self._vingerafdruk[0]() is not self.data:
+            self._vingerafdruk = (weakref.ref(self.data), thuisbatterij_resultaatcache.data_vingerafdruk(self.data))
+        instellingen = {naam: getattr(self, naam) for naam in thuisbatterij_simulatie.VERMOGEN_INSTELLINGEN}
+        instellingen['laad_efficiëntie'] = self.laad_efficiëntie
+        instellingen['tarief_kalender'] = self.kalender().sleutel()
+        return self.resultaat_cache.sleutel(self._vingerafdruk[1], capaciteit, instellingen)
+    
+    def simuleer_batterijen(self, capaciteiten, detailniveau=None):
+        """
+        Simuleer meerdere batterijcapaciteiten tegelijk in een enkele doorloop van de data.
+        
+        Parameters:
+        capaciteiten (list): Lijst met te simuleren batterijcapaciteiten in kWh.
+        detailniveau (str, optional): Overschrijft self.detailniveau voor deze simulatie.
+        
+        Returns:
+        dict: Resultaten per capaciteit, in dezelfde vorm als batterij_resultaten.
+        """
+        capaciteiten = list(capaciteiten)
+        if not capaciteiten:
+            return {}
+        
+        if detailniveau is None:
+            detailniveau = self.detailniveau
+        
+        tariefband = self.tariefbanden()
+        aantal = len(self.data)
+        reeks_stap = max(1, -(-aantal // self.reeks_punten)) if detailniveau == 'gedownsampled' else 1
+        laadstatus_uit, kosten_uit = self._maak_reeks_bestanden(len(capaciteiten), aantal, detailniveau)
+        
+        # Simuleer alle capaciteiten tegelijk op de ruwe arrays in plaats van rij voor rij
+        start = time.perf_counter()
+        with thuisbatterij_metingen.stap(self.metingen, 'simulatie', aantal):
+            simulatie = thuisbatterij_simulatie.simuleer_batch(
+                self.data['totaal_import'].to_numpy(),
+                self.data['totaal_export'].to_numpy(),
+                tariefband,
+                capaciteiten,
+                self.tarief_dag,
+                self.tarief_nacht,
+                self.teruglever_tarief,
+                self.laad_efficiëntie,
+                backend=self.simulatie_backend,
+                detailniveau=detailniveau,
+                reeks_stap=reeks_stap,
+                reeks_dtype=self.reeks_dtype,
+                laadstatus_uit=laadstatus_uit,
+                kosten_uit=kosten_uit,
+                vermogen=self.vermogensmodel(),
+                kalender=self.kalender(),
+                bij_blok=self.bij_blok
+            )
+        if self.metingen is not None:
+            self.metingen.registreer_capaciteiten(capaciteiten, time.perf_counter() - start)
+        
+        energie_zonder_batterij = self._energie_zonder_batterij()
+        
+        # De kosten zonder batterij zijn voor elke capaciteit gelijk en worden gedeeld
+        reeks_index = None
+        originele_kosten = None
+        if detailniveau != 'samenvatting':
+            # Tarieven kunnen na laad_data() zijn aangepast, dus bereken de kosten zonder batterij nu
+            originele_kosten = thuisbatterij_simulatie.downsample_kosten(
+                self.bereken_netto_kosten(), reeks_stap
+            ).astype(self.reeks_dtype, copy=False)
+            if reeks_stap > 1:
+                reeks_index = thuisbatterij_simulatie.reeks_grenzen(aantal, reeks_stap)
+        
+        resultaten = {}
+        for i, capaciteit in enumerate(capaciteiten):
+            reeksen = None
+            if detailniveau != 'samenvatting':
+                reeksen = {
+                    'batterij_laadstatus': simulatie['batterij_laadstatus'][i],
+                    'originele_kosten': originele_kosten,
+                    'nieuwe_kosten': simulatie['nieuwe_kosten'][i],
+                    'reeks_index': reeks_index
+                }
+            resultaten[capaciteit] = self._maak_resultaat(
+                capaciteit,
+                energie_zonder_batterij,
+                {emmer: float(waarden[i]) for emmer, waarden in simulatie['energie'].items()},
+                reeksen
+            )
+        return resultaten
+    
+    def vermogensmodel(self, data=None, vorige_tijd=None):
+        """
+        Stel de vermogensgrenzen van de batterij samen uit de instellingen en de data.
+        
+        Parameters:
+        data (DataFrame, optional): Data met 'time' en eventueel de fasekolommen, standaard self.data.
+        vorige_tijd (datetime64, optional): Tijdstip voor het eerste interval, bijv. bij een blok.
+        
+        Returns:
+        dict of None: Zie thuisbatterij_simulatie.vermogensmodel(); None als niets begrensd is.
+        """
+        instellingen = {naam: getattr(self, naam) for naam in thuisbatterij_simulatie.VERMOGEN_INSTELLINGEN}
+        if not thuisbatterij_simulatie.vermogen_begrensd(instellingen):
+            return None
+        
+        if data is None:
+            data = self.data
+        fase_vermogens = None
+        if all(kolom in data for kolom in thuisbatterij_data.FASE_KOLOMMEN):
+            fase_vermogens = np.column_stack([data[kolom].to_numpy() for kolom in thuisbatterij_data.FASE_KOLOMMEN])
+        return thuisbatterij_simulatie.vermogensmodel(
+            thuisbatterij_data.interval_uren(data['time'], vorige_tijd), fase_vermogens, **instellingen
+        )
+    
+    def _energie_zonder_batterij(self):
+        """Tel de import en export zonder batterij op per tariefemmer."""
+        tariefband = self.tariefbanden()
+        energie = thuisbatterij_simulatie.bereken_energie(
+            self.data['totaal_import'].to_numpy(),
+            self.data['totaal_export'].to_numpy(),
+            tariefband,
+            self.kalender()
+        )
+        return {emmer: float(waarde) for emmer, waarde in energie.items()}
+    
+    def _maak_reeks_bestanden(self, aantal_capaciteiten, aantal, detailniveau):
+        """
+        Maak memory-mapped bestanden voor de volledige reeksen als reeks_map is ingesteld.
+        
+        Returns:
+        tuple: (laadstatus, nieuwe_kosten) als memmaps, of (None, None).
+        """
+        if detailniveau != 'volledig' or not self.reeks_map:
+            return None, None
+        
+        # Probeer mappen die eerder niet verwijderd konden worden opnieuw
+        self.ruim_reeks_bestanden_op()
+        os.makedirs(self.reeks_map, exist_ok=True)
+        map_pad = os.path.abspath(tempfile.mkdtemp(dir=self.reeks_map, prefix='simulatie-'))
+        vorm = (aantal_capaciteiten, aantal)
+        laadstatus = np.lib.format.open_memmap(
+            os.path.join(map_pad, 'batterij_laadstatus.npy'), mode='w+', dtype=self.reeks_dtype, shape=vorm
+        )
+        kosten = np.lib.format.open_memmap(
+            os.path.join(map_pad, 'nieuwe_kosten.npy'), mode='w+', dtype=self.reeks_dtype, shape=vorm
+        )
+        # De rijen in de resultaten (en kopieën daarvan) zijn views die de memmap in leven houden;
+        # de map verdwijnt pas als beide memmaps weg zijn, en anders uiterlijk bij het afsluiten
+        self._reeks_mappen[map_pad] = [
+            weakref.finalize(reeks, _verwijder_reeks_map, self._reeks_mappen, map_pad)
+            for reeks in (laadstatus, kosten)
+        ]
+        return laadstatus, kosten
+    
+    def ruim_reeks_bestanden_op(self, alles=False):
+        """
+        Verwijder de mappen met memory-mapped reeksen waar geen reeks meer naar verwijst.
+        
+        Een map verdwijnt vanzelf zodra de laatste reeks erin wordt opgeruimd; dit probeert
+        mappen opnieuw die toen nog niet weg konden. Roep het met alles=True aan als de
+        calculator niet meer gebruikt wordt.
+        
+        Parameters:
+        alles (bool): Laat ook de reeksen van de huidige resultaten los; hun mappen verdwijnen
+                      zodra niemand anders de reeksen nog vasthoudt.
+        """
+        if alles:
+            for resultaat in self.batterij_resultaten.values():
+                for naam in ('batterij_laadstatus', 'nieuwe_kosten'):
+                    bestand = getattr(resultaat.get(naam), 'filename', None)
+                    if bestand is not None and os.path.dirname(bestand) in self._reeks_mappen:
+                        resultaat[naam] = None
+        for map_pad in list(self._reeks_mappen):
+            _verwijder_reeks_map(self._reeks_mappen, map_pad)
     
     def simuleer_enkele_batterij(self, capaciteit):
         """
@@ -94,70 +521,398 @@ class ThuisbatterijCalculator:
         Returns:
         dict: Resultaten van de simulatie.
         """
-        # Maak een kopie van de data om mee te werken
-        sim_data = self.data.copy()
+        return self.simuleer_batterijen([capaciteit])[capaciteit]
+    
+    def zoek_optimale_capaciteit(self, min_capaciteit=0.5, max_capaciteit=30, doel='totale_besparing_levensduur',
+                                 tolerantie=0.1, startpunten=7):
+        """
+        Zoek de capaciteit met de hoogste totale besparing of de kortste terugverdientijd.
         
-        # Initialiseer batterij lading (50% om te beginnen)
-        batterij_lading = capaciteit * 0.5
+        Eerst wordt een grof raster van startpunten in een enkele doorloop doorgerekend om het
+        optimum in te sluiten, daarna wordt het interval met een gulden-snede zoektocht verkleind tot de tolerantie.
+        Dit vraagt veel minder simulaties dan een fijn raster. Het optimum wordt ook aan
+        batterij_resultaten toegevoegd.
         
-        # Arrays voor bijhouden van batterijstatus en besparingen
-        batterij_laadstatus = []
-        originele_kosten = []
-        nieuwe_kosten = []
+        Parameters:
+        min_capaciteit (float): Kleinste te onderzoeken capaciteit in kWh.
+        max_capaciteit (float): Grootste te onderzoeken capaciteit in kWh.
+        doel (str): 'totale_besparing_levensduur' (maximaliseren) of 'terugverdientijd' (minimaliseren).
+        tolerantie (float): Gewenste nauwkeurigheid van de capaciteit in kWh.
+        startpunten (int): Aantal punten van het grove raster.
         
-        for idx, rij in sim_data.iterrows():
-            # Sla originele kosten op
-            originele_kosten.append(rij['netto_kosten'])
-            
-            # Bepaal het tarief voor dit interval
-            tarief = self.tarief_dag if rij['is_dagtarief'] else self.tarief_nacht
-            
-            # Bereken netto verbruik (positief = import, negatief = export)
-            netto_verbruik = rij['totaal_import'] - rij['totaal_export']
-            
-            # Simuleer batterijgedrag
-            if netto_verbruik > 0:  # We verbruiken meer dan we produceren
-                # Ontlaad de batterij indien mogelijk
-                energie_uit_batterij = min(netto_verbruik, batterij_lading)
-                batterij_lading -= energie_uit_batterij
-                
-                # Resterende energie moet worden geïmporteerd
-                resterende_import = netto_verbruik - energie_uit_batterij
-                nieuwe_kost = resterende_import * tarief
-            else:  # We produceren meer dan we verbruiken
-                # Laad de batterij indien mogelijk
-                beschikbare_energie = -netto_verbruik * self.laad_efficiëntie
-                energie_naar_batterij = min(beschikbare_energie, capaciteit - batterij_lading)
-                batterij_lading += energie_naar_batterij
-                
-                # Resterende energie wordt geëxporteerd
-                resterende_export = -netto_verbruik - (energie_naar_batterij / self.laad_efficiëntie)
-                nieuwe_kost = -resterende_export * self.teruglever_tarief
-            
-            nieuwe_kosten.append(nieuwe_kost)
-            batterij_laadstatus.append(batterij_lading)
+        Returns:
+        dict: 'capaciteit', 'doel', 'waarde', 'evaluaties' en het volledige 'resultaat'.
+        """
+        if self.data is None:
+            print("Laad eerst de data met de laad_data() methode.")
+            return None
+        if doel not in ('totale_besparing_levensduur', 'terugverdientijd'):
+            raise ValueError(f"Onbekend doel '{doel}', kies 'totale_besparing_levensduur' of 'terugverdientijd'.")
+        
+        geëvalueerd = {}
+        
+        def kosten(capaciteit):
+            # Lager is beter; alleen totalen zijn nodig, dus geen tijdreeksen bewaren
+            if capaciteit not in geëvalueerd:
+                geëvalueerd[capaciteit] = self.simuleer_batterijen([capaciteit], detailniveau='samenvatting')[capaciteit]
+            waarde = geëvalueerd[capaciteit][doel]
+            return -waarde if doel == 'totale_besparing_levensduur' else waarde
+        
+        # Sluit het optimum in met een grof raster, alle punten samen in een enkele doorloop
+        raster = np.linspace(min_capaciteit, max_capaciteit, max(3, startpunten)).tolist()
+        geëvalueerd.update(self.simuleer_batterijen(raster, detailniveau='samenvatting'))
+        beste = min(range(len(raster)), key=lambda i: kosten(raster[i]))
+        a = raster[max(beste - 1, 0)]
+        b = raster[min(beste + 1, len(raster) - 1)]
+        
+        # Gulden-snede zoektocht binnen het ingesloten interval
+        verhouding = (np.sqrt(5) - 1) / 2
+        c = b - verhouding * (b - a)
+        d = a + verhouding * (b - a)
+        while b - a > tolerantie:
+            if kosten(c) < kosten(d):
+                b, d = d, c
+                c = b - verhouding * (b - a)
+            else:
+                a, c = c, d
+                d = a + verhouding * (b - a)
+        
+        optimale_capaciteit = min(geëvalueerd, key=kosten)
+        resultaat = geëvalueerd[optimale_capaciteit]
+        self.batterij_resultaten[optimale_capaciteit] = resultaat
+        
+        return {
+            'capaciteit': optimale_capaciteit,
+            'doel': doel,
+            'waarde': resultaat[doel],
+            'evaluaties': len(geëvalueerd),
+            'resultaat': resultaat
+        }
+    
+    def simuleer_batterij_streaming(self, capaciteiten=[3, 5, 7, 10, 15], blokgrootte=1_000_000):
+        """
+        Simuleer batterijcapaciteiten door het CSV bestand in blokken te lezen.
         
+        Bedoeld voor bestanden die niet in het geheugen passen: laad_data() is niet nodig en
+        het geheugengebruik hangt alleen af van de blokgrootte. De lading van de batterij
+        loopt door van blok naar blok. Er worden alleen totalen bewaard, geen tijdreeksen.
+        
+        Parameters:
+        capaciteiten (list): Lijst met te simuleren batterijcapaciteiten in kWh.
+        blokgrootte (int): Aantal regels dat per keer wordt ingelezen.
+        
+        Returns:
+        bool: True als de simulatie geslaagd is.
+        """
+        capaciteiten = list(capaciteiten)
+        lading = None
+        vorige_tijd = None
+        kalender = self.kalender()
+        energie_zonder_batterij = dict.fromkeys(kalender.emmers, 0.0)
+        energie_met_batterij = {emmer: np.zeros(len(capaciteiten)) for emmer in kalender.emmers}
+        aantal = 0
+        
+        try:
+            print(f"Data in blokken van {blokgrootte} regels simuleren uit: {self.csv_file}")
+            with thuisbatterij_metingen.stap(self.metingen, 'streaming') as meting:
+                for blok in thuisbatterij_data.lees_csv_in_blokken(self.csv_file, blokgrootte, self.tijd_formaat, kalender):
+                    totaal_import = blok['totaal_import'].to_numpy()
+                    totaal_export = blok['totaal_export'].to_numpy()
+                    tariefband = blok['tariefband'].to_numpy()
+                    
+                    start = time.perf_counter()
+                    with thuisbatterij_metingen.stap(self.metingen, 'simulatie', len(blok)):
+                        simulatie = thuisbatterij_simulatie.simuleer_batch(
+                            totaal_import,
+                            totaal_export,
+                            tariefband,
+                            capaciteiten,
+                            self.tarief_dag,
+                            self.tarief_nacht,
+                            self.teruglever_tarief,
+                            self.laad_efficiëntie,
+                            begin_lading=lading,
+                            backend=self.simulatie_backend,
+                            detailniveau='samenvatting',
+                            vermogen=self.vermogensmodel(blok, vorige_tijd),
+                            kalender=kalender
+                        )
+                    if self.metingen is not None:
+                        self.metingen.registreer_capaciteiten(capaciteiten, time.perf_counter() - start)
+                    lading = simulatie['eind_lading']
+                    vorige_tijd = blok['time'].iloc[-1]
+                    
+                    blok_energie = kalender.energie(totaal_import, totaal_export, tariefband)
+                    for emmer in kalender.emmers:
+                        energie_zonder_batterij[emmer] += float(blok_energie[emmer])
+                        energie_met_batterij[emmer] += simulatie['energie'][emmer]
+                    aantal += len(blok)
+                if meting is not None:
+                    meting['rijen'] = aantal
+        except Exception as e:
+            print(f"Fout bij het simuleren van de data: {e}")
+            return False
+        
+        for i, capaciteit in enumerate(capaciteiten):
+            self.batterij_resultaten[capaciteit] = self._maak_resultaat(
+                capaciteit,
+                energie_zonder_batterij,
+                {emmer: float(waarden[i]) for emmer, waarden in energie_met_batterij.items()}
+            )
+        
+        print(f"Succesvol {aantal} datapunten gesimuleerd.")
+        return True
+    
+    def simuleer_batterij_live(self, capaciteiten=[3, 5, 7, 10, 15], bron='csv', adres=None, checkpoint=None,
+                               volgen=True, bij_update=None):
+        """
+        Simuleer batterijcapaciteiten live terwijl er metingen binnenkomen.
+        
+        De metingen komen uit een CSV bestand waar regels aan worden toegevoegd, uit P1
+        telegrammen (bestand of seriële poort) of van een socket, zie thuisbatterij_live.
+        Elke meting werkt alle capaciteiten bij zonder de geschiedenis opnieuw te
+        verwerken. Met een checkpoint gaat de simulatie na een herstart verder waar hij
+        gebleven was. De lopende totalen staan na elke update in batterij_resultaten.
+        
+        Parameters:
+        capaciteiten (list): Lijst met te simuleren batterijcapaciteiten in kWh.
+        bron (str): 'csv', 'p1' of 'socket'.
+        adres (str, optional): Pad of socketadres van de bron, standaard het CSV bestand van de calculator.
+        checkpoint (str, optional): Pad van het checkpoint.
+        volgen (bool): Blijf wachten op nieuwe metingen; False stopt aan het einde van een bestand.
+        bij_update (callable, optional): Wordt na elke update aangeroepen met batterij_resultaten.
+        
+        Returns:
+        bool: True als de simulatie zonder fouten gestopt is.
+        """
+        instellingen = {naam: getattr(self, naam) for naam in thuisbatterij_kern.STANDAARD_INSTELLINGEN}
+        instellingen['tarief_kalender'] = self.kalender()
+        beschrijving = {'soort': bron, 'adres': adres or self.csv_file}
+        
+        def werk_bij(simulatie):
+            # Tarieven en kosten komen van de calculator, zodat herprijs() ook op live resultaten werkt
+            for i, capaciteit in enumerate(simulatie.capaciteiten):
+                self.batterij_resultaten[capaciteit] = self._maak_resultaat(
+                    capaciteit,
+                    dict(simulatie.energie_zonder_batterij),
+                    {emmer: float(waarden[i]) for emmer, waarden in simulatie.energie_met_batterij.items()}
+                )
+            if bij_update is not None:
+                bij_update(self.batterij_resultaten)
+        
+        try:
+            simulatie = None
+            if checkpoint:
+                simulatie = thuisbatterij_live.LiveSimulatie.herstel(checkpoint, capaciteiten, instellingen, beschrijving)
+            if simulatie is None:
+                simulatie = thuisbatterij_live.LiveSimulatie(capaciteiten, instellingen)
+            else:
+                print(f"Verder vanaf checkpoint {checkpoint} ({simulatie.aantal} metingen).")
+                werk_bij(simulatie)
+        
+            print(f"Live simuleren uit: {beschrijving['adres']}")
+            batches = thuisbatterij_live.open_bron(bron, beschrijving['adres'], simulatie.positie, self.tijd_formaat, volgen)
+            thuisbatterij_live.draai(simulatie, batches, checkpoint, beschrijving, bij_update=werk_bij)
+        except KeyboardInterrupt:
+            print("Live simulatie gestopt.")
+        except Exception as e:
+            print(f"Fout bij het live simuleren: {e}")
+            return False
+        
+        print(f"Succesvol {simulatie.aantal} metingen gesimuleerd.")
+        return True
+        
+    def _maak_resultaat(self, capaciteit, energie_zonder_batterij, energie_met_batterij, reeksen=None):
+        """Bereken de besparing en ROI voor een gesimuleerde capaciteit uit de energie per tariefemmer."""
         # Bereken totale besparing
-        totale_originele_kosten = sum(originele_kosten)
-        totale_nieuwe_kosten = sum(nieuwe_kosten)
+        kalender = self.kalender()
+        totale_originele_kosten = thuisbatterij_simulatie.prijs_energie(
+            energie_zonder_batterij, self.tarief_dag, self.tarief_nacht, self.teruglever_tarief, kalender
+        )
+        totale_nieuwe_kosten = thuisbatterij_simulatie.prijs_energie(
+            energie_met_batterij, self.tarief_dag, self.tarief_nacht, self.teruglever_tarief, kalender
+        )
         jaarlijkse_besparing = totale_originele_kosten - totale_nieuwe_kosten
         
         # Bereken ROI
-        batterij_investering = capaciteit * self.batterij_kosten_per_kwh
-        terugverdientijd = batterij_investering / jaarlijkse_besparing if jaarlijkse_besparing > 0 else float('inf')
-        totale_besparing_levensduur = jaarlijkse_besparing * self.batterij_levensduur - batterij_investering
+        roi = thuisbatterij_simulatie.bereken_roi(
+            capaciteit, jaarlijkse_besparing, self.batterij_kosten_per_kwh, self.batterij_levensduur
+        )
+        
+        # Zonder tijdreeksen (bijv. bij streaming of 'samenvatting') blijven de reeksen leeg
+        if reeksen is None:
+            reeksen = {'batterij_laadstatus': None, 'originele_kosten': None, 'nieuwe_kosten': None, 'reeks_index': None}
         
         return {
             'capaciteit': capaciteit,
             'jaarlijkse_besparing': jaarlijkse_besparing,
-            'batterij_investering': batterij_investering,
-            'terugverdientijd': terugverdientijd,
-            'totale_besparing_levensduur': totale_besparing_levensduur,
-            'batterij_laadstatus': batterij_laadstatus,
-            'originele_kosten': originele_kosten,
-            'nieuwe_kosten': nieuwe_kosten
+            **roi,
+            **reeksen,
+            'energie': {
+                'zonder_batterij': energie_zonder_batterij,
+                'met_batterij': energie_met_batterij
+            }
         }
     
+    def herprijs(self, tarief_dag=None, tarief_nacht=None, teruglever_tarief=None,
+                 batterij_kosten_per_kwh=None, batterij_levensduur=None, tarief_kalender=None):
+        """
+        Pas tarieven of batterijkosten aan en herbereken alle resultaten zonder te simuleren.
+        
+        De batterij stuurt niet op prijzen, dus de energie per tariefemmer blijft gelijk en
+        alleen de kosten en de ROI worden opnieuw berekend. Na een tariefwijziging kloppen de
+        kostenreeksen per interval niet meer; die worden daarom leeggemaakt (de laadstatus blijft).
+        
+        Een nieuwe tariefkalender met alleen andere prijzen wordt ook zo doorgerekend. Deelt
+        de kalender de intervallen anders in banden in, dan verandert de energie per
+        tariefemmer; de capaciteiten worden dan opnieuw gesimuleerd als de data geladen is.
+        
+        Parameters:
+        tarief_dag (float, optional): Nieuwe prijs per kWh overdag (€).
+        tarief_nacht (float, optional): Nieuwe prijs per kWh 's nachts (€).
+        teruglever_tarief (float, optional): Nieuw teruglevertarief per kWh (€).
+        batterij_kosten_per_kwh (float, optional): Nieuwe batterijkosten per kWh (€).
+        batterij_levensduur (float, optional): Nieuwe levensduur in jaren.
+        tarief_kalender (dict, str of TariefKalender, optional): Nieuwe tariefkalender.
+        """
+        tarieven = {'tarief_dag': tarief_dag, 'tarief_nacht': tarief_nacht, 'teruglever_tarief': teruglever_tarief}
+        tarieven_gewijzigd = any(
+            waarde is not None and waarde != getattr(self, naam) for naam, waarde in tarieven.items()
+        )
+        
+        for naam, waarde in {**tarieven, 'batterij_kosten_per_kwh': batterij_kosten_per_kwh,
+                             'batterij_levensduur': batterij_levensduur}.items():
+            if waarde is not None:
+                setattr(self, naam, waarde)
+        
+        if tarief_kalender is not None:
+            vorige_sleutel = self.kalender().sleutel()
+            self.tarief_kalender = tarief_kalender
+            tarieven_gewijzigd = True
+            if self.kalender().sleutel() != vorige_sleutel:
+                capaciteiten = list(self.batterij_resultaten)
+                self.batterij_resultaten = {}
+                if self.data is None:
+                    print("De tariefkalender deelt de intervallen anders in; simuleer de capaciteiten opnieuw.")
+                else:
+                    self.simuleer_batterij(capaciteiten)
+                return
+        
+        for capaciteit, resultaat in self.batterij_resultaten.items():
+            reeksen = {naam: resultaat[naam] for naam in ('batterij_laadstatus', 'originele_kosten', 'nieuwe_kosten', 'reeks_index')}
+            if tarieven_gewijzigd:
+                reeksen['originele_kosten'] = None
+                reeksen['nieuwe_kosten'] = None
+            self.batterij_resultaten[capaciteit] = self._maak_resultaat(
+                capaciteit,
+                resultaat['energie']['zonder_batterij'],
+                resultaat['energie']['met_batterij'],
+                reeksen
+            )
+    
+    def _prijs_per_interval(self, prijzen, standaard):
+        """Zet een prijs (getal, array per interval of Series met tijdindex) om naar een array per interval."""
+        if prijzen is None:
+            return standaard
+        if isinstance(prijzen, pd.Series) and isinstance(prijzen.index, pd.DatetimeIndex):
+            # Bijv. uurprijzen: elk interval krijgt de laatst bekende prijs
+            return prijzen.sort_index().reindex(self.data['time'], method='ffill').bfill().to_numpy(dtype=np.float64)
+        return np.broadcast_to(np.asarray(prijzen, dtype=np.float64), (len(self.data),))
+    
+    def vergelijk_arbitrage(self, capaciteit, import_prijzen=None, export_prijzen=None, **opties):
+        """
+        Vergelijk prijsbewuste inzet van de batterij met de standaard strategie.
+        
+        Parameters:
+        capaciteit (float): Capaciteit van de batterij in kWh.
+        import_prijzen (optional): Prijs per kWh import, als getal, array per interval of Series
+                                   met een tijdindex (bijv. dynamische uurprijzen). Standaard
+                                   de prijzen uit de tariefkalender.
+        export_prijzen (optional): Vergoeding per kWh export, in dezelfde vormen. Standaard
+                                   het teruglevertarief uit de tariefkalender.
+        **opties: Extra parameters voor thuisbatterij_arbitrage.optimaliseer_dispatch().
+        
+        Returns:
+        dict: Kosten en besparing zonder batterij, met de standaard strategie en met optimale inzet.
+        """
+        if self.data is None:
+            print("Laad eerst de data met de laad_data() methode.")
+            return None
+        
+        standaard_import, standaard_export = self.kalender().prijs_per_interval(
+            self.tariefbanden(), self.tarief_dag, self.tarief_nacht, self.teruglever_tarief
+        )
+        
+        with thuisbatterij_metingen.stap(self.metingen, 'arbitrage', len(self.data)):
+            return thuisbatterij_arbitrage.vergelijk_met_greedy(
+                self.data['totaal_import'].to_numpy(),
+                self.data['totaal_export'].to_numpy(),
+                self._prijs_per_interval(import_prijzen, standaard_import),
+                self._prijs_per_interval(export_prijzen, standaard_export),
+                capaciteit,
+                self.laad_efficiëntie,
+                backend=self.simulatie_backend,
+                vermogen=self.vermogensmodel(),
+                **opties
+            )
+    
+    def monte_carlo(self, capaciteiten=[3, 5, 7, 10, 15, 20], aantal=10000, blok='dag', tarief_dag=None,
+                    tarief_nacht=None, teruglever_tarief=None, laad_efficiëntie=None,
+                    batterij_kosten_per_kwh=None, **opties):
+        """
+        Schat hoe zeker de besparing en terugverdientijd zijn met duizenden synthetische jaren.
+        
+        Elk jaar wordt uit dagen of weken van de geladen data samengesteld, met tarieven,
+        efficiëntie en batterijkosten uit een verdeling. Zie thuisbatterij_montecarlo.
+        
+        Parameters:
+        capaciteiten (list): Te onderzoeken capaciteiten in kWh.
+        aantal (int): Aantal synthetische jaren.
+        blok (str): 'dag' of 'week'.
+        tarief_dag, tarief_nacht, teruglever_tarief, laad_efficiëntie, batterij_kosten_per_kwh:
+            Verdelingen zoals (0.25, 0.35) voor uniform of {'gemiddelde': 0.9, 'std': 0.02}
+            voor normaal; None gebruikt de huidige waarde van de calculator.
+        **opties: Extra parameters voor thuisbatterij_montecarlo.monte_carlo(), bijv. seed.
+        
+        Returns:
+        dict: Percentielbanden van de jaarlijkse besparing en terugverdientijd per capaciteit.
+        """
+        if self.data is None:
+            print("Laad eerst de data met de laad_data() methode.")
+            return None
+        
+        tariefband = self.tariefbanden()
+        
+        # Dagen volgens de lokale klok, zodat een dag van middernacht tot middernacht loopt
+        tijden = self.data['time']
+        if tijden.dt.tz is not None:
+            tijden = tijden.dt.tz_localize(None)
+        dag_nummers = tijden.to_numpy().astype('datetime64[D]').astype(np.int64)
+        
+        def kies(waarde, standaard):
+            return standaard if waarde is None else waarde
+        
+        with thuisbatterij_metingen.stap(self.metingen, 'monte_carlo', len(self.data)):
+            return thuisbatterij_montecarlo.monte_carlo(
+                self.data['totaal_import'].to_numpy(),
+                self.data['totaal_export'].to_numpy(),
+                tariefband,
+                dag_nummers,
+                capaciteiten,
+                aantal,
+                tarief_dag=kies(tarief_dag, self.tarief_dag),
+                tarief_nacht=kies(tarief_nacht, self.tarief_nacht),
+                teruglever_tarief=kies(teruglever_tarief, self.teruglever_tarief),
+                laad_efficiëntie=kies(laad_efficiëntie, self.laad_efficiëntie),
+                batterij_kosten_per_kwh=kies(batterij_kosten_per_kwh, self.batterij_kosten_per_kwh),
+                batterij_levensduur=self.batterij_levensduur,
+                blok=blok,
+                backend=self.simulatie_backend,
+                vermogen=self.vermogensmodel(),
+                kalender=self.kalender(),
+                **opties
+            )
+    
     def toon_resultaten(self):
         """Toon de resultaten van de batterijsimulatie."""
         if not self.batterij_resultaten:
@@ -187,13 +942,35 @@ class ThuisbatterijCalculator:
             print("Gebaseerd op je huidige energieprofiel en de huidige kosten, is een thuisbatterij niet rendabel binnen de levensduur.")
             print("Overweeg om te wachten tot batterijprijzen verder dalen of het teruglevertarief verder afneemt.")
     
-    def visualiseer_resultaten(self, capaciteit=None):
+    def _resultaat_met_reeksen(self, capaciteit):
+        """Geef het resultaat van een capaciteit met tijdreeksen, zo nodig opnieuw gesimuleerd."""
+        resultaat = self.batterij_resultaten[capaciteit]
+        if resultaat['nieuwe_kosten'] is None:
+            if self.data is None:
+                print(f"Voor {capaciteit} kWh zijn geen tijdreeksen bewaard, er valt niets te visualiseren.")
+                return None
+            # Reeksen ontbreken (samenvatting of herprijsd), simuleer deze capaciteit opnieuw
+            detailniveau = 'gedownsampled' if self.detailniveau == 'samenvatting' else self.detailniveau
+            resultaat = self.simuleer_batterijen([capaciteit], detailniveau)[capaciteit]
+            self.batterij_resultaten[capaciteit] = resultaat
+        return resultaat
+    
+    def _reeks_tijden(self, resultaat):
+        """Geef de tijdstippen die bij de reeksen van een resultaat horen."""
+        tijden = self.data['time'].to_numpy()
+        if resultaat['reeks_index'] is not None:
+            tijden = tijden[resultaat['reeks_index']]
+        return tijden
+    
+    def visualiseer_resultaten(self, capaciteit=None, weergave='interval', toon=True):
         """
         Visualiseer de resultaten van de batterijsimulatie.
         
         Parameters:
         capaciteit (float, optional): Specifieke capaciteit om te visualiseren. 
                                     Als None, wordt de meest rendabele getoond.
+        weergave (str): 'interval' (gedecimeerd tot enkele duizenden punten), 'dag' of 'week'.
+        toon (bool): Toon de figuur in een venster; bij False wordt alleen het bestand opgeslagen.
         """
         if not self.batterij_resultaten:
             print("Voer eerst een simulatie uit met de simuleer_batterij() methode.")
@@ -216,34 +993,20 @@ class ThuisbatterijCalculator:
             print(f"Capaciteit {capaciteit} kWh is niet gesimuleerd.")
             return
         
-        resultaat = self.batterij_resultaten[capaciteit]
+        resultaat = self._resultaat_met_reeksen(capaciteit)
+        if resultaat is None:
+            return
         
-        # Maak een nieuwe plot
-        plt.figure(figsize=(15, 10))
-        
-        # Plot 1: Laadstatus van de batterij
-        plt.subplot(2, 1, 1)
-        tijden = self.data['time'].iloc[:len(resultaat['batterij_laadstatus'])]
-        plt.plot(tijden, resultaat['batterij_laadstatus'], label=f'Batterijlading ({capaciteit} kWh)')
-        plt.axhline(y=capaciteit, color='r', linestyle='--', label='Max capaciteit')
-        plt.title(f'Batterijlading over tijd - {capaciteit} kWh capaciteit')
-        plt.ylabel('Lading (kWh)')
-        plt.legend()
-        plt.grid(True)
-        
-        # Plot 2: Vergelijking kosten
-        plt.subplot(2, 1, 2)
-        plt.plot(tijden, np.cumsum(resultaat['originele_kosten']), label='Zonder batterij')
-        plt.plot(tijden, np.cumsum(resultaat['nieuwe_kosten']), label='Met batterij')
-        plt.title('Cumulatieve energiekosten')
-        plt.xlabel('Tijd')
-        plt.ylabel('Cumulatieve kosten (€)')
-        plt.legend()
-        plt.grid(True)
-        
-        plt.tight_layout()
-        plt.savefig(f'batterij_simulatie_{capaciteit}kWh.png')
-        plt.show()
+        # Maak een nieuwe plot met begrensd aantal punten per lijn
+        with thuisbatterij_metingen.stap(self.metingen, 'visualiseren'):
+            figuur = plt.figure(figsize=(15, 10))
+            thuisbatterij_plot.teken_resultaat(figuur, self._reeks_tijden(resultaat), resultaat, capaciteit, weergave)
+            achtervoegsel = '' if weergave == 'interval' else f'_{weergave}'
+            figuur.savefig(f'batterij_simulatie_{capaciteit}kWh{achtervoegsel}.png')
+        if toon:
+            plt.show()
+        else:
+            plt.close(figuur)
         
         # Toon ROI statistieken
         print(f"\n=== ROI ANALYSE VOOR {capaciteit} kWh BATTERIJ ===")
@@ -251,9 +1014,52 @@ class ThuisbatterijCalculator:
         print(f"Investering: € {resultaat['batterij_investering']:.2f}")
         print(f"Terugverdientijd: {resultaat['terugverdientijd']:.2f} jaar")
         print(f"Totale besparing over {self.batterij_levensduur} jaar: € {resultaat['totale_besparing_levensduur']:.2f}")
+    
+    def render_resultaten(self, map_pad='.', formaat='png', weergave='interval', methode='minmax'):
+        """
+        Schrijf voor alle gesimuleerde capaciteiten een figuur naar een bestand, zonder scherm.
+        
+        Gebruikt de Agg backend, dus geschikt voor servers en batchverwerking.
+        
+        Parameters:
+        map_pad (str): Map waarin de bestanden komen.
+        formaat (str): 'png' of 'svg'.
+        weergave (str): 'interval', 'dag' of 'week'.
+        methode (str): Decimatiemethode bij 'interval', 'minmax' of 'lttb'.
+        
+        Returns:
+        list: Paden van de geschreven bestanden.
+        """
+        if not self.batterij_resultaten:
+            print("Voer eerst een simulatie uit met de simuleer_batterij() methode.")
+            return []
+        
+        # Simuleer alle capaciteiten zonder tijdreeksen opnieuw in een enkele doorloop
+        ontbrekend = [cap for cap, res in self.batterij_resultaten.items() if res['nieuwe_kosten'] is None]
+        if ontbrekend:
+            if self.data is None:
+                print("Niet alle capaciteiten hebben tijdreeksen; laad de data om ze opnieuw te simuleren.")
+                ontbrekend = []
+            else:
+                detailniveau = 'gedownsampled' if self.detailniveau == 'samenvatting' else self.detailniveau
+                self.batterij_resultaten.update(self.simuleer_batterijen(ontbrekend, detailniveau))
+
+        resultaten = {cap: res for cap, res in self.batterij_resultaten.items() if res['nieuwe_kosten'] is not None}
+        with thuisbatterij_metingen.stap(self.metingen, 'renderen'):
+            paden = thuisbatterij_plot.render_alle(
+                resultaten, self._reeks_tijden, map_pad, formaat, weergave, methode=methode
+            )
+        print(f"{len(paden)} figuren opgeslagen in: {map_pad}")
+        return paden
 
 # Eenvoudig voorbeeld van gebruik
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Bereken de rendabiliteit van een thuisbatterij.")
+    parser.add_argument('--metingen', metavar='PAD', help="Schrijf de metingen ook als JSON naar dit bestand")
+    args = parser.parse_args()
+    
     # Pad naar de CSV file
     csv_file = "P1e-2024-3-14-2025-3-14.csv"
     
@@ -269,8 +1075,18 @@ if __name__ == "__main__":
         # Simuleer verschillende batterijgroottes
         calculator.simuleer_batterij([3, 5, 7, 10, 15, 20])
         
+        # Zoek de optimale capaciteit tussen de vaste groottes door
+        optimum = calculator.zoek_optimale_capaciteit(1, 20)
+        print(f"\nOptimale capaciteit: {optimum['capaciteit']:.2f} kWh ({optimum['evaluaties']} simulaties)")
+        
         # Toon de resultaten
         calculator.toon_resultaten()
         
         # Visualiseer de resultaten voor de batterij met de beste ROI
-        calculator.visualiseer_resultaten() 
\ No newline at end of file
+        calculator.visualiseer_resultaten()
+        
+        # Toon waar de tijd is gebleven
+        print("\n=== METINGEN ===")
+        print(calculator.metingen.samenvatting())
+        if args.metingen:
+            calculator.metingen.naar_json(args.metingen)
\ No newline at end of file
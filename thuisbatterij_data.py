@@ -0,0 +1,573 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+import thuisbatterij_lui
+import thuisbatterij_metingen
+import thuisbatterij_tarieven
+
+# pandas wordt pas geladen als een DataFrame nodig is; het snelle inleespad gebruikt alleen NumPy
+pd = thuisbatterij_lui.module('pandas')
+
+
+# Verhoog dit nummer als het formaat of de afgeleide kolommen in de cache veranderen
+CACHE_VERSIE = 3
+
+# Standaard locatie van de cache met geparste data
+STANDAARD_CACHE_MAP = os.path.join(os.path.expanduser('~'), '.cache', 'thuisbatterij')
+
+# Kolommen die de calculator uit de CSV gebruikt, met hun type
+METER_KOLOMMEN = {
+    'Import T1 kWh': 'float64',
+    'Import T2 kWh': 'float64',
+    'Export T1 kWh': 'float64',
+    'Export T2 kWh': 'float64',
+}
+FASE_KOLOMMEN = {
+    'L1 max W': 'float32',
+    'L2 max W': 'float32',
+    'L3 max W': 'float32',
+}
+
+# Kolommen die de simulatie per interval nodig heeft; meer houdt de calculator niet vast
+INTERVAL_KOLOMMEN = ('time', 'totaal_import', 'totaal_export', 'tariefband')
+
+# Types die de compacte data kan gebruiken voor de import en export per interval
+DATA_DTYPES = ('float64', 'float32')
+
+# Tijdformaten die eerst expliciet geprobeerd worden, daarna volgt generiek parsen
+TIJD_FORMATEN = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M')
+
+# Tijden die NumPy zelf kan lezen: ISO datum en tijd zonder tijdzone
+_ISO_TIJD = re.compile(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2})?')
+
+# Grootte van de stukken van het bestand die meetellen in de inhoudshash
+_HASH_BLOK = 1024 * 1024
+
+
+def parse_tijd(tijden, tijd_formaat=None):
+    """
+    Converteer een kolom met tijdstippen naar datetime met een expliciet formaat.
+
+    Parameters:
+    tijden (Series): Tijdstippen als tekst.
+    tijd_formaat (str, optional): Te gebruiken formaat; standaard worden TIJD_FORMATEN geprobeerd.
+
+    Returns:
+    Series: Tijdstippen als datetime.
+    """
+    formaten = (tijd_formaat,) if tijd_formaat else TIJD_FORMATEN
+    for formaat in formaten:
+        try:
+            return pd.to_datetime(tijden, format=formaat)
+        except (ValueError, TypeError):
+            continue
+    # Onbekend formaat, val terug op de generieke (langzame) parser
+    return pd.to_datetime(tijden)
+
+
+def bepaal_dagtarief(tijden):
+    """
+    Bepaal per tijdstip of het dagtarief van de standaardkalender geldt (7-23 uur).
+
+    Parameters:
+    tijden (Series of ndarray): Tijdstippen als datetime, of als datetime64 array (lokale tijd).
+
+    Returns:
+    ndarray: Boolean per tijdstip.
+    """
+    return thuisbatterij_tarieven.STANDAARD_KALENDER.tariefband(tijden) == 0
+
+
+def bepaal_tariefband(tijden, kalender=None):
+    """
+    Bepaal per tijdstip de tariefband uit de tariefkalender.
+
+    Parameters:
+    tijden (Series of ndarray): Tijdstippen als datetime, of als datetime64 array (lokale tijd).
+    kalender (TariefKalender, dict of str, optional): Zie thuisbatterij_tarieven.maak_kalender().
+
+    Returns:
+    ndarray: Band per tijdstip (uint8).
+    """
+    return thuisbatterij_tarieven.maak_kalender(kalender).tariefband(tijden)
+
+
+def _lees_kop(csv_file):
+    """Lees de kolomnamen en de eerste regel met data."""
+    with open(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+        lezer = csv.reader(f)
+        kop = next(lezer, [])
+        eerste = next(lezer, None)
+    return kop, eerste
+
+
+def _kolom_types(csv_file, kolommen=None):
+    """Controleer de kolommen van het bestand en bepaal de types van de te lezen kolommen."""
+    aanwezig = set(_lees_kop(csv_file)[0])
+    ontbrekend = [kolom for kolom in ['time', *METER_KOLOMMEN] if kolom not in aanwezig]
+    if ontbrekend:
+        raise ValueError(f"Ontbrekende kolommen in {csv_file}: {', '.join(ontbrekend)}")
+
+    if kolommen is None:
+        kolommen = {**METER_KOLOMMEN, **FASE_KOLOMMEN}
+    return {kolom: dtype for kolom, dtype in kolommen.items() if kolom in aanwezig}
+
+
+def lees_csv_numpy(csv_file, tijd_formaat=None):
+    """
+    Lees de benodigde kolommen van een P1 export met alleen NumPy, in een enkele doorloop.
+
+    Dit pad heeft pandas niet nodig en is ook sneller, maar kent alleen ISO tijden
+    zonder tijdzone (zoals in TIJD_FORMATEN) en een eenvoudige CSV zonder lege velden.
+    Voor andere bestanden geeft het een ValueError; lees_csv valt dan terug op pandas.
+
+    Parameters:
+    csv_file (str): Pad naar het CSV bestand met de energiedata.
+    tijd_formaat (str, optional): Formaat van de tijdkolom.
+
+    Returns:
+    dict: Per kolom een array; 'time' als datetime64[ns], de meterstanden en fasekolommen met hun vaste type.
+    """
+    if tijd_formaat is not None and tijd_formaat not in TIJD_FORMATEN:
+        raise ValueError(f"Tijdformaat {tijd_formaat} wordt alleen door pandas ondersteund.")
+    dtypes = _kolom_types(csv_file)
+    kop, eerste = _lees_kop(csv_file)
+    if eerste is None:
+        raise ValueError(f"{csv_file} bevat geen data.")
+    if not _ISO_TIJD.fullmatch(eerste[kop.index('time')].strip()):
+        raise ValueError(f"Tijden als '{eerste[kop.index('time')]}' worden alleen door pandas ondersteund.")
+
+    namen = ['time', *dtypes]
+    regel_type = np.dtype([('time', 'datetime64[s]'), *((naam, dtypes[naam]) for naam in dtypes)])
+    tabel = np.loadtxt(
+        csv_file, delimiter=',', skiprows=1, usecols=[kop.index(naam) for naam in namen],
+        dtype=regel_type, encoding='utf-8', ndmin=1
+    )
+    kolommen = {naam: np.ascontiguousarray(tabel[naam]) for naam in namen}
+    kolommen['time'] = kolommen['time'].astype('datetime64[ns]')
+    return kolommen
+
+
+def lees_csv(csv_file, tijd_formaat=None, metingen=None):
+    """
+    Lees alleen de benodigde kolommen van een P1 export met vaste datatypes.
+
+    Eerst wordt het snelle NumPy pad geprobeerd (zie lees_csv_numpy); lukt dat niet,
+    dan leest pandas het bestand met een expliciet of generiek tijdformaat.
+
+    Parameters:
+    csv_file (str): Pad naar het CSV bestand met de energiedata.
+    tijd_formaat (str, optional): Formaat van de tijdkolom, bijvoorbeeld '%Y-%m-%d %H:%M:%S'.
+    metingen (Metingen, optional): Meet het parsen en het omzetten van de tijden apart.
+
+    Returns:
+    DataFrame: De tijdkolom en de meterstanden (plus de fasekolommen indien aanwezig).
+    """
+    with thuisbatterij_metingen.stap(metingen, 'csv_parsen') as meting:
+        try:
+            data = pd.DataFrame(lees_csv_numpy(csv_file, tijd_formaat))
+            tijd_geparst = True
+        except ValueError:
+            # Bijv. een ander tijdformaat of lege velden
+            dtypes = _kolom_types(csv_file)
+            data = pd.read_csv(
+                csv_file,
+                usecols=['time', *dtypes],
+                dtype={'time': str, **dtypes},
+                engine='c'
+            )
+            tijd_geparst = False
+        if meting is not None:
+            meting['rijen'] = len(data)
+    if not tijd_geparst:
+        with thuisbatterij_metingen.stap(metingen, 'tijd_parsen', len(data)):
+            data['time'] = parse_tijd(data['time'], tijd_formaat)
+    return data
+
+
+def lees_csv_in_blokken(csv_file, blokgrootte=1_000_000, tijd_formaat=None, kalender=None):
+    """
+    Lees een P1 export in blokken en bereken per blok de import en export per interval.
+
+    Het verschil van de cumulatieve meterstanden loopt door over de blokgrenzen heen,
+    zodat het resultaat gelijk is aan het in een keer inlezen van het hele bestand.
+    Het geheugengebruik hangt alleen af van de blokgrootte.
+
+    Parameters:
+    csv_file (str): Pad naar het CSV bestand met de energiedata.
+    blokgrootte (int): Aantal regels per blok.
+    tijd_formaat (str, optional): Formaat van de tijdkolom.
+    kalender (TariefKalender, optional): Tariefkalender voor de kolom 'tariefband'.
+
+    Yields:
+    DataFrame: Per blok de kolommen 'time', 'totaal_import', 'totaal_export' en 'tariefband',
+               plus de fasekolommen als het bestand die heeft.
+    """
+    kalender = thuisbatterij_tarieven.maak_kalender(kalender)
+    dtypes = _kolom_types(csv_file)
+    vorige_standen = None
+
+    blokken = pd.read_csv(
+        csv_file,
+        usecols=['time', *dtypes],
+        dtype={'time': str, **dtypes},
+        engine='c',
+        chunksize=blokgrootte
+    )
+    for blok in blokken:
+        standen = blok[list(METER_KOLOMMEN)].to_numpy(dtype=np.float64)
+        if vorige_standen is None:
+            # Het eerste interval heeft geen voorganger, net als diff().fillna(0)
+            vorige_standen = np.full(standen.shape[1], np.nan)
+        verschil = np.diff(np.vstack([vorige_standen, standen]), axis=0)
+        verschil[np.isnan(verschil)] = 0.0
+        vorige_standen = standen[-1]
+
+        tijden = parse_tijd(blok['time'], tijd_formaat)
+        yield pd.DataFrame({
+            'time': tijden.to_numpy(),
+            'totaal_import': verschil[:, 0] + verschil[:, 1],
+            'totaal_export': verschil[:, 2] + verschil[:, 3],
+            'tariefband': kalender.tariefband(tijden),
+            **{kolom: blok[kolom].to_numpy() for kolom in FASE_KOLOMMEN if kolom in blok},
+        })
+
+
+def bereken_interval_kolommen(kolommen, kalender=None):
+    """
+    Leid import, export en tariefband per interval af uit de cumulatieve meterstanden.
+
+    Parameters:
+    kolommen (dict of DataFrame): 'time' en de kolommen uit METER_KOLOMMEN.
+    kalender (TariefKalender, optional): Tariefkalender, standaard dag 7-23 uur.
+
+    Returns:
+    dict: 'totaal_import', 'totaal_export' (kWh per interval) en 'tariefband'.
+    """
+    def verschil(kolom):
+        # Het eerste interval en ontbrekende standen tellen als 0, net als diff().fillna(0)
+        waarden = np.diff(np.asarray(kolommen[kolom], dtype=np.float64), prepend=np.nan)
+        waarden[np.isnan(waarden)] = 0.0
+        return waarden
+
+    # De verschillen per telwerk zijn alleen een tussenstap en worden niet bewaard
+    intervallen = {}
+    intervallen['totaal_import'] = verschil('Import T1 kWh')
+    intervallen['totaal_import'] += verschil('Import T2 kWh')
+    intervallen['totaal_export'] = verschil('Export T1 kWh')
+    intervallen['totaal_export'] += verschil('Export T2 kWh')
+
+    tijden = kolommen['time']
+    intervallen['tariefband'] = bepaal_tariefband(
+        tijden if isinstance(tijden, np.ndarray) else pd.Series(tijden), kalender
+    )
+    return intervallen
+
+
+def compacte_kolommen(kolommen, dtype='float64'):
+    """
+    Beperk de data tot aaneengesloten arrays van alleen de kolommen die nog gelezen worden.
+
+    De meterstanden zijn na het afleiden van de intervalwaarden niet meer nodig. Over
+    blijven de tijd, de import en export per interval (in 'dtype'), de tariefband als
+    een byte en de fasevermogens (float32) als het bestand die heeft.
+
+    Parameters:
+    kolommen (dict of DataFrame): Data met minstens de INTERVAL_KOLOMMEN.
+    dtype (str): 'float64' of 'float32' voor de import en export per interval.
+
+    Returns:
+    dict: Per kolom een aaneengesloten array (tijden als datetime64 of Series met tijdzone).
+    """
+    if dtype not in DATA_DTYPES:
+        raise ValueError(f"Onbekend datatype '{dtype}', kies uit {', '.join(DATA_DTYPES)}.")
+
+    compact = {}
+    for naam in (*INTERVAL_KOLOMMEN, *FASE_KOLOMMEN):
+        if naam not in kolommen:
+            continue
+        kolom = kolommen[naam]
+        if naam == 'time':
+            # Tijden met een tijdzone blijven een Series, anders gaat de tijdzone verloren
+            tijdzone = getattr(getattr(kolom, 'dt', None), 'tz', None)
+            compact[naam] = kolom if tijdzone is not None else np.asarray(kolom).astype('datetime64[ns]', copy=False)
+            continue
+        doel = {'tariefband': np.uint8, 'totaal_import': dtype, 'totaal_export': dtype}.get(naam, FASE_KOLOMMEN.get(naam))
+        compact[naam] = np.ascontiguousarray(np.asarray(kolom), dtype=doel)
+    return compact
+
+
+def compacte_data(kolommen, dtype='float64'):
+    """
+    Maak een DataFrame van compacte_kolommen() dat de arrays deelt in plaats van kopieert.
+
+    Returns:
+    DataFrame: Een kolom per array, zonder samenvoegen tot blokken (memory-mapped
+               arrays uit de cache blijven zo ook gedeeld).
+    """
+    return pd.DataFrame(compacte_kolommen(kolommen, dtype), copy=False)
+
+
+def interval_uren(tijden, vorige_tijd=None):
+    """
+    Bepaal de duur van elk interval in uren: de tijd sinds het vorige tijdstip.
+
+    Het eerste interval (zonder vorige_tijd) en dubbele tijdstippen krijgen de
+    gebruikelijke intervalduur, zodat er nooit een duur van 0 is.
+
+    Parameters:
+    tijden (Series of ndarray): Tijdstippen als datetime, of als datetime64 array.
+    vorige_tijd (datetime64, optional): Tijdstip voor het eerste interval, bijv. het
+                                        laatste tijdstip van het vorige blok.
+
+    Returns:
+    ndarray: Duur per interval in uren.
+    """
+    if not isinstance(tijden, np.ndarray):
+        if tijden.dt.tz is not None:
+            tijden = tijden.dt.tz_convert('UTC').dt.tz_localize(None)
+        tijden = tijden.to_numpy()
+    ns = tijden.astype('datetime64[ns]').astype(np.int64)
+    if len(ns) == 0:
+        return np.empty(0)
+
+    if getattr(vorige_tijd, 'tzinfo', None) is not None:
+        vorige_tijd = vorige_tijd.tz_convert('UTC').tz_localize(None)
+    eerste = ns[0] if vorige_tijd is None else np.datetime64(vorige_tijd, 'ns').astype(np.int64)
+    uren = np.diff(ns, prepend=eerste) / 3.6e12
+    positief = uren[uren > 0]
+    if len(positief) == 0:
+        raise ValueError("De duur van de intervallen kan niet bepaald worden uit de tijden.")
+    uren[uren <= 0] = np.median(positief)
+    return uren
+
+
+def parse_interval(interval):
+    """
+    Zet een interval om naar een Timedelta.
+
+    Parameters:
+    interval (str, int of Timedelta): Bijv. '5min', '15min' of een aantal seconden.
+
+    Returns:
+    Timedelta: Het interval.
+    """
+    if isinstance(interval, (int, float, np.integer, np.floating)):
+        interval = pd.Timedelta(seconds=float(interval))
+    else:
+        interval = pd.Timedelta(interval)
+    if interval <= pd.Timedelta(0):
+        raise ValueError(f"Het interval moet positief zijn, niet {interval}.")
+    return interval
+
+
+def resample_intervallen(data, interval):
+    """
+    Voeg de intervalwaarden samen tot emmers van een vaste lengte.
+
+    Een emmer wordt bij een wissel van tariefband gesplitst, zodat elke rij
+    precies één tarief heeft en de totalen per tariefemmer exact gelijk blijven. Import
+    en export binnen een emmer worden los opgeteld (niet tegen elkaar weggestreept), dus
+    de kosten zonder batterij veranderen niet. Alleen de batterij ziet minder detail:
+    binnen een emmer kan hij niet eerst laden en daarna ontladen.
+
+    Parameters:
+    data (DataFrame): Data met 'time', 'totaal_import', 'totaal_export' en 'tariefband'.
+    interval (str, int of Timedelta): Lengte van de emmers, bijv. '5min' of 300 (seconden).
+
+    Returns:
+    DataFrame: Een rij per emmer. Intervalwaarden worden opgeteld, cumulatieve
+               meterstanden nemen de laatste stand, fasevermogens het maximum en
+               'time' het eerste tijdstip van de emmer.
+    """
+    stap = parse_interval(interval).value
+    aantal = len(data)
+    if aantal == 0:
+        return data.copy()
+
+    # Emmers op de lokale kloktijd, zodat bijv. kwartieren op hele kwartieren beginnen
+    tijden = data['time']
+    if tijden.dt.tz is not None:
+        tijden = tijden.dt.tz_localize(None)
+    emmer = tijden.to_numpy(dtype='datetime64[ns]').view(np.int64) // stap
+    tariefband = data['tariefband'].to_numpy()
+
+    grens = np.empty(aantal, dtype=bool)
+    grens[0] = True
+    grens[1:] = (emmer[1:] != emmer[:-1]) | (tariefband[1:] != tariefband[:-1])
+    begin = np.flatnonzero(grens)
+    eind = np.append(begin[1:], aantal) - 1
+
+    kolommen = {}
+    for naam, kolom in data.items():
+        if naam in ('time', 'tariefband'):
+            kolommen[naam] = kolom.iloc[begin].reset_index(drop=True)
+        elif naam in METER_KOLOMMEN:
+            kolommen[naam] = kolom.to_numpy()[eind]
+        elif naam in FASE_KOLOMMEN:
+            kolommen[naam] = np.maximum.reduceat(kolom.to_numpy(), begin)
+        elif pd.api.types.is_numeric_dtype(kolom) and not pd.api.types.is_bool_dtype(kolom):
+            kolommen[naam] = np.add.reduceat(kolom.to_numpy(), begin)
+    return pd.DataFrame(kolommen)
+
+
+def _inhoud_hash(csv_file, grootte):
+    """
+    Bereken een hash over het begin, midden en einde van het bestand.
+
+    Een volledige hash zou net zo lang duren als het parsen zelf; samen met grootte en
+    wijzigingstijd vangen deze steekproeven vrijwel elke wijziging van een meterexport.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(csv_file, 'rb') as f:
+        for positie in sorted({0, max(0, grootte // 2 - _HASH_BLOK // 2), max(0, grootte - _HASH_BLOK)}):
+            f.seek(positie)
+            h.update(f.read(_HASH_BLOK))
+    return h.hexdigest()
+
+
+def cache_sleutel(csv_file, extra=None):
+    """
+    Bepaal de cachesleutel van een CSV bestand op basis van pad, grootte, wijzigingstijd en inhoud.
+
+    Parameters:
+    csv_file (str): Pad naar het CSV bestand.
+    extra (dict, optional): Aanvullende instellingen die de geparste data beïnvloeden.
+
+    Returns:
+    str: Hexadecimale sleutel.
+    """
+    pad = os.path.abspath(csv_file)
+    stat = os.stat(pad)
+    onderdelen = {
+        'versie': CACHE_VERSIE,
+        'pad': pad,
+        'grootte': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'inhoud': _inhoud_hash(pad, stat.st_size),
+        'extra': extra or {},
+    }
+    return hashlib.blake2b(json.dumps(onderdelen, sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def laad_uit_cache(csv_file, cache_map, extra=None):
+    """
+    Laad eerder geparste data uit de cache.
+
+    Parameters:
+    csv_file (str): Pad naar het CSV bestand.
+    cache_map (str): Map met de cache.
+    extra (dict, optional): Aanvullende instellingen die in de sleutel meetellen.
+
+    Returns:
+    DataFrame of None: De gecachete data, of None als er (nog) niets in de cache staat.
+    """
+    gelezen = _lees_cache(csv_file, cache_map, extra)
+    if gelezen is None:
+        return None
+
+    kolommen = {}
+    for kolom, array in gelezen:
+        if kolom['soort'] == 'datetime':
+            tijden = pd.to_datetime(array, unit='ns', utc=kolom['tz'] is not None)
+            if kolom['tz'] is not None:
+                tijden = tijden.tz_convert(kolom['tz'])
+            kolommen[kolom['naam']] = tijden
+        else:
+            kolommen[kolom['naam']] = array
+    # Zonder kopie blijven de kolommen memory-mapped
+    return pd.DataFrame(kolommen, copy=False)
+
+
+def laad_arrays_uit_cache(csv_file, cache_map, extra=None):
+    """
+    Laad eerder geparste data uit de cache als NumPy arrays, zonder pandas.
+
+    Parameters:
+    csv_file (str): Pad naar het CSV bestand.
+    cache_map (str): Map met de cache.
+    extra (dict, optional): Aanvullende instellingen die in de sleutel meetellen.
+
+    Returns:
+    dict of None: Per kolom een array (tijden als datetime64[ns], in UTC als de tijden
+                  een tijdzone hadden), of None als er niets in de cache staat.
+    """
+    gelezen = _lees_cache(csv_file, cache_map, extra)
+    if gelezen is None:
+        return None
+    return {
+        kolom['naam']: array.view('datetime64[ns]') if kolom['soort'] == 'datetime' else array
+        for kolom, array in gelezen
+    }
+
+
+def _lees_cache(csv_file, cache_map, extra=None):
+    """Lees de kolommen van een cache-entry als (beschrijving, array) paren, of None."""
+    map_pad = os.path.join(cache_map, cache_sleutel(csv_file, extra))
+    meta_pad = os.path.join(map_pad, 'meta.json')
+    if not os.path.exists(meta_pad):
+        return None
+
+    try:
+        with open(meta_pad, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return [
+            (kolom, np.asarray(np.load(os.path.join(map_pad, kolom['bestand']), mmap_mode='r')))
+            for kolom in meta['kolommen']
+        ]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Cache voor {csv_file} kon niet gelezen worden, bestand wordt opnieuw geparst: {e}")
+        return None
+
+
+def schrijf_naar_cache(csv_file, data, cache_map, extra=None):
+    """
+    Sla geparste en afgeleide kolommen op als losse .npy bestanden.
+
+    Parameters:
+    csv_file (str): Pad naar het CSV bestand.
+    data (DataFrame of dict): Op te slaan kolommen; een dict met NumPy arrays kan ook.
+    cache_map (str): Map met de cache.
+    extra (dict, optional): Aanvullende instellingen die in de sleutel meetellen.
+    """
+    tijdelijk = None
+    try:
+        os.makedirs(cache_map, exist_ok=True)
+        map_pad = os.path.join(cache_map, cache_sleutel(csv_file, extra))
+        tijdelijk = tempfile.mkdtemp(dir=cache_map, prefix='.schrijven-')
+
+        meta = {'bron': os.path.abspath(csv_file), 'kolommen': []}
+        for i, (naam, kolom) in enumerate(data.items()):
+            bestand = f'{i}.npy'
+            if isinstance(kolom, np.ndarray):
+                soort = 'datetime' if np.issubdtype(kolom.dtype, np.datetime64) else 'waarde'
+                array = kolom.astype('datetime64[ns]').view(np.int64) if soort == 'datetime' else kolom
+                meta['kolommen'].append({'naam': naam, 'bestand': bestand, 'soort': soort, 'tz': None})
+            elif pd.api.types.is_datetime64_any_dtype(kolom):
+                tz = str(kolom.dt.tz) if kolom.dt.tz is not None else None
+                waarden = kolom.dt.tz_convert('UTC') if tz is not None else kolom
+                array = waarden.to_numpy(dtype='datetime64[ns]').view(np.int64)
+                meta['kolommen'].append({'naam': naam, 'bestand': bestand, 'soort': 'datetime', 'tz': tz})
+            else:
+                array = kolom.to_numpy()
+                meta['kolommen'].append({'naam': naam, 'bestand': bestand, 'soort': 'waarde'})
+            np.save(os.path.join(tijdelijk, bestand), array)
+
+        with open(os.path.join(tijdelijk, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        # Maak de cache-entry pas zichtbaar als alles geschreven is
+        if os.path.exists(map_pad):
+            shutil.rmtree(map_pad, ignore_errors=True)
+        os.replace(tijdelijk, map_pad)
+    except OSError as e:
+        print(f"Kon de cache niet schrijven naar {cache_map}: {e}")
+        if tijdelijk is not None:
+            shutil.rmtree(tijdelijk, ignore_errors=True)
@@ -1,14 +1,86 @@
 import sys
 import os
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QLineEdit, QPushButton, QFileDialog, QGroupBox, 
-                            QComboBox, QMessageBox, QCheckBox, QListWidget, QTextEdit)
-from PyQt5.QtCore import Qt
+                            QComboBox, QMessageBox, QCheckBox, QListWidget, QTextEdit,
+                            QProgressBar)
+from PyQt5.QtCore import Qt, QObject, QThread, pyqtSignal
 from thuisbatterij_calculator import ThuisbatterijCalculator
 
+class SimulatieGeannuleerd(Exception):
+    """Breekt een lopende simulatie af na het huidige tijdsblok"""
+
+
+class SimulatieWorker(QObject):
+    """Laadt de data en simuleert de capaciteiten in een achtergrondthread"""
+    voortgang = pyqtSignal(int, int, str)  # stap, totaal aantal stappen, omschrijving
+    resultaat = pyqtSignal(object)  # resultaat van een enkele capaciteit, pas na de hele doorloop
+    optimum = pyqtSignal(object)  # resultaat van zoek_optimale_capaciteit
+    klaar = pyqtSignal(bool)  # True als alles is doorgerekend, False na annuleren
+    fout = pyqtSignal(str)
+    
+    def __init__(self, calculator, capaciteiten, data_laden, zoek_optimum):
+        super().__init__()
+        self.calculator = calculator
+        self.capaciteiten = capaciteiten
+        self.data_laden = data_laden
+        self.zoek_optimum = zoek_optimum
+        self._geannuleerd = False
+    
+    def annuleer(self):
+        """Vraag de worker om te stoppen na het huidige tijdsblok; een afgebroken doorloop levert niets op"""
+        self._geannuleerd = True
+    
+    def _controleer(self):
+        """Breek af als om annuleren is gevraagd"""
+        if self._geannuleerd:
+            raise SimulatieGeannuleerd()
+    
+    def run(self):
+        """Voer het laden en simuleren uit en meld de voortgang per tijdsblok"""
+        # Elke stap telt even zwaar; binnen de simulatie loopt de voortgang per tijdsblok
+        schaal = 1000
+        totaal = (1 + int(self.data_laden) + int(self.zoek_optimum)) * schaal
+        stap = 0
+        try:
+            if self.data_laden:
+                self.voortgang.emit(stap, totaal, "Data laden...")
+                if not self.calculator.laad_data():
+                    self.fout.emit("Fout bij het laden van de data. Controleer het CSV bestand.")
+                    return
+                stap += schaal
+            
+            # Alle capaciteiten samen in een enkele doorloop van de data
+            omschrijving = f"Simuleren van {len(self.capaciteiten)} capaciteiten..."
+            
+            def bij_blok(verwerkt, aantal):
+                self._controleer()
+                self.voortgang.emit(stap + schaal * verwerkt // max(aantal, 1), totaal, omschrijving)
+            
+            self._controleer()
+            self.voortgang.emit(stap, totaal, omschrijving)
+            self.calculator.bij_blok = bij_blok
+            self.calculator.simuleer_batterij(self.capaciteiten)
+            stap += schaal
+            for capaciteit in self.capaciteiten:
+                self.resultaat.emit(self.calculator.batterij_resultaten[capaciteit])
+            
+            if self.zoek_optimum:
+                self._controleer()
+                self.voortgang.emit(stap, totaal, "Optimale capaciteit zoeken...")
+                self.calculator.bij_blok = lambda verwerkt, aantal: self._controleer()
+                self.optimum.emit(self.calculator.zoek_optimale_capaciteit(1, 30))
+                stap += schaal
+            
+            self.voortgang.emit(totaal, totaal, "Klaar")
+            self.klaar.emit(True)
+        except SimulatieGeannuleerd:
+            self.klaar.emit(False)
+        except Exception as e:
+            self.fout.emit(f"Fout tijdens de simulatie: {e}")
+        finally:
+            self.calculator.bij_blok = None
+
 class ThuisbatterijGUI(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -18,6 +90,12 @@ class ThuisbatterijGUI(QMainWindow):
         # Initialiseer de calculator
         self.calculator = None
         self.csv_file = None
+        self.data_sleutel = None  # (pad, grootte, wijzigingstijd) van de geladen data
+        
+        # Achtergrondthread van de lopende simulatie
+        self.thread = None
+        self.worker = None
+        self.optimum = None
         
         # Maak de centrale widget en layout
         self.central_widget = QWidget()
@@ -31,11 +109,23 @@ class ThuisbatterijGUI(QMainWindow):
         self.maak_simulatie_instellingen()
         self.maak_resultaten_weergave()
         
-        # Voeg een knop toe om de simulatie te starten
+        # Voeg knoppen toe om de simulatie te starten en te annuleren
+        knoppen_layout = QHBoxLayout()
         self.start_button = QPushButton("Start Simulatie")
         self.start_button.setEnabled(False)
         self.start_button.clicked.connect(self.start_simulatie)
-        self.main_layout.addWidget(self.start_button)
+        knoppen_layout.addWidget(self.start_button)
+        
+        self.annuleer_button = QPushButton("Annuleer")
+        self.annuleer_button.setEnabled(False)
+        self.annuleer_button.clicked.connect(self.annuleer_simulatie)
+        knoppen_layout.addWidget(self.annuleer_button)
+        self.main_layout.addLayout(knoppen_layout)
+        
+        # Voortgangsbalk voor de lopende simulatie
+        self.voortgang_balk = QProgressBar()
+        self.voortgang_balk.setFormat("%p% - gereed")
+        self.main_layout.addWidget(self.voortgang_balk)
     
     def maak_bestandsselectie(self):
         """Maak de bestandsselectie sectie"""
@@ -79,6 +169,10 @@ class ThuisbatterijGUI(QMainWindow):
         self.teruglever_label = QLabel("Teruglevertarief (€/kWh):")
         self.teruglever_veld = QLineEdit("0.10")
         
+        # Herbereken bestaande resultaten direct als een tarief wordt aangepast
+        for veld in (self.dag_veld, self.nacht_veld, self.teruglever_veld):
+            veld.editingFinished.connect(self.herprijs_resultaten)
+        
         # Voeg alles toe aan de layout
         tarief_layout.addWidget(self.dag_label)
         tarief_layout.addWidget(self.dag_veld)
@@ -109,6 +203,10 @@ class ThuisbatterijGUI(QMainWindow):
         self.efficientie_label = QLabel("Laad/ontlaad efficiëntie (%):")
         self.efficientie_veld = QLineEdit("90")
         
+        # Batterijkosten en levensduur veranderen alleen de ROI, niet de simulatie
+        for veld in (self.batterij_kosten_veld, self.levensduur_veld):
+            veld.editingFinished.connect(self.herprijs_resultaten)
+        
         # Voeg alles toe aan de layout
         batterij_layout.addWidget(self.batterij_kosten_label)
         batterij_layout.addWidget(self.batterij_kosten_veld)
@@ -141,9 +239,13 @@ class ThuisbatterijGUI(QMainWindow):
             self.capaciteit_checks[capaciteit] = checkbox
             capaciteiten_layout.addWidget(checkbox)
         
+        # Optie om naast de vaste groottes ook de optimale capaciteit te zoeken
+        self.optimum_check = QCheckBox("Zoek ook de optimale capaciteit (1-30 kWh)")
+        
         # Voeg alles toe aan de simulatie layout
         simulatie_layout.addWidget(instructie_label)
         simulatie_layout.addLayout(capaciteiten_layout)
+        simulatie_layout.addWidget(self.optimum_check)
         simulatie_group.setLayout(simulatie_layout)
         
         # Voeg de groep toe aan de main layout
@@ -174,6 +276,12 @@ class ThuisbatterijGUI(QMainWindow):
         self.visualiseer_combobox.setEnabled(False)
         knoppen_layout.addWidget(self.visualiseer_combobox)
         
+        # Knop om de duur van de verschillende stappen te bekijken
+        self.metingen_knop = QPushButton("Metingen")
+        self.metingen_knop.setEnabled(False)
+        self.metingen_knop.clicked.connect(self.toon_metingen)
+        knoppen_layout.addWidget(self.metingen_knop)
+        
         # Toevoegen van de knoppen layout aan de resultaten layout
         resultaten_layout.addLayout(knoppen_layout)
         resultaten_group.setLayout(resultaten_layout)
@@ -199,23 +307,20 @@ class ThuisbatterijGUI(QMainWindow):
             QMessageBox.warning(self, "Waarschuwing", "Selecteer eerst een CSV bestand.")
             return
         
-        # Maak een nieuwe calculator
-        self.calculator = ThuisbatterijCalculator(self.csv_file)
-        
         # Lees de tarief instellingen
         try:
-            self.calculator.tarief_dag = float(self.dag_veld.text().replace(',', '.'))
-            self.calculator.tarief_nacht = float(self.nacht_veld.text().replace(',', '.'))
-            self.calculator.teruglever_tarief = float(self.teruglever_veld.text().replace(',', '.'))
+            tarief_dag = float(self.dag_veld.text().replace(',', '.'))
+            tarief_nacht = float(self.nacht_veld.text().replace(',', '.'))
+            teruglever_tarief = float(self.teruglever_veld.text().replace(',', '.'))
         except ValueError:
             QMessageBox.warning(self, "Waarschuwing", "Ongeldige tariefwaarden. Gebruik numerieke waarden.")
             return
         
         # Lees de batterij instellingen
         try:
-            self.calculator.batterij_kosten_per_kwh = float(self.batterij_kosten_veld.text().replace(',', '.'))
-            self.calculator.batterij_levensduur = float(self.levensduur_veld.text().replace(',', '.'))
-            self.calculator.laad_efficiëntie = float(self.efficientie_veld.text().replace(',', '.')) / 100
+            batterij_kosten_per_kwh = float(self.batterij_kosten_veld.text().replace(',', '.'))
+            batterij_levensduur = float(self.levensduur_veld.text().replace(',', '.'))
+            laad_efficiëntie = float(self.efficientie_veld.text().replace(',', '.')) / 100
         except ValueError:
             QMessageBox.warning(self, "Waarschuwing", "Ongeldige batterijwaarden. Gebruik numerieke waarden.")
             return
@@ -226,17 +331,119 @@ class ThuisbatterijGUI(QMainWindow):
             QMessageBox.warning(self, "Waarschuwing", "Selecteer minstens één batterijcapaciteit.")
             return
         
-        # Laad de data en voer de simulatie uit
+        # Hergebruik de geladen data zolang het bestand niet veranderd is
+        try:
+            stat = os.stat(self.csv_file)
+        except OSError as e:
+            QMessageBox.warning(self, "Waarschuwing", f"Kan het CSV bestand niet lezen: {e}")
+            return
+        sleutel = (os.path.abspath(self.csv_file), stat.st_size, stat.st_mtime_ns)
+        data_laden = self.calculator is None or self.calculator.data is None or sleutel != self.data_sleutel
+        if data_laden:
+            if self.calculator is not None:
+                self.calculator.ruim_reeks_bestanden_op(alles=True)
+            self.calculator = ThuisbatterijCalculator(self.csv_file)
+            self.data_sleutel = sleutel
+        
+        self.calculator.tarief_dag = tarief_dag
+        self.calculator.tarief_nacht = tarief_nacht
+        self.calculator.teruglever_tarief = teruglever_tarief
+        self.calculator.batterij_kosten_per_kwh = batterij_kosten_per_kwh
+        self.calculator.batterij_levensduur = batterij_levensduur
+        self.calculator.laad_efficiëntie = laad_efficiëntie
+        self.calculator.batterij_resultaten = {}
+        self.calculator.metingen.reset()
+        
+        # Toon de tabelkop, de rijen volgen als de doorloop over alle capaciteiten klaar is
         self.resultaten_tekst.clear()
-        self.resultaten_tekst.append("Data laden en simulatie uitvoeren...")
-        QApplication.processEvents()  # Update de UI
+        self.toon_tabel_kop()
+        self.visualiseer_knop.setEnabled(False)
+        self.visualiseer_combobox.setEnabled(False)
+        self.metingen_knop.setEnabled(False)
+        self.optimum = None
+        
+        # Start de simulatie in een achtergrondthread zodat het venster blijft reageren
+        self.thread = QThread()
+        self.worker = SimulatieWorker(self.calculator, te_simuleren, data_laden, self.optimum_check.isChecked())
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.worker.voortgang.connect(self.toon_voortgang)
+        self.worker.resultaat.connect(self.toon_resultaat_rij)
+        self.worker.optimum.connect(self.bewaar_optimum)
+        self.worker.klaar.connect(self.simulatie_klaar)
+        self.worker.fout.connect(self.simulatie_fout)
+        self.thread.finished.connect(self.thread.deleteLater)
         
-        if self.calculator.laad_data():
-            self.calculator.simuleer_batterij(te_simuleren)
-            
-            # Weergeef de resultaten
-            self.toon_resultaten()
-            
+        self.start_button.setEnabled(False)
+        self.bestand_knop.setEnabled(False)
+        self.annuleer_button.setEnabled(True)
+        self.thread.start()
+    
+    def herprijs_resultaten(self):
+        """Herberekent de getoonde resultaten met de nieuwe tarieven zonder opnieuw te simuleren"""
+        if self.worker is not None or not self.calculator or not self.calculator.batterij_resultaten:
+            return
+        
+        try:
+            self.calculator.herprijs(
+                tarief_dag=float(self.dag_veld.text().replace(',', '.')),
+                tarief_nacht=float(self.nacht_veld.text().replace(',', '.')),
+                teruglever_tarief=float(self.teruglever_veld.text().replace(',', '.')),
+                batterij_kosten_per_kwh=float(self.batterij_kosten_veld.text().replace(',', '.')),
+                batterij_levensduur=float(self.levensduur_veld.text().replace(',', '.'))
+            )
+        except ValueError:
+            # Ongeldige invoer wordt gemeld zodra de simulatie gestart wordt
+            return
+        
+        self.toon_resultaten()
+        if self.optimum is not None:
+            self.resultaten_tekst.append("\nStart de simulatie opnieuw om de optimale capaciteit bij deze prijzen te zoeken.")
+    
+    def annuleer_simulatie(self):
+        """Stopt de lopende simulatie na het huidige tijdsblok"""
+        if self.worker is not None:
+            self.worker.annuleer()
+            self.annuleer_button.setEnabled(False)
+            self.voortgang_balk.setFormat("%p% - annuleren...")
+    
+    def toon_voortgang(self, stap, totaal, omschrijving):
+        """Werkt de voortgangsbalk bij"""
+        self.voortgang_balk.setMaximum(totaal)
+        self.voortgang_balk.setValue(stap)
+        self.voortgang_balk.setFormat(f"%p% - {omschrijving}")
+    
+    def toon_resultaat_rij(self, resultaat):
+        """Voegt de rij van een zojuist gesimuleerde capaciteit toe aan het tekstgebied"""
+        self.resultaten_tekst.append(self.formatteer_rij(resultaat))
+    
+    def bewaar_optimum(self, optimum):
+        """Onthoudt het resultaat van de zoektocht naar de optimale capaciteit"""
+        self.optimum = optimum
+    
+    def simulatie_klaar(self, voltooid):
+        """Toont de volledige resultaten zodra de worker klaar of geannuleerd is"""
+        self.stop_thread()
+        
+        # Weergeef de resultaten
+        self.toon_resultaten()
+        if self.optimum is not None:
+            self.resultaten_tekst.append(
+                f"\nOptimale capaciteit: {self.optimum['capaciteit']:.2f} kWh "
+                f"(totale besparing € {self.optimum['waarde']:.2f}, {self.optimum['evaluaties']} simulaties)"
+            )
+        if not voltooid:
+            # Alle capaciteiten worden in een doorloop gesimuleerd, dus na afbreken is er niets of alles
+            if self.calculator.batterij_resultaten:
+                self.resultaten_tekst.append("\nZoeken naar de optimale capaciteit geannuleerd, "
+                                             "de gesimuleerde capaciteiten worden wel getoond.")
+            else:
+                self.resultaten_tekst.append("\nSimulatie geannuleerd voordat alle capaciteiten klaar waren, "
+                                             "er zijn geen resultaten.")
+            self.voortgang_balk.setFormat("%p% - geannuleerd")
+        
+        self.metingen_knop.setEnabled(True)
+        if self.calculator.batterij_resultaten:
             # Activeer de visualisatie knop
             self.visualiseer_knop.setEnabled(True)
             
@@ -245,8 +452,55 @@ class ThuisbatterijGUI(QMainWindow):
             for cap in sorted(self.calculator.batterij_resultaten.keys()):
                 self.visualiseer_combobox.addItem(f"{cap} kWh", cap)
             self.visualiseer_combobox.setEnabled(True)
-        else:
-            self.resultaten_tekst.append("Fout bij het laden van de data. Controleer het CSV bestand.")
+    
+    def simulatie_fout(self, melding):
+        """Toont een foutmelding van de worker"""
+        self.stop_thread()
+        self.resultaten_tekst.append(melding)
+        self.voortgang_balk.setFormat("%p% - mislukt")
+        
+        # Laad de data de volgende keer opnieuw
+        self.data_sleutel = None
+    
+    def stop_thread(self):
+        """Ruimt de achtergrondthread op en zet de knoppen terug"""
+        if self.thread is not None:
+            self.thread.quit()
+            self.thread.wait()
+        self.thread = None
+        self.worker = None
+        self.start_button.setEnabled(True)
+        self.bestand_knop.setEnabled(True)
+        self.annuleer_button.setEnabled(False)
+    
+    def closeEvent(self, event):
+        """Stopt een lopende simulatie voordat het venster sluit"""
+        if self.worker is not None:
+            self.worker.annuleer()
+            self.stop_thread()
+        if self.calculator is not None:
+            self.calculator.ruim_reeks_bestanden_op(alles=True)
+        super().closeEvent(event)
+    
+    def toon_tabel_kop(self):
+        """Toont de kop van de resultatentabel"""
+        self.resultaten_tekst.append("=== RESULTATEN THUISBATTERIJ ANALYSE ===\n")
+        header = "{:<15} {:<25} {:<20} {:<25} {:<35}".format(
+            "Capaciteit (kWh)", "Jaarlijkse Besparing (€)", "Investering (€)", 
+            "Terugverdientijd (jaren)", "Totale Besparing over Levensduur (€)"
+        )
+        self.resultaten_tekst.append(header)
+        self.resultaten_tekst.append("-" * 120)
+    
+    def formatteer_rij(self, resultaat):
+        """Maakt een tabelrij van het resultaat van een capaciteit"""
+        return "{:<15.1f} {:<25.2f} {:<20.2f} {:<25.2f} {:<35.2f}".format(
+            resultaat['capaciteit'],
+            resultaat['jaarlijkse_besparing'],
+            resultaat['batterij_investering'],
+            resultaat['terugverdientijd'],
+            resultaat['totale_besparing_levensduur']
+        )
     
     def toon_resultaten(self):
         """Toont de resultaten van de simulatie in het tekstgebied"""
@@ -256,27 +510,14 @@ class ThuisbatterijGUI(QMainWindow):
         self.resultaten_tekst.clear()
         
         # Tabel header
-        self.resultaten_tekst.append("=== RESULTATEN THUISBATTERIJ ANALYSE ===\n")
-        header = "{:<15} {:<25} {:<20} {:<25} {:<35}".format(
-            "Capaciteit (kWh)", "Jaarlijkse Besparing (€)", "Investering (€)", 
-            "Terugverdientijd (jaren)", "Totale Besparing over Levensduur (€)"
-        )
-        self.resultaten_tekst.append(header)
-        self.resultaten_tekst.append("-" * 120)
+        self.toon_tabel_kop()
         
         # Toon de resultaten voor elke gesimuleerde capaciteit
         beste_roi = None
         beste_capaciteit = None
         
         for capaciteit, resultaat in sorted(self.calculator.batterij_resultaten.items()):
-            rij = "{:<15.1f} {:<25.2f} {:<20.2f} {:<25.2f} {:<35.2f}".format(
-                resultaat['capaciteit'],
-                resultaat['jaarlijkse_besparing'],
-                resultaat['batterij_investering'],
-                resultaat['terugverdientijd'],
-                resultaat['totale_besparing_levensduur']
-            )
-            self.resultaten_tekst.append(rij)
+            self.resultaten_tekst.append(self.formatteer_rij(resultaat))
             self.resultaten_tekst.append("")  # Extra lege regel
             
             # Bepaal de beste ROI
@@ -312,6 +553,24 @@ class ThuisbatterijGUI(QMainWindow):
         
         # Visualiseer de resultaten
         self.calculator.visualiseer_resultaten(geselecteerde_capaciteit)
+    
+    def toon_metingen(self):
+        """Toont de duur, doorvoer en het geheugengebruik per stap van de laatste simulatie"""
+        if not self.calculator:
+            return
+        
+        venster = QMessageBox(self)
+        venster.setWindowTitle("Metingen")
+        venster.setText("Duur per stap en per capaciteit van de laatste simulatie.")
+        venster.setDetailedText(self.calculator.metingen.samenvatting())
+        opslaan_knop = venster.addButton("Opslaan als JSON...", QMessageBox.ActionRole)
+        venster.addButton(QMessageBox.Close)
+        venster.exec_()
+        
+        if venster.clickedButton() == opslaan_knop:
+            pad, _ = QFileDialog.getSaveFileName(self, "Metingen opslaan", "metingen.json", "JSON bestanden (*.json)")
+            if pad:
+                self.calculator.metingen.naar_json(pad)
 
 # Start de applicatie als het script direct wordt uitgevoerd
 if __name__ == "__main__":
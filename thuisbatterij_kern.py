@@ -0,0 +1,260 @@
+import argparse
+import sys
+
+import numpy as np
+
+import thuisbatterij_data
+import thuisbatterij_metingen
+import thuisbatterij_simulatie
+import thuisbatterij_tarieven
+
+
+# Standaardinstellingen, gelijk aan die van ThuisbatterijCalculator
+STANDAARD_INSTELLINGEN = {
+    'tarief_dag': 0.30,
+    'tarief_nacht': 0.25,
+    'teruglever_tarief': 0.10,
+    'tarief_kalender': None,
+    'batterij_kosten_per_kwh': 400,
+    'batterij_levensduur': 10,
+    'laad_efficiëntie': 0.90,
+    'laadvermogen': None,
+    'ontlaadvermogen': None,
+    'c_rate': None,
+    'standby_vermogen': 0.0,
+    'fase_limiet': None,
+    'batterij_fase': 'L1',
+    'simulatie_backend': 'auto',
+}
+
+# Kolommen die de simulatie nodig heeft
+INTERVAL_KOLOMMEN = thuisbatterij_data.INTERVAL_KOLOMMEN
+
+
+def _lees_csv(csv_file, tijd_formaat, metingen, kalender=None):
+    """Lees een CSV met NumPy en leid de intervalwaarden af; alleen als dat niet lukt wordt pandas geladen."""
+    try:
+        with thuisbatterij_metingen.stap(metingen, 'csv_parsen') as meting:
+            kolommen = thuisbatterij_data.lees_csv_numpy(csv_file, tijd_formaat)
+            if meting is not None:
+                meting['rijen'] = len(kolommen['time'])
+    except ValueError:
+        # Bijv. een ander tijdformaat of tijden met een tijdzone
+        data = thuisbatterij_data.lees_csv(csv_file, tijd_formaat, metingen)
+        with thuisbatterij_metingen.stap(metingen, 'interval_waarden', len(data)):
+            kolommen = {naam: data[naam] for naam in data}
+            kolommen.update(thuisbatterij_data.bereken_interval_kolommen(data, kalender))
+            return thuisbatterij_data.compacte_data(kolommen)
+
+    with thuisbatterij_metingen.stap(metingen, 'interval_waarden', len(kolommen['time'])):
+        kolommen.update(thuisbatterij_data.bereken_interval_kolommen(kolommen, kalender))
+        return thuisbatterij_data.compacte_kolommen(kolommen)
+
+
+def _als_arrays(data):
+    """Zet via pandas gelezen data om naar arrays, met tijden in UTC zoals laad_arrays_uit_cache()."""
+    tijden = data['time']
+    if tijden.dt.tz is not None:
+        tijden = tijden.dt.tz_convert('UTC').dt.tz_localize(None)
+    kolommen = {naam: data[naam].to_numpy() for naam in (*INTERVAL_KOLOMMEN, *thuisbatterij_data.FASE_KOLOMMEN)
+                if naam in data}
+    kolommen['time'] = tijden.to_numpy().astype('datetime64[ns]')
+    return kolommen
+
+
+def laad_intervallen(csv_file, tijd_formaat=None, cache_map=thuisbatterij_data.STANDAARD_CACHE_MAP, metingen=None,
+                     kalender=None):
+    """
+    Laad de import, export en het tarief per interval met alleen NumPy.
+
+    Gebruikt dezelfde cache als ThuisbatterijCalculator.laad_data(), zodat beide paden
+    elkaars geparste data hergebruiken.
+
+    Parameters:
+    csv_file (str): Pad naar het CSV bestand met de energiedata.
+    tijd_formaat (str, optional): Formaat van de tijdkolom.
+    cache_map (str, optional): Map met de cache, None schakelt de cache uit.
+    metingen (Metingen, optional): Meet de stappen van het laden.
+    kalender (TariefKalender, dict of str, optional): Tariefkalender voor de tariefbanden.
+
+    Returns:
+    dict: Arrays 'time', 'totaal_import', 'totaal_export' en 'tariefband', plus de
+          fasekolommen als het bestand die heeft.
+    """
+    kalender = thuisbatterij_tarieven.maak_kalender(kalender)
+    cache_extra = {'tijd_formaat': tijd_formaat, 'tarief_kalender': kalender.sleutel()}
+    with thuisbatterij_metingen.stap(metingen, 'laad_data') as meting:
+        kolommen = None
+        if cache_map:
+            with thuisbatterij_metingen.stap(metingen, 'cache_lezen'):
+                kolommen = thuisbatterij_data.laad_arrays_uit_cache(csv_file, cache_map, cache_extra)
+
+        if kolommen is None:
+            kolommen = _lees_csv(csv_file, tijd_formaat, metingen, kalender)
+            if cache_map:
+                with thuisbatterij_metingen.stap(metingen, 'cache_schrijven', len(kolommen['time'])):
+                    thuisbatterij_data.schrijf_naar_cache(csv_file, kolommen, cache_map, cache_extra)
+            if not isinstance(kolommen, dict):
+                kolommen = _als_arrays(kolommen)
+        if meting is not None:
+            meting['rijen'] = len(kolommen['time'])
+    return {naam: np.asarray(kolommen[naam]) for naam in (*INTERVAL_KOLOMMEN, *thuisbatterij_data.FASE_KOLOMMEN)
+            if naam in kolommen}
+
+
+def vermogensmodel(intervallen, instellingen):
+    """
+    Stel de vermogensgrenzen samen voor geladen intervallen, zie thuisbatterij_simulatie.vermogensmodel().
+
+    Returns:
+    dict of None: De grenzen, of None als niets begrensd is.
+    """
+    vermogen_instellingen = {naam: instellingen[naam] for naam in thuisbatterij_simulatie.VERMOGEN_INSTELLINGEN}
+    if not thuisbatterij_simulatie.vermogen_begrensd(vermogen_instellingen):
+        return None
+
+    fase_vermogens = None
+    if all(kolom in intervallen for kolom in thuisbatterij_data.FASE_KOLOMMEN):
+        fase_vermogens = np.column_stack([intervallen[kolom] for kolom in thuisbatterij_data.FASE_KOLOMMEN])
+    return thuisbatterij_simulatie.vermogensmodel(
+        thuisbatterij_data.interval_uren(intervallen['time']), fase_vermogens, **vermogen_instellingen
+    )
+
+
+def simuleer_intervallen(intervallen, capaciteiten, instellingen=None):
+    """
+    Simuleer capaciteiten op geladen intervallen en bereken de besparing en ROI.
+
+    Parameters:
+    intervallen (dict): Resultaat van laad_intervallen(), met dezelfde tariefkalender geladen.
+    capaciteiten (list): Te simuleren batterijcapaciteiten in kWh.
+    instellingen (dict, optional): Afwijkingen van STANDAARD_INSTELLINGEN.
+
+    Returns:
+    dict: Per capaciteit de besparing, de ROI en de energie per tariefemmer, met dezelfde
+          sleutels als in batterij_resultaten (zonder tijdreeksen).
+    """
+    instellingen = {**STANDAARD_INSTELLINGEN, **(instellingen or {})}
+    tarieven = (instellingen['tarief_dag'], instellingen['tarief_nacht'], instellingen['teruglever_tarief'])
+    kalender = thuisbatterij_tarieven.maak_kalender(instellingen['tarief_kalender'])
+    capaciteiten = list(capaciteiten)
+
+    simulatie = thuisbatterij_simulatie.simuleer_batch(
+        intervallen['totaal_import'], intervallen['totaal_export'], intervallen['tariefband'],
+        capaciteiten, *tarieven, instellingen['laad_efficiëntie'],
+        backend=instellingen['simulatie_backend'], detailniveau='samenvatting',
+        vermogen=vermogensmodel(intervallen, instellingen), kalender=kalender
+    )
+    energie_zonder_batterij = {
+        emmer: float(waarde) for emmer, waarde in kalender.energie(
+            intervallen['totaal_import'], intervallen['totaal_export'], intervallen['tariefband']
+        ).items()
+    }
+    originele_kosten = thuisbatterij_simulatie.prijs_energie(energie_zonder_batterij, *tarieven, kalender)
+
+    resultaten = {}
+    for i, capaciteit in enumerate(capaciteiten):
+        energie_met_batterij = {emmer: float(waarden[i]) for emmer, waarden in simulatie['energie'].items()}
+        jaarlijkse_besparing = originele_kosten - thuisbatterij_simulatie.prijs_energie(energie_met_batterij, *tarieven, kalender)
+        resultaten[capaciteit] = {
+            'capaciteit': capaciteit,
+            'jaarlijkse_besparing': jaarlijkse_besparing,
+            **thuisbatterij_simulatie.bereken_roi(
+                capaciteit, jaarlijkse_besparing,
+                instellingen['batterij_kosten_per_kwh'], instellingen['batterij_levensduur']
+            ),
+            'energie': {'zonder_batterij': energie_zonder_batterij, 'met_batterij': energie_met_batterij},
+        }
+    return resultaten
+
+
+def simuleer_bestand(csv_file, capaciteiten, instellingen=None, tijd_formaat=None,
+                     cache_map=thuisbatterij_data.STANDAARD_CACHE_MAP, metingen=None):
+    """
+    Laad een P1 export en simuleer capaciteiten, zonder pandas of matplotlib te laden.
+
+    Bedoeld voor scripts en batchruns die alleen de uitkomsten nodig hebben; voor
+    tijdreeksen, grafieken en de DataFrame API is ThuisbatterijCalculator er.
+
+    Parameters:
+    csv_file (str): Pad naar het CSV bestand met de energiedata.
+    capaciteiten (list): Te simuleren batterijcapaciteiten in kWh.
+    instellingen (dict, optional): Afwijkingen van STANDAARD_INSTELLINGEN.
+    tijd_formaat (str, optional): Formaat van de tijdkolom.
+    cache_map (str, optional): Map met de cache, None schakelt de cache uit.
+    metingen (Metingen, optional): Meet de stappen.
+
+    Returns:
+    dict: Resultaten per capaciteit, zie simuleer_intervallen().
+    """
+    kalender = thuisbatterij_tarieven.maak_kalender((instellingen or {}).get('tarief_kalender'))
+    instellingen = {**(instellingen or {}), 'tarief_kalender': kalender}
+    intervallen = laad_intervallen(csv_file, tijd_formaat, cache_map, metingen, kalender)
+    with thuisbatterij_metingen.stap(metingen, 'simulatie', len(intervallen['time'])):
+        return simuleer_intervallen(intervallen, capaciteiten, instellingen)
+
+
+def main(argumenten=None):
+    """Command line interface voor een snelle simulatie zonder grafieken."""
+    parser = argparse.ArgumentParser(description="Simuleer thuisbatterijen met alleen NumPy (snel opstarten).")
+    parser.add_argument('bestand', help="P1 export (CSV)")
+    parser.add_argument('-c', '--capaciteiten', type=float, nargs='+', default=[3, 5, 7, 10, 15],
+                        help="capaciteiten in kWh")
+    parser.add_argument('--tarief-dag', type=float, default=STANDAARD_INSTELLINGEN['tarief_dag'])
+    parser.add_argument('--tarief-nacht', type=float, default=STANDAARD_INSTELLINGEN['tarief_nacht'])
+    parser.add_argument('--teruglever-tarief', type=float, default=STANDAARD_INSTELLINGEN['teruglever_tarief'])
+    parser.add_argument('--kalender', help="tariefkalender als JSON bestand, standaard dag 7-23 uur")
+    parser.add_argument('--kosten-per-kwh', type=float, default=STANDAARD_INSTELLINGEN['batterij_kosten_per_kwh'])
+    parser.add_argument('--levensduur', type=float, default=STANDAARD_INSTELLINGEN['batterij_levensduur'])
+    parser.add_argument('--efficientie', type=float, default=STANDAARD_INSTELLINGEN['laad_efficiëntie'])
+    parser.add_argument('--laadvermogen', type=float, help="maximaal laadvermogen in kW")
+    parser.add_argument('--ontlaadvermogen', type=float, help="maximaal ontlaadvermogen in kW")
+    parser.add_argument('--c-rate', type=float, help="maximaal vermogen als deel van de capaciteit per uur")
+    parser.add_argument('--standby', type=float, default=0.0, help="verbruik van de omvormer in kW")
+    parser.add_argument('--fase-limiet', type=float, help="aansluitwaarde per fase in W, bijv. 5750")
+    parser.add_argument('--fase', choices=thuisbatterij_simulatie.BATTERIJ_FASEN, default='L1',
+                        help="fase van de omvormer")
+    parser.add_argument('--backend', choices=thuisbatterij_simulatie.BACKENDS, default='auto', help="simulatiekern")
+    parser.add_argument('--geen-cache', action='store_true', help="lees altijd het CSV bestand")
+    parser.add_argument('--metingen', action='store_true', help="toon de duur van elke stap")
+    args = parser.parse_args(argumenten)
+
+    instellingen = {
+        'tarief_dag': args.tarief_dag,
+        'tarief_nacht': args.tarief_nacht,
+        'teruglever_tarief': args.teruglever_tarief,
+        'tarief_kalender': args.kalender,
+        'batterij_kosten_per_kwh': args.kosten_per_kwh,
+        'batterij_levensduur': args.levensduur,
+        'laad_efficiëntie': args.efficientie,
+        'laadvermogen': args.laadvermogen,
+        'ontlaadvermogen': args.ontlaadvermogen,
+        'c_rate': args.c_rate,
+        'standby_vermogen': args.standby,
+        'fase_limiet': args.fase_limiet,
+        'batterij_fase': args.fase,
+        'simulatie_backend': args.backend,
+    }
+    metingen = thuisbatterij_metingen.Metingen()
+    try:
+        resultaten = simuleer_bestand(args.bestand, args.capaciteiten, instellingen,
+                                      cache_map=None if args.geen_cache else thuisbatterij_data.STANDAARD_CACHE_MAP,
+                                      metingen=metingen)
+    except (OSError, ValueError) as e:
+        print(f"Fout bij het simuleren van {args.bestand}: {e}")
+        return 1
+
+    print(f"{'Capaciteit (kWh)':<18} {'Besparing (€/jaar)':>20} {'Investering (€)':>16} {'Terugverdientijd':>18} {'Over levensduur (€)':>20}")
+    print("-" * 96)
+    for resultaat in resultaten.values():
+        print(f"{resultaat['capaciteit']:<18g} {resultaat['jaarlijkse_besparing']:>20.2f} "
+              f"{resultaat['batterij_investering']:>16.2f} {resultaat['terugverdientijd']:>18.2f} "
+              f"{resultaat['totale_besparing_levensduur']:>20.2f}")
+    if args.metingen:
+        print()
+        print(metingen.samenvatting())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,736 @@
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import signal
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import thuisbatterij_data
+import thuisbatterij_kern
+import thuisbatterij_simulatie
+import thuisbatterij_tarieven
+
+
+# Soorten bronnen: een groeiend CSV bestand, P1 telegrammen uit een bestand of seriële poort, of een socket
+BRON_SOORTEN = ('csv', 'p1', 'socket')
+
+# Verhoog dit nummer als het formaat van een checkpoint verandert
+CHECKPOINT_VERSIE = 1
+
+# Standaard aantal seconden tussen twee checkpoints
+STANDAARD_CHECKPOINT_INTERVAL = 60
+
+# OBIS codes in een P1 telegram en de kolom van de meterexport waar ze bij horen; de
+# fasevermogens staan in kW in het telegram en in W in de export
+OBIS_KOLOMMEN = {
+    '1-0:1.8.1': 'Import T1 kWh',
+    '1-0:1.8.2': 'Import T2 kWh',
+    '1-0:2.8.1': 'Export T1 kWh',
+    '1-0:2.8.2': 'Export T2 kWh',
+    '1-0:21.7.0': 'L1 max W',
+    '1-0:41.7.0': 'L2 max W',
+    '1-0:61.7.0': 'L3 max W',
+}
+_OBIS_TIJD = '0-0:1.0.0'
+
+# Een regel 'code(waarde*eenheid)'; alleen de eerste waarde telt, bijv. niet de gasmeter
+_OBIS_REGEL = re.compile(r'^(\d+-\d+:\d+\.\d+\.\d+)\(([^)]*)\)')
+
+# Maximaal aantal regels dat per keer uit een bestand verwerkt wordt, bijv. bij het inhalen
+_MAX_BATCH = 100_000
+
+_UREN_PER_JAAR = 8766
+
+
+def _crc16_tabel():
+    tabel = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        tabel.append(crc)
+    return tabel
+
+
+_CRC16_TABEL = _crc16_tabel()
+
+
+def crc16(data):
+    """
+    Bereken de CRC16 (ARC) waarmee een DSMR telegram wordt afgesloten.
+
+    Parameters:
+    data (bytes): Het telegram van '/' tot en met '!'.
+
+    Returns:
+    int: De controlesom.
+    """
+    crc = 0
+    for byte in data:
+        crc = (crc >> 8) ^ _CRC16_TABEL[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def parse_telegram(telegram):
+    """
+    Lees de meterstanden en fasevermogens uit een P1 telegram (DSMR).
+
+    De controlesom wordt gecontroleerd als het telegram er een heeft (DSMR 4 en
+    nieuwer). Het tijdstip van de meter krijgt de tijdzone uit de zomer/winter
+    aanduiding; oudere meters zonder tijdstip krijgen de huidige tijd.
+
+    Parameters:
+    telegram (str): Een volledig telegram, van '/' tot en met de regel met '!'.
+
+    Returns:
+    dict: 'time' (datetime) en de kolommen uit thuisbatterij_data.METER_KOLOMMEN, plus de
+          fasekolommen als het telegram ze heeft.
+    """
+    begin = telegram.find('/')
+    einde = telegram.find('!', begin)
+    if begin < 0 or einde < 0:
+        raise ValueError("Onvolledig telegram.")
+    controle = telegram[einde + 1:einde + 5].strip()
+    if controle:
+        berekend = crc16(telegram[begin:einde + 1].encode('latin-1'))
+        if int(controle, 16) != berekend:
+            raise ValueError(f"Controlesom {controle} klopt niet, berekend {berekend:04X}.")
+
+    meting = {}
+    for regel in telegram[begin:einde].splitlines():
+        gevonden = _OBIS_REGEL.match(regel.strip())
+        if gevonden is None:
+            continue
+        code, waarde = gevonden.groups()
+        if code == _OBIS_TIJD:
+            # Bijv. 231017120000S: jjmmddhhmmss en S (zomertijd) of W (wintertijd)
+            zone = timezone(timedelta(hours=2 if waarde[-1:] == 'S' else 1))
+            meting['time'] = datetime.strptime(waarde[:12], '%y%m%d%H%M%S').replace(tzinfo=zone)
+        elif code in OBIS_KOLOMMEN:
+            getal = float(waarde.split('*', 1)[0])
+            kolom = OBIS_KOLOMMEN[code]
+            meting[kolom] = getal * 1000 if kolom in thuisbatterij_data.FASE_KOLOMMEN else getal
+
+    ontbrekend = [kolom for kolom in thuisbatterij_data.METER_KOLOMMEN if kolom not in meting]
+    if ontbrekend:
+        raise ValueError(f"Ontbrekende meterstanden in telegram: {', '.join(ontbrekend)}")
+    meting.setdefault('time', datetime.now().astimezone())
+    return meting
+
+
+def parse_tijdstip(tekst, tijd_formaat=None):
+    """
+    Lees een enkel tijdstip uit een CSV regel.
+
+    Parameters:
+    tekst (str): Het tijdstip.
+    tijd_formaat (str, optional): Te gebruiken formaat; standaard worden TIJD_FORMATEN en ISO 8601 geprobeerd.
+
+    Returns:
+    datetime: Het tijdstip, met tijdzone als de tekst er een heeft.
+    """
+    tekst = tekst.strip()
+    for formaat in (tijd_formaat,) if tijd_formaat else thuisbatterij_data.TIJD_FORMATEN:
+        try:
+            return datetime.strptime(tekst, formaat)
+        except ValueError:
+            continue
+    return datetime.fromisoformat(tekst)
+
+
+def parse_csv_regel(kop, velden, tijd_formaat=None):
+    """
+    Lees een regel van een meterexport met dezelfde kolommen als lees_csv().
+
+    Parameters:
+    kop (list): Kolomnamen uit de eerste regel van het bestand.
+    velden (list): Velden van de regel.
+    tijd_formaat (str, optional): Formaat van de tijdkolom.
+
+    Returns:
+    dict: 'time' en de meterstanden (lege velden als NaN), plus de fasekolommen indien aanwezig.
+    """
+    waarden = dict(zip(kop, velden))
+    meting = {'time': parse_tijdstip(waarden['time'], tijd_formaat)}
+    for kolom in (*thuisbatterij_data.METER_KOLOMMEN, *thuisbatterij_data.FASE_KOLOMMEN):
+        if kolom in waarden:
+            meting[kolom] = float(waarden[kolom]) if waarden[kolom].strip() else math.nan
+    return meting
+
+
+class TelegramSplitser:
+    """Knip een doorlopende stroom tekst in losse P1 telegrammen."""
+
+    def __init__(self):
+        self.buffer = ''
+
+    def voeg_toe(self, tekst):
+        """
+        Voeg tekst toe en geef de telegrammen die daarmee compleet zijn.
+
+        Parameters:
+        tekst (str): Ontvangen tekst, bijv. een regel of een blok van de socket.
+
+        Returns:
+        list: Complete telegrammen; een onvolledig telegram blijft in de buffer.
+        """
+        self.buffer += tekst
+        telegrammen = []
+        while True:
+            begin = self.buffer.find('/')
+            if begin < 0:
+                self.buffer = ''
+                break
+            einde = self.buffer.find('!', begin)
+            regel_einde = self.buffer.find('\n', einde) if einde >= 0 else -1
+            if regel_einde < 0:
+                self.buffer = self.buffer[begin:]
+                break
+            telegrammen.append(self.buffer[begin:regel_einde + 1])
+            self.buffer = self.buffer[regel_einde + 1:]
+        return telegrammen
+
+
+def _volg_regels(pad, positie=0, volgen=True, wacht=1.0):
+    """
+    Lees de complete regels van een (groeiend) bestand vanaf een positie, zoals tail -f.
+
+    Wordt het bestand kleiner of vervangen (bijv. bij logrotatie), dan begint het lezen
+    opnieuw bij het begin. Een regel zonder regeleinde wordt pas gelezen als hij af is.
+
+    Yields:
+    list: Per keer de beschikbare regels als (regel, positie na de regel) paren; een lege
+          lijst betekent dat er (nog) niets nieuws is.
+    """
+    f = open(pad, 'rb')
+    try:
+        f.seek(positie)
+        while True:
+            regels = []
+            while len(regels) < _MAX_BATCH:
+                begin = f.tell()
+                regel = f.readline()
+                if not regel.endswith(b'\n'):
+                    f.seek(begin)
+                    break
+                regels.append((regel.decode('utf-8-sig'), f.tell()))
+            if regels:
+                yield regels
+                continue
+            if not volgen:
+                return
+            yield []
+            time.sleep(wacht)
+
+            try:
+                status = os.stat(pad)
+            except OSError:
+                continue
+            if status.st_ino != os.fstat(f.fileno()).st_ino or status.st_size < f.tell():
+                print(f"{pad} is vervangen of ingekort, lezen begint opnieuw bij het begin.")
+                f.close()
+                f = open(pad, 'rb')
+    finally:
+        f.close()
+
+
+def volg_csv(pad, positie=0, tijd_formaat=None, volgen=True, wacht=1.0):
+    """
+    Lees metingen uit een CSV bestand waar regels aan worden toegevoegd.
+
+    Parameters:
+    pad (str): Pad naar het CSV bestand; de eerste regel bevat de kolomnamen.
+    positie (int): Byte positie waar het lezen verder gaat, bijv. uit een checkpoint.
+    tijd_formaat (str, optional): Formaat van de tijdkolom.
+    volgen (bool): Blijf wachten op nieuwe regels; False stopt aan het einde van het bestand.
+    wacht (float): Seconden tussen twee controles op nieuwe regels.
+
+    Yields:
+    list: Metingen als (meting, positie na de regel) paren.
+    """
+    with open(pad, 'rb') as f:
+        kop_regel = f.readline()
+    kop = next(csv.reader([kop_regel.decode('utf-8-sig')]))
+    ontbrekend = [kolom for kolom in ['time', *thuisbatterij_data.METER_KOLOMMEN] if kolom not in kop]
+    if ontbrekend:
+        raise ValueError(f"Ontbrekende kolommen in {pad}: {', '.join(ontbrekend)}")
+
+    for regels in _volg_regels(pad, max(positie, len(kop_regel)), volgen, wacht):
+        metingen = []
+        for regel, regel_positie in regels:
+            if regel_positie <= len(kop_regel) or not regel.strip():
+                # De kop, bijv. na het opnieuw beginnen van een vervangen bestand
+                continue
+            try:
+                metingen.append((parse_csv_regel(kop, next(csv.reader([regel])), tijd_formaat), regel_positie))
+            except (ValueError, KeyError) as e:
+                print(f"Regel overgeslagen: {regel.strip()!r} ({e})")
+        yield metingen
+
+
+def volg_telegrammen(pad, positie=0, volgen=True, wacht=1.0):
+    """
+    Lees P1 telegrammen uit een bestand of een seriële poort (bijv. /dev/ttyUSB0).
+
+    Parameters:
+    pad (str): Pad naar het bestand of apparaat; een seriële poort moet al op de juiste snelheid staan.
+    positie (int): Byte positie waar het lezen verder gaat (alleen zinvol bij een bestand).
+    volgen (bool): Blijf wachten op nieuwe telegrammen.
+    wacht (float): Seconden tussen twee controles op nieuwe data.
+
+    Yields:
+    list: Metingen als (meting, positie na het telegram) paren.
+    """
+    splitser = TelegramSplitser()
+    for regels in _volg_regels(pad, positie, volgen, wacht):
+        metingen = []
+        for regel, regel_positie in regels:
+            for telegram in splitser.voeg_toe(regel):
+                try:
+                    metingen.append((parse_telegram(telegram), regel_positie))
+                except ValueError as e:
+                    print(f"Telegram overgeslagen: {e}")
+        yield metingen
+
+
+def lees_socket(adres, wacht=5.0):
+    """
+    Lees P1 telegrammen van een lokale socket, bijv. een P1 dongle of ser2net.
+
+    Bij een verbroken verbinding wordt na 'wacht' seconden opnieuw verbonden.
+
+    Parameters:
+    adres (str): 'host:poort' voor TCP, of het pad van een Unix socket.
+    wacht (float): Seconden tussen twee pogingen om te verbinden.
+
+    Yields:
+    list: Metingen als (meting, None) paren; een socket heeft geen positie om te hervatten.
+    """
+    while True:
+        splitser = TelegramSplitser()
+        try:
+            if ':' in adres and not os.path.exists(adres):
+                host, _, poort = adres.rpartition(':')
+                verbinding = socket.create_connection((host, int(poort)), timeout=wacht)
+            else:
+                verbinding = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                verbinding.settimeout(wacht)
+                verbinding.connect(adres)
+            with verbinding:
+                while True:
+                    try:
+                        blok = verbinding.recv(65536)
+                    except socket.timeout:
+                        yield []
+                        continue
+                    if not blok:
+                        break
+                    metingen = []
+                    for telegram in splitser.voeg_toe(blok.decode('latin-1')):
+                        try:
+                            metingen.append((parse_telegram(telegram), None))
+                        except ValueError as e:
+                            print(f"Telegram overgeslagen: {e}")
+                    yield metingen
+        except OSError as e:
+            print(f"Verbinding met {adres} mislukt: {e}")
+        yield []
+        time.sleep(wacht)
+
+
+def open_bron(soort, adres, positie=None, tijd_formaat=None, volgen=True):
+    """
+    Open een bron van metingen.
+
+    Parameters:
+    soort (str): 'csv', 'p1' of 'socket'.
+    adres (str): Pad naar het bestand of apparaat, of het adres van de socket.
+    positie (int, optional): Positie in het bestand waar het lezen verder gaat.
+    tijd_formaat (str, optional): Formaat van de tijdkolom (alleen bij 'csv').
+    volgen (bool): Blijf wachten op nieuwe data; False stopt aan het einde van een bestand.
+
+    Returns:
+    generator: Lijsten met (meting, positie) paren, zie volg_csv().
+    """
+    if soort not in BRON_SOORTEN:
+        raise ValueError(f"Onbekende bron '{soort}', kies uit {', '.join(BRON_SOORTEN)}.")
+    if soort == 'csv':
+        return volg_csv(adres, positie or 0, tijd_formaat, volgen)
+    if soort == 'p1':
+        return volg_telegrammen(adres, positie or 0, volgen)
+    return lees_socket(adres)
+
+
+def _naar_tekst(tijd):
+    return None if tijd is None else tijd.isoformat()
+
+
+class LiveSimulatie:
+    """
+    Houd de lading en de energie per tariefemmer van alle capaciteiten bij terwijl er metingen binnenkomen.
+
+    Per meting kost een update een vaste hoeveelheid werk per capaciteit, los van hoe
+    lang de simulatie al loopt: de lading van de batterijen en de laatste meterstanden
+    zijn de hele toestand. Die toestand past in een klein checkpoint, zodat de simulatie
+    na een herstart verder kan zonder de geschiedenis opnieuw te verwerken. Metingen
+    die tegelijk binnenkomen (bijv. bij het inhalen van een bestand) worden in een
+    enkele aanroep van de simulatiekern verwerkt.
+    """
+
+    def __init__(self, capaciteiten, instellingen=None):
+        """
+        Parameters:
+        capaciteiten (list): Capaciteiten van de batterijen in kWh.
+        instellingen (dict, optional): Afwijkingen van thuisbatterij_kern.STANDAARD_INSTELLINGEN.
+        """
+        self.capaciteiten = [float(capaciteit) for capaciteit in capaciteiten]
+        self.instellingen = {**thuisbatterij_kern.STANDAARD_INSTELLINGEN, **(instellingen or {})}
+        self.lading = np.array(self.capaciteiten) * 0.5
+        self.vorige_standen = None
+        self.vorige_tijd = None
+        self.laatste_uren = None
+        self.periode_uren = 0.0
+        self.aantal = 0
+        self.positie = None
+        self.kalender = thuisbatterij_tarieven.maak_kalender(self.instellingen['tarief_kalender'])
+        self.energie_zonder_batterij = dict.fromkeys(self.kalender.emmers, 0.0)
+        self.energie_met_batterij = {emmer: np.zeros(len(self.capaciteiten)) for emmer in self.kalender.emmers}
+
+    def _simulatie_instellingen(self):
+        """Instellingen die de toestand bepalen; een checkpoint hoort alleen bij dezelfde waarden."""
+        namen = ('laad_efficiëntie', *thuisbatterij_simulatie.VERMOGEN_INSTELLINGEN)
+        instellingen = {naam: self.instellingen[naam] for naam in namen}
+        # Van de tariefkalender telt alleen de indeling in emmers, de prijzen mogen wijzigen
+        instellingen['tarief_kalender'] = self.kalender.sleutel()
+        return instellingen
+
+    def verwerk(self, metingen):
+        """
+        Werk de toestand bij met nieuwe metingen.
+
+        Net als bij het inlezen van een CSV bestand is de energie per interval het verschil
+        met de vorige meterstand. De allereerste meting legt alleen de beginstand vast.
+        Een interval zonder duur (bijv. een dubbel tijdstip) krijgt de duur van het
+        vorige interval.
+
+        Parameters:
+        metingen (list): Metingen als uit parse_telegram() of parse_csv_regel(), op volgorde.
+        """
+        if self.vorige_tijd is None and metingen:
+            eerste = metingen[0]
+            self.vorige_standen = np.array([eerste[kolom] for kolom in thuisbatterij_data.METER_KOLOMMEN], dtype=np.float64)
+            self.vorige_tijd = eerste['time']
+            metingen = metingen[1:]
+        if not metingen:
+            return
+
+        standen = np.array(
+            [[meting[kolom] for kolom in thuisbatterij_data.METER_KOLOMMEN] for meting in metingen], dtype=np.float64
+        )
+        verschil = np.diff(np.vstack([self.vorige_standen, standen]), axis=0)
+        verschil[np.isnan(verschil)] = 0.0
+        totaal_import = verschil[:, 0] + verschil[:, 1]
+        totaal_export = verschil[:, 2] + verschil[:, 3]
+
+        uren = np.empty(len(metingen))
+        vorige_tijd = self.vorige_tijd
+        for i, meting in enumerate(metingen):
+            duur = (meting['time'] - vorige_tijd).total_seconds() / 3600
+            if duur > 0:
+                self.laatste_uren = duur
+            uren[i] = duur if duur > 0 else (self.laatste_uren or 0.0)
+            vorige_tijd = meting['time']
+        # Het tarief volgt de lokale kloktijd van de meter
+        lokale_tijden = np.array([meting['time'].replace(tzinfo=None) for meting in metingen], dtype='datetime64[ns]')
+        tariefband = self.kalender.tariefband(lokale_tijden)
+
+        vermogen_instellingen = {naam: self.instellingen[naam] for naam in thuisbatterij_simulatie.VERMOGEN_INSTELLINGEN}
+        fase_vermogens = None
+        if vermogen_instellingen['fase_limiet'] is not None:
+            # Een ontbrekend fasevermogen (NaN) geldt als onbegrensd
+            fase_vermogens = np.array(
+                [[meting.get(kolom, math.nan) for kolom in thuisbatterij_data.FASE_KOLOMMEN] for meting in metingen],
+                dtype=np.float64
+            )
+        # Zonder bekende duur (een dubbel tijdstip als tweede meting) telt het interval als vrijwel leeg
+        vermogen = thuisbatterij_simulatie.vermogensmodel(np.maximum(uren, 1e-9), fase_vermogens, **vermogen_instellingen)
+
+        simulatie = thuisbatterij_simulatie.simuleer_batch(
+            totaal_import, totaal_export, tariefband, self.capaciteiten,
+            self.instellingen['tarief_dag'], self.instellingen['tarief_nacht'], self.instellingen['teruglever_tarief'],
+            self.instellingen['laad_efficiëntie'],
+            begin_lading=self.lading,
+            backend=self.instellingen['simulatie_backend'],
+            detailniveau='samenvatting',
+            vermogen=vermogen,
+            kalender=self.kalender
+        )
+        self.lading = simulatie['eind_lading']
+        for emmer, waarde in self.kalender.energie(totaal_import, totaal_export, tariefband).items():
+            self.energie_zonder_batterij[emmer] += float(waarde)
+            self.energie_met_batterij[emmer] += simulatie['energie'][emmer]
+
+        self.vorige_standen = standen[-1]
+        self.vorige_tijd = metingen[-1]['time']
+        self.periode_uren += float(uren.sum())
+        self.aantal += len(metingen)
+
+    def resultaten(self):
+        """
+        Geef de lopende totalen per capaciteit.
+
+        Returns:
+        dict: Per capaciteit een resultaat met dezelfde opbouw als
+              ThuisbatterijCalculator.batterij_resultaten (zonder tijdreeksen). De besparing
+              is die over de periode tot nu toe, zie periode_uren.
+        """
+        tarieven = (self.instellingen['tarief_dag'], self.instellingen['tarief_nacht'],
+                    self.instellingen['teruglever_tarief'])
+        originele_kosten = self.kalender.prijs(self.energie_zonder_batterij, *tarieven)
+        resultaten = {}
+        for i, capaciteit in enumerate(self.capaciteiten):
+            energie_met_batterij = {emmer: float(waarden[i]) for emmer, waarden in self.energie_met_batterij.items()}
+            besparing = originele_kosten - self.kalender.prijs(energie_met_batterij, *tarieven)
+            resultaten[capaciteit] = {
+                'capaciteit': capaciteit,
+                'jaarlijkse_besparing': besparing,
+                **thuisbatterij_simulatie.bereken_roi(
+                    capaciteit, besparing,
+                    self.instellingen['batterij_kosten_per_kwh'], self.instellingen['batterij_levensduur']
+                ),
+                'batterij_laadstatus': None,
+                'originele_kosten': None,
+                'nieuwe_kosten': None,
+                'reeks_index': None,
+                'energie': {'zonder_batterij': dict(self.energie_zonder_batterij), 'met_batterij': energie_met_batterij},
+            }
+        return resultaten
+
+    def bewaar(self, pad, bron=None):
+        """
+        Schrijf de toestand naar een checkpoint; een lezer ziet nooit een half bestand.
+
+        Parameters:
+        pad (str): Pad van het checkpoint (JSON).
+        bron (dict, optional): Soort en adres van de bron, om bij het hervatten te controleren.
+        """
+        toestand = {
+            'versie': CHECKPOINT_VERSIE,
+            'model_versie': thuisbatterij_simulatie.MODEL_VERSIE,
+            'capaciteiten': self.capaciteiten,
+            'instellingen': self._simulatie_instellingen(),
+            'bron': bron,
+            'positie': self.positie,
+            'lading': self.lading.tolist(),
+            'vorige_standen': None if self.vorige_standen is None else self.vorige_standen.tolist(),
+            'vorige_tijd': _naar_tekst(self.vorige_tijd),
+            'laatste_uren': self.laatste_uren,
+            'periode_uren': self.periode_uren,
+            'aantal': self.aantal,
+            'energie_zonder_batterij': self.energie_zonder_batterij,
+            'energie_met_batterij': {emmer: waarden.tolist() for emmer, waarden in self.energie_met_batterij.items()},
+        }
+        map_pad = os.path.dirname(os.path.abspath(pad))
+        os.makedirs(map_pad, exist_ok=True)
+        descriptor, tijdelijk = tempfile.mkstemp(dir=map_pad, prefix='.checkpoint-')
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+                json.dump(toestand, f, ensure_ascii=False)
+            os.replace(tijdelijk, pad)
+        except BaseException:
+            os.unlink(tijdelijk)
+            raise
+
+    @classmethod
+    def herstel(cls, pad, capaciteiten, instellingen=None, bron=None):
+        """
+        Zet een simulatie voort vanuit een checkpoint.
+
+        Parameters:
+        pad (str): Pad van het checkpoint.
+        capaciteiten (list): Capaciteiten; moeten gelijk zijn aan die in het checkpoint.
+        instellingen (dict, optional): Instellingen; de laadefficiëntie, het vermogensmodel en de
+                                       indeling van de tariefkalender moeten gelijk zijn, tarieven
+                                       en kosten mogen wijzigen.
+        bron (dict, optional): Soort en adres van de bron; bij een andere bron vervalt de positie.
+
+        Returns:
+        LiveSimulatie of None: De voortgezette simulatie, of None als er geen checkpoint is.
+        """
+        if not os.path.exists(pad):
+            return None
+        with open(pad, 'r', encoding='utf-8') as f:
+            toestand = json.load(f)
+
+        simulatie = cls(capaciteiten, instellingen)
+        if toestand.get('versie') != CHECKPOINT_VERSIE or toestand.get('model_versie') != thuisbatterij_simulatie.MODEL_VERSIE:
+            raise ValueError(f"Checkpoint {pad} is gemaakt met een andere versie van het rekenmodel.")
+        if toestand['capaciteiten'] != simulatie.capaciteiten:
+            raise ValueError(f"Checkpoint {pad} hoort bij de capaciteiten {toestand['capaciteiten']}.")
+        verschillend = [naam for naam, waarde in simulatie._simulatie_instellingen().items()
+                        if toestand['instellingen'].get(naam) != (list(waarde) if isinstance(waarde, tuple) else waarde)]
+        if verschillend:
+            raise ValueError(f"Checkpoint {pad} is gemaakt met andere instellingen: {', '.join(verschillend)}.")
+
+        simulatie.lading = np.array(toestand['lading'])
+        if toestand['vorige_standen'] is not None:
+            simulatie.vorige_standen = np.array(toestand['vorige_standen'], dtype=np.float64)
+        if toestand['vorige_tijd'] is not None:
+            simulatie.vorige_tijd = datetime.fromisoformat(toestand['vorige_tijd'])
+        simulatie.laatste_uren = toestand['laatste_uren']
+        simulatie.periode_uren = toestand['periode_uren']
+        simulatie.aantal = toestand['aantal']
+        simulatie.energie_zonder_batterij = toestand['energie_zonder_batterij']
+        simulatie.energie_met_batterij = {
+            emmer: np.array(waarden) for emmer, waarden in toestand['energie_met_batterij'].items()
+        }
+        if bron is None or toestand.get('bron') == bron:
+            simulatie.positie = toestand['positie']
+        else:
+            print(f"Checkpoint {pad} hoort bij een andere bron, het lezen begint bij het begin.")
+        return simulatie
+
+
+def draai(simulatie, batches, checkpoint=None, bron=None, checkpoint_interval=STANDAARD_CHECKPOINT_INTERVAL,
+          bij_update=None):
+    """
+    Verwerk metingen uit een bron tot de bron stopt of het proces onderbroken wordt.
+
+    Parameters:
+    simulatie (LiveSimulatie): De bij te werken simulatie.
+    batches (iterable): Lijsten met (meting, positie) paren, zie open_bron().
+    checkpoint (str, optional): Pad van het checkpoint; wordt periodiek en bij het stoppen geschreven.
+    bron (dict, optional): Soort en adres van de bron, voor in het checkpoint.
+    checkpoint_interval (float): Seconden tussen twee checkpoints.
+    bij_update (callable, optional): Wordt na elke batch met nieuwe metingen aangeroepen met de simulatie.
+    """
+    laatste_checkpoint = time.monotonic()
+    try:
+        for batch in batches:
+            if batch:
+                simulatie.verwerk([meting for meting, _ in batch])
+                simulatie.positie = batch[-1][1]
+                if bij_update is not None:
+                    bij_update(simulatie)
+            if checkpoint and time.monotonic() - laatste_checkpoint >= checkpoint_interval:
+                simulatie.bewaar(checkpoint, bron)
+                laatste_checkpoint = time.monotonic()
+    finally:
+        if checkpoint:
+            simulatie.bewaar(checkpoint, bron)
+
+
+def samenvatting(simulatie):
+    """
+    Maak een tabel met de lopende besparing per capaciteit.
+
+    Returns:
+    str: De tabel als tekst.
+    """
+    uren = simulatie.periode_uren
+    regels = [
+        f"{simulatie.aantal} metingen over {uren:.1f} uur, laatste: {_naar_tekst(simulatie.vorige_tijd)}",
+        f"{'Capaciteit (kWh)':<18} {'Lading (kWh)':>13} {'Besparing (€)':>14} {'Per jaar (€)':>13}",
+        "-" * 61,
+    ]
+    for i, resultaat in enumerate(simulatie.resultaten().values()):
+        per_jaar = resultaat['jaarlijkse_besparing'] * _UREN_PER_JAAR / uren if uren > 0 else math.nan
+        regels.append(f"{resultaat['capaciteit']:<18g} {simulatie.lading[i]:>13.2f} "
+                      f"{resultaat['jaarlijkse_besparing']:>14.2f} {per_jaar:>13.2f}")
+    return '\n'.join(regels)
+
+
+def main(argumenten=None):
+    """Command line interface voor een live simulatie op P1 data."""
+    parser = argparse.ArgumentParser(description="Simuleer thuisbatterijen live op P1 telegrammen of een groeiend CSV bestand.")
+    bron = parser.add_mutually_exclusive_group(required=True)
+    bron.add_argument('--csv', help="CSV bestand waar regels aan worden toegevoegd")
+    bron.add_argument('--p1', help="bestand of seriële poort met P1 telegrammen")
+    bron.add_argument('--socket', help="'host:poort' of Unix socket die P1 telegrammen levert")
+    parser.add_argument('-c', '--capaciteiten', type=float, nargs='+', default=[3, 5, 7, 10, 15],
+                        help="capaciteiten in kWh")
+    parser.add_argument('--checkpoint', help="pad van het checkpoint om na een herstart verder te gaan")
+    parser.add_argument('--checkpoint-interval', type=float, default=STANDAARD_CHECKPOINT_INTERVAL,
+                        help="seconden tussen twee checkpoints")
+    parser.add_argument('--elke', type=float, default=60, help="seconden tussen twee overzichten")
+    parser.add_argument('--niet-volgen', action='store_true', help="stop aan het einde van het bestand")
+    parser.add_argument('--tijd-formaat', help="formaat van de tijdkolom in het CSV bestand")
+    parser.add_argument('--tarief-dag', type=float, default=thuisbatterij_kern.STANDAARD_INSTELLINGEN['tarief_dag'])
+    parser.add_argument('--tarief-nacht', type=float, default=thuisbatterij_kern.STANDAARD_INSTELLINGEN['tarief_nacht'])
+    parser.add_argument('--teruglever-tarief', type=float,
+                        default=thuisbatterij_kern.STANDAARD_INSTELLINGEN['teruglever_tarief'])
+    parser.add_argument('--kalender', help="tariefkalender als JSON bestand, standaard dag 7-23 uur")
+    parser.add_argument('--efficientie', type=float, default=thuisbatterij_kern.STANDAARD_INSTELLINGEN['laad_efficiëntie'])
+    parser.add_argument('--laadvermogen', type=float, help="maximaal laadvermogen in kW")
+    parser.add_argument('--ontlaadvermogen', type=float, help="maximaal ontlaadvermogen in kW")
+    parser.add_argument('--c-rate', type=float, help="maximaal vermogen als deel van de capaciteit per uur")
+    parser.add_argument('--standby', type=float, default=0.0, help="verbruik van de omvormer in kW")
+    parser.add_argument('--fase-limiet', type=float, help="aansluitwaarde per fase in W, bijv. 5750")
+    parser.add_argument('--fase', choices=thuisbatterij_simulatie.BATTERIJ_FASEN, default='L1',
+                        help="fase van de omvormer")
+    parser.add_argument('--backend', choices=thuisbatterij_simulatie.BACKENDS, default='auto', help="simulatiekern")
+    args = parser.parse_args(argumenten)
+
+    instellingen = {
+        'tarief_dag': args.tarief_dag,
+        'tarief_nacht': args.tarief_nacht,
+        'teruglever_tarief': args.teruglever_tarief,
+        'tarief_kalender': args.kalender,
+        'laad_efficiëntie': args.efficientie,
+        'laadvermogen': args.laadvermogen,
+        'ontlaadvermogen': args.ontlaadvermogen,
+        'c_rate': args.c_rate,
+        'standby_vermogen': args.standby,
+        'fase_limiet': args.fase_limiet,
+        'batterij_fase': args.fase,
+        'simulatie_backend': args.backend,
+    }
+    soort = 'csv' if args.csv else 'p1' if args.p1 else 'socket'
+    beschrijving = {'soort': soort, 'adres': args.csv or args.p1 or args.socket}
+
+    try:
+        simulatie = None
+        if args.checkpoint:
+            simulatie = LiveSimulatie.herstel(args.checkpoint, args.capaciteiten, instellingen, beschrijving)
+        if simulatie is None:
+            simulatie = LiveSimulatie(args.capaciteiten, instellingen)
+        else:
+            print(f"Verder vanaf checkpoint {args.checkpoint} ({simulatie.aantal} metingen).")
+        batches = open_bron(soort, beschrijving['adres'], simulatie.positie, args.tijd_formaat, not args.niet_volgen)
+    except (OSError, ValueError) as e:
+        print(f"Fout bij het starten: {e}")
+        return 1
+
+    laatste_overzicht = [time.monotonic()]
+
+    def toon(simulatie):
+        if time.monotonic() - laatste_overzicht[0] >= args.elke:
+            print(samenvatting(simulatie), end='\n\n', flush=True)
+            laatste_overzicht[0] = time.monotonic()
+
+    def stop(*_):
+        raise KeyboardInterrupt
+
+    # Als dienst wordt het proces met SIGTERM gestopt; ook dan wordt het checkpoint geschreven
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        draai(simulatie, batches, args.checkpoint, beschrijving, args.checkpoint_interval, toon)
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Fout bij het verwerken van {beschrijving['adres']}: {e}")
+        return 1
+    print(samenvatting(simulatie))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
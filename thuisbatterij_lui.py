@@ -0,0 +1,53 @@
+import importlib
+import sys
+import threading
+
+
+class _LuiModule:
+    """Plaatsvervanger voor een module die pas bij het eerste attribuut wordt geïmporteerd."""
+
+    def __init__(self, naam):
+        self._naam = naam
+        self._module = None
+        self._slot = threading.Lock()
+
+    def _laad(self):
+        if self._module is None:
+            with self._slot:
+                if self._module is None:
+                    self._module = importlib.import_module(self._naam)
+        return self._module
+
+    def __getattr__(self, attribuut):
+        return getattr(self._laad(), attribuut)
+
+    def __dir__(self):
+        return dir(self._laad())
+
+    def __repr__(self):
+        status = 'geladen' if self._module is not None else 'nog niet geladen'
+        return f"<lui geïmporteerde module '{self._naam}' ({status})>"
+
+
+def module(naam):
+    """
+    Geef een module die pas geïmporteerd wordt als hij echt gebruikt wordt.
+
+    Zware afhankelijkheden zoals pandas en matplotlib bepalen anders de opstarttijd,
+    ook als een run ze nooit gebruikt. Code kan de module gewoon als 'pd.DataFrame'
+    aanspreken; de import volgt bij het eerste attribuut.
+
+    Parameters:
+    naam (str): Naam van de module, bijv. 'pandas' of 'matplotlib.pyplot'.
+
+    Returns:
+    module: De module zelf als die al geladen is, anders een plaatsvervanger.
+    """
+    if naam in sys.modules:
+        return sys.modules[naam]
+    return _LuiModule(naam)
+
+
+def geladen(naam):
+    """Geef aan of een module (of de module achter een plaatsvervanger) al geïmporteerd is."""
+    return naam in sys.modules
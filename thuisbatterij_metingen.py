@@ -0,0 +1,240 @@
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _max_rss_mb():
+    """Hoogste geheugengebruik van het proces tot nu toe in MB, of None als dat onbekend is."""
+    if resource is None:
+        return None
+    # Linux rapporteert kB; macOS rapporteert bytes
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024 ** 2 if max_rss > 1 << 32 else max_rss / 1024
+
+
+class Metingen:
+    """
+    Verzamelt per stap de duur, doorvoer en het geheugengebruik van een berekening.
+
+    Timing is altijd aan en kost vrijwel niets. Het piekgeheugen per stap wordt met
+    tracemalloc gemeten als 'geheugen' aan staat; dat vertraagt Python code merkbaar.
+    Met 'profiel' wordt cProfile over alle stappen gedraaid.
+    """
+
+    def __init__(self, geheugen=False, profiel=False):
+        """
+        Parameters:
+        geheugen (bool): Meet het piekgeheugen per stap met tracemalloc.
+        profiel (bool): Draai cProfile tijdens de stappen.
+        """
+        self.geheugen = geheugen
+        self.profiel = profiel
+        self.stappen = []
+        self.capaciteit_tijden = {}
+        self._profiler = cProfile.Profile() if profiel else None
+        self._lokaal = threading.local()
+        self._slot = threading.Lock()
+        self._start = time.perf_counter()
+
+    def _stapel(self):
+        if not hasattr(self._lokaal, 'stapel'):
+            self._lokaal.stapel = []
+        return self._lokaal.stapel
+
+    @contextlib.contextmanager
+    def stap(self, naam, rijen=None):
+        """
+        Meet een stap. Stappen mogen genest zijn, bijv. 'tijd_parsen' binnen 'laad_data'.
+
+        Parameters:
+        naam (str): Naam van de stap.
+        rijen (int, optional): Aantal verwerkte rijen, voor de doorvoer.
+        """
+        stapel = self._stapel()
+        ouder = stapel[-1] if stapel else None
+        meting = {'naam': naam, 'ouder': ouder['naam'] if ouder else None, 'rijen': rijen, 'piek': 0}
+
+        if self.geheugen:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                meting['tracemalloc_gestart'] = True
+            huidig, piek = tracemalloc.get_traced_memory()
+            if ouder is not None:
+                ouder['piek'] = max(ouder['piek'], piek - ouder['begin_geheugen'])
+            tracemalloc.reset_peak()
+            meting['begin_geheugen'] = huidig
+
+        if self._profiler is not None and not stapel:
+            self._profiler.enable()
+
+        stapel.append(meting)
+        start = time.perf_counter()
+        try:
+            yield meting
+        finally:
+            duur = time.perf_counter() - start
+            stapel.pop()
+
+            if self._profiler is not None and not stapel:
+                self._profiler.disable()
+
+            piek_mb = None
+            if self.geheugen:
+                piek = max(meting['piek'], tracemalloc.get_traced_memory()[1] - meting['begin_geheugen'])
+                piek_mb = piek / 1024 ** 2
+                if ouder is not None:
+                    ouder['piek'] = max(ouder['piek'], piek + meting['begin_geheugen'] - ouder['begin_geheugen'])
+                if meting.get('tracemalloc_gestart'):
+                    tracemalloc.stop()
+
+            rijen = meting['rijen']
+            with self._slot:
+                self.stappen.append({
+                    'naam': naam,
+                    'ouder': meting['ouder'],
+                    'start_s': start - self._start,
+                    'tijd_s': duur,
+                    'rijen': rijen,
+                    'rijen_per_s': rijen / duur if rijen and duur > 0 else None,
+                    'piek_mb': piek_mb,
+                    'max_rss_mb': _max_rss_mb(),
+                })
+
+    def registreer_capaciteiten(self, capaciteiten, tijd):
+        """
+        Leg de simulatietijd per capaciteit vast.
+
+        Capaciteiten die samen in een doorloop gesimuleerd zijn delen de tijd gelijk.
+
+        Parameters:
+        capaciteiten (list): Samen gesimuleerde capaciteiten.
+        tijd (float): Duur van die simulatie in seconden.
+        """
+        if not capaciteiten:
+            return
+        with self._slot:
+            for capaciteit in capaciteiten:
+                self.capaciteit_tijden[capaciteit] = self.capaciteit_tijden.get(capaciteit, 0.0) + tijd / len(capaciteiten)
+
+    def reset(self):
+        """Verwijder alle metingen."""
+        with self._slot:
+            self.stappen = []
+            self.capaciteit_tijden = {}
+            self._profiler = cProfile.Profile() if self.profiel else None
+            self._start = time.perf_counter()
+
+    def totalen(self):
+        """
+        Tel de metingen per stapnaam op.
+
+        Returns:
+        dict: Per stap het aantal keer, de totale tijd, rijen per seconde en het hoogste piekgeheugen.
+        """
+        totalen = {}
+        # Op volgorde van start, zodat een stap voor zijn onderdelen komt
+        for meting in sorted(self.stappen, key=lambda meting: meting['start_s']):
+            totaal = totalen.setdefault(meting['naam'], {
+                'ouder': meting['ouder'], 'aantal': 0, 'tijd_s': 0.0, 'rijen': 0, 'piek_mb': None
+            })
+            totaal['aantal'] += 1
+            totaal['tijd_s'] += meting['tijd_s']
+            totaal['rijen'] += meting['rijen'] or 0
+            if meting['piek_mb'] is not None:
+                totaal['piek_mb'] = max(totaal['piek_mb'] or 0.0, meting['piek_mb'])
+        for totaal in totalen.values():
+            totaal['rijen_per_s'] = totaal['rijen'] / totaal['tijd_s'] if totaal['rijen'] and totaal['tijd_s'] > 0 else None
+        return totalen
+
+    def als_dict(self):
+        """Geef alle metingen als gewone Python structuur, geschikt voor JSON."""
+        return {
+            'stappen': list(self.stappen),
+            'totalen': self.totalen(),
+            'capaciteit_tijden': {str(capaciteit): tijd for capaciteit, tijd in self.capaciteit_tijden.items()},
+            'max_rss_mb': _max_rss_mb(),
+        }
+
+    def naar_json(self, pad=None):
+        """
+        Exporteer de metingen als JSON.
+
+        Parameters:
+        pad (str, optional): Bestand om naar te schrijven.
+
+        Returns:
+        str: De JSON tekst.
+        """
+        tekst = json.dumps(self.als_dict(), indent=2, ensure_ascii=False)
+        if pad:
+            with open(pad, 'w', encoding='utf-8') as f:
+                f.write(tekst)
+        return tekst
+
+    def profiel_rapport(self, aantal=25, sortering='cumulative'):
+        """
+        Geef de duurste functies uit cProfile als tekst.
+
+        Parameters:
+        aantal (int): Aantal functies.
+        sortering (str): Sortering van pstats, bijv. 'cumulative' of 'tottime'.
+
+        Returns:
+        str: Het rapport, of een melding als profileren uit staat.
+        """
+        if self._profiler is None:
+            return "Profileren staat uit; gebruik Metingen(profiel=True)."
+        uitvoer = io.StringIO()
+        try:
+            pstats.Stats(self._profiler, stream=uitvoer).sort_stats(sortering).print_stats(aantal)
+        except TypeError:
+            return "Er is nog niets geprofileerd."
+        return uitvoer.getvalue()
+
+    def schrijf_profiel(self, pad):
+        """Schrijf de ruwe cProfile gegevens weg, bijv. voor snakeviz of pstats."""
+        if self._profiler is not None:
+            self._profiler.dump_stats(pad)
+
+    def samenvatting(self):
+        """
+        Maak een leesbare tabel van de metingen per stap en per capaciteit.
+
+        Returns:
+        str: De tabel.
+        """
+        regels = [f"{'Stap':<28} {'Aantal':>6} {'Tijd (s)':>10} {'Rijen/s':>12} {'Piek (MB)':>10}", "-" * 70]
+        for naam, totaal in self.totalen().items():
+            label = f"  {naam}" if totaal['ouder'] else naam
+            snelheid = f"{totaal['rijen_per_s']:.0f}" if totaal['rijen_per_s'] else '-'
+            piek = f"{totaal['piek_mb']:.1f}" if totaal['piek_mb'] is not None else '-'
+            regels.append(f"{label:<28} {totaal['aantal']:>6} {totaal['tijd_s']:>10.3f} {snelheid:>12} {piek:>10}")
+
+        if self.capaciteit_tijden:
+            regels.append("")
+            regels.append(f"{'Capaciteit (kWh)':<28} {'Tijd (s)':>10}")
+            for capaciteit, tijd in sorted(self.capaciteit_tijden.items()):
+                regels.append(f"{capaciteit:<28g} {tijd:>10.4f}")
+
+        max_rss = _max_rss_mb()
+        if max_rss is not None:
+            regels.append("")
+            regels.append(f"Hoogste geheugengebruik van het proces: {max_rss:.0f} MB")
+        return "\n".join(regels)
+
+
+def stap(metingen, naam, rijen=None):
+    """Meet een stap als er een Metingen object is, en doe anders niets."""
+    if metingen is None:
+        return contextlib.nullcontext()
+    return metingen.stap(naam, rijen)
@@ -0,0 +1,334 @@
+import time
+
+import numpy as np
+
+import thuisbatterij_simulatie
+import thuisbatterij_tarieven
+
+
+BLOKKEN = ('dag', 'week')
+STANDAARD_PERCENTIELEN = (5, 25, 50, 75, 95)
+
+# Dagen met minder intervallen dan dit deel van de mediaan gelden als onvolledig
+_VOLLEDIG = 0.9
+
+
+def trek(verdeling, rng, aantal):
+    """
+    Trek waarden uit een eenvoudig opgegeven verdeling.
+
+    Parameters:
+    verdeling: Een getal (vast), een tuple (laag, hoog) voor een uniforme verdeling,
+               een lijst met waarden om gelijkmatig uit te kiezen, een dict met
+               'gemiddelde' en 'std' (normaal, optioneel begrensd met 'min' en 'max'),
+               of een functie f(rng, aantal).
+    rng (Generator): Toevalsgenerator.
+    aantal (int): Aantal trekkingen.
+
+    Returns:
+    ndarray: De getrokken waarden.
+    """
+    if callable(verdeling):
+        waarden = np.asarray(verdeling(rng, aantal), dtype=np.float64)
+    elif isinstance(verdeling, dict):
+        waarden = rng.normal(verdeling['gemiddelde'], verdeling['std'], aantal)
+        waarden = np.clip(waarden, verdeling.get('min', -np.inf), verdeling.get('max', np.inf))
+    elif isinstance(verdeling, tuple):
+        laag, hoog = verdeling
+        waarden = rng.uniform(laag, hoog, aantal)
+    elif isinstance(verdeling, (list, np.ndarray)):
+        waarden = rng.choice(np.asarray(verdeling, dtype=np.float64), aantal)
+    else:
+        waarden = np.full(aantal, float(verdeling))
+    if waarden.shape != (aantal,):
+        raise ValueError(f"Een verdeling moet {aantal} waarden geven, niet {waarden.shape}.")
+    return waarden
+
+
+def volledige_dagen(dag_nummers):
+    """
+    Bepaal de kalenderdagen in de data en welke daarvan volledig zijn.
+
+    Parameters:
+    dag_nummers (ndarray): Kalenderdag per interval (dagen sinds 1970), oplopend.
+
+    Returns:
+    tuple: (grenzen, dagen) met de eerste index van elke volledige dag en de index erna
+           als paren (aantal x 2), en de kalenderdag van elke volledige dag.
+    """
+    dag_nummers = np.asarray(dag_nummers, dtype=np.int64)
+    begin = np.flatnonzero(np.diff(dag_nummers, prepend=dag_nummers[0] - 1))
+    eind = np.append(begin[1:], len(dag_nummers))
+    lengte = eind - begin
+    volledig = lengte >= _VOLLEDIG * np.median(lengte)
+    return np.column_stack((begin[volledig], eind[volledig])), dag_nummers[begin[volledig]]
+
+
+def dag_tabellen(totaal_import, totaal_export, tariefband, grenzen, capaciteiten, efficiënties,
+                 punten=11, backend='auto', vermogen=None, kalender=None):
+    """
+    Simuleer elke dag vanaf een rooster van beginladingen.
+
+    Per dag is de eindlading een geknipte verschuiving van de beginlading en is de
+    energie per tariefemmer stuksgewijs lineair in de beginlading. Met een tabel op een
+    rooster kan een synthetisch jaar daarom dag na dag worden samengesteld zonder de
+    intervallen opnieuw te simuleren.
+
+    Parameters:
+    totaal_import, totaal_export, tariefband (ndarray): Intervalwaarden.
+    grenzen (ndarray): Begin en eind per dag, zie volledige_dagen().
+    capaciteiten (list): Capaciteiten in kWh.
+    efficiënties (list): Laadefficiënties waarvoor een tabel nodig is.
+    punten (int): Aantal beginladingen tussen leeg en vol.
+    backend (str): 'auto', 'numba' of 'numpy'.
+    vermogen (dict, optional): Vermogensgrenzen, zie thuisbatterij_simulatie.vermogensmodel().
+    kalender (TariefKalender, optional): Tariefkalender met de emmers, standaard dag 7-23 uur.
+
+    Returns:
+    dict: 'eind_lading' (efficiënties x capaciteiten x dagen x punten), 'energie' (idem x
+          tariefemmers) en 'energie_zonder_batterij' (dagen x tariefemmers), in kWh.
+    """
+    capaciteiten = np.asarray(capaciteiten, dtype=np.float64)
+    rooster = np.linspace(0.0, 1.0, punten)
+    alle_capaciteiten = np.repeat(capaciteiten, punten)
+    begin_lading = (capaciteiten[:, None] * rooster[None, :]).ravel()
+    kalender = thuisbatterij_tarieven.maak_kalender(kalender)
+    emmers = kalender.emmers
+
+    vorm = (len(efficiënties), len(capaciteiten), len(grenzen), punten)
+    eind_lading = np.empty(vorm)
+    energie = np.empty(vorm + (len(emmers),))
+    energie_zonder_batterij = np.empty((len(grenzen), len(emmers)))
+
+    for d, (begin, eind) in enumerate(grenzen):
+        dag = slice(begin, eind)
+        zonder = kalender.energie(totaal_import[dag], totaal_export[dag], tariefband[dag])
+        energie_zonder_batterij[d] = [zonder[emmer] for emmer in emmers]
+        for e, efficiëntie in enumerate(efficiënties):
+            # Alle capaciteiten en beginladingen samen in een doorloop van de dag
+            simulatie = thuisbatterij_simulatie.simuleer_batch(
+                totaal_import[dag], totaal_export[dag], tariefband[dag], alle_capaciteiten,
+                0.0, 0.0, 0.0, efficiëntie, begin_lading=begin_lading, backend=backend,
+                detailniveau='samenvatting', vermogen=thuisbatterij_simulatie.vermogen_blok(vermogen, begin, eind),
+                kalender=kalender
+            )
+            eind_lading[e, :, d] = simulatie['eind_lading'].reshape(len(capaciteiten), punten)
+            for k, emmer in enumerate(emmers):
+                energie[e, :, d, :, k] = simulatie['energie'][emmer].reshape(len(capaciteiten), punten)
+
+    return {'eind_lading': eind_lading, 'energie': energie, 'energie_zonder_batterij': energie_zonder_batterij}
+
+
+def trek_dagen(dagen, aantal, jaarlengte=365, blok='dag', seizoen=True, rng=None):
+    """
+    Stel synthetische jaren samen uit dagen of weken van de data (bootstrap).
+
+    Met 'seizoen' komt elke dag (of week) van het synthetische jaar uit dezelfde
+    kalendermaand van de data, zodat een winterdag niet in juli belandt. Ontbreekt een
+    maand in de data, dan wordt uit alle dagen getrokken.
+
+    Parameters:
+    dagen (ndarray): Kalenderdag van elke volledige dag, zie volledige_dagen().
+    aantal (int): Aantal synthetische jaren.
+    jaarlengte (int): Aantal dagen per synthetisch jaar.
+    blok (str): 'dag' of 'week'; bij 'week' blijven zeven opeenvolgende dagen bij elkaar.
+    seizoen (bool): Trek per kalendermaand.
+    rng (Generator, optional): Toevalsgenerator.
+
+    Returns:
+    ndarray: Index in 'dagen' per synthetisch jaar (rij) en dag (kolom).
+    """
+    if blok not in BLOKKEN:
+        raise ValueError(f"Onbekend blok '{blok}', kies uit {', '.join(BLOKKEN)}.")
+    rng = rng if rng is not None else np.random.default_rng()
+    lengte = 7 if blok == 'week' else 1
+
+    # Een week kan alleen beginnen op een dag waarna zes volledige, aaneengesloten dagen volgen
+    starts = np.arange(len(dagen) - lengte + 1)
+    starts = starts[dagen[starts + lengte - 1] - dagen[starts] == lengte - 1]
+    if len(starts) == 0:
+        raise ValueError(f"De data bevat geen {lengte} volledige, aaneengesloten dagen.")
+
+    plekken = -(-jaarlengte // lengte)
+    maand_data = _maand(dagen[starts])
+    maand_plek = _maand(np.arange(plekken) * lengte + np.datetime64('2023-01-01', 'D').astype(np.int64))
+
+    gekozen = np.empty((aantal, plekken), dtype=np.int64)
+    for maand in np.unique(maand_plek) if seizoen else [None]:
+        kolommen = np.flatnonzero(maand_plek == maand) if seizoen else np.arange(plekken)
+        kandidaten = starts[maand_data == maand] if seizoen else starts
+        if len(kandidaten) == 0:
+            kandidaten = starts
+        gekozen[:, kolommen] = kandidaten[rng.integers(0, len(kandidaten), (aantal, len(kolommen)))]
+
+    return (gekozen[:, :, None] + np.arange(lengte)).reshape(aantal, -1)[:, :jaarlengte]
+
+
+def _maand(dag_nummers):
+    """Kalendermaand (0-11) van dagen sinds 1970."""
+    return np.asarray(dag_nummers).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12
+
+
+def _kwantiel(waarden, percentielen):
+    """Percentielen per kolom via de dichtstbijzijnde rang, zodat oneindige waarden blijven kloppen."""
+    gesorteerd = np.sort(waarden, axis=0)
+    rang = np.rint(np.asarray(percentielen) / 100 * (len(waarden) - 1)).astype(np.int64)
+    return gesorteerd[rang]
+
+
+def monte_carlo(totaal_import, totaal_export, tariefband, dag_nummers, capaciteiten, aantal=10000,
+                tarief_dag=0.30, tarief_nacht=0.25, teruglever_tarief=0.10, laad_efficiëntie=0.90,
+                batterij_kosten_per_kwh=400, batterij_levensduur=10, blok='dag', jaarlengte=365,
+                seizoen=True, percentielen=STANDAARD_PERCENTIELEN, punten=11, efficiëntie_knopen=5,
+                backend='auto', vermogen=None, kalender=None, seed=None, bewaar_monsters=False):
+    """
+    Schat de spreiding van de besparing en terugverdientijd met synthetische jaren.
+
+    Elk monster is een jaar dat uit dagen of weken van de data is samengesteld, met eigen
+    tarieven, laadefficiëntie en batterijkosten uit de opgegeven verdelingen (zie trek()).
+    Eerst wordt elke dag eenmalig gesimuleerd vanaf een rooster van beginladingen (zie
+    dag_tabellen()); daarna worden alle monsters en capaciteiten tegelijk dag voor dag
+    doorgerekend met interpolatie in die tabellen. De lading loopt zo gewoon door van de
+    ene dag naar de volgende. Getrokken efficiënties worden afgerond op een klein aantal
+    knopen (kwantielen van de trekkingen), omdat er per efficiëntie een tabel nodig is.
+
+    Parameters:
+    totaal_import, totaal_export, tariefband (ndarray): Intervalwaarden.
+    dag_nummers (ndarray): Kalenderdag per interval (dagen sinds 1970, lokale tijd).
+    capaciteiten (list): Capaciteiten in kWh.
+    aantal (int): Aantal synthetische jaren.
+    tarief_dag, tarief_nacht, teruglever_tarief, laad_efficiëntie, batterij_kosten_per_kwh:
+        Vaste waarden of verdelingen, zie trek(). Banden met een eigen prijs in de
+        tariefkalender houden die prijs.
+    batterij_levensduur (float): Levensduur in jaren, voor de kans om terug te verdienen.
+    blok (str): 'dag' of 'week'.
+    jaarlengte (int): Aantal dagen per synthetisch jaar.
+    seizoen (bool): Trek dagen uit dezelfde kalendermaand, zie trek_dagen().
+    percentielen (tuple): Te rapporteren percentielen.
+    punten (int): Aantal beginladingen in de dagtabellen.
+    efficiëntie_knopen (int): Maximaal aantal verschillende efficiënties.
+    backend (str): 'auto', 'numba' of 'numpy'.
+    vermogen (dict, optional): Vermogensgrenzen, zie thuisbatterij_simulatie.vermogensmodel().
+    kalender (TariefKalender, optional): Tariefkalender, standaard dag 7-23 uur.
+    seed (int, optional): Startwaarde voor reproduceerbare resultaten.
+    bewaar_monsters (bool): Geef ook de besparing en terugverdientijd van elk monster terug.
+
+    Returns:
+    dict: Per capaciteit de percentielen van 'jaarlijkse_besparing' en 'terugverdientijd',
+          de gemiddelde besparing en de kans dat de batterij binnen de levensduur is
+          terugverdiend, plus de rekentijden.
+    """
+    rng = np.random.default_rng(seed)
+    capaciteiten = list(capaciteiten)
+    cap = np.asarray(capaciteiten, dtype=np.float64)
+    totaal_import = np.asarray(totaal_import, dtype=np.float64)
+    totaal_export = np.asarray(totaal_export, dtype=np.float64)
+    kalender = thuisbatterij_tarieven.maak_kalender(kalender)
+    tariefband = thuisbatterij_tarieven.als_tariefband(tariefband, kalender)
+
+    # Trek eerst de parameters, zodat de benodigde efficiënties bekend zijn
+    tarieven = [trek(verdeling, rng, aantal) for verdeling in (tarief_dag, tarief_nacht, teruglever_tarief)]
+    kosten_per_kwh = trek(batterij_kosten_per_kwh, rng, aantal)
+    efficiëntie = np.clip(trek(laad_efficiëntie, rng, aantal), 1e-6, 1.0)
+    knopen = np.unique(np.quantile(efficiëntie, (np.arange(efficiëntie_knopen) + 0.5) / efficiëntie_knopen))
+    knoop = np.abs(efficiëntie[:, None] - knopen[None, :]).argmin(axis=1)
+
+    start = time.perf_counter()
+    grenzen, dagen = volledige_dagen(dag_nummers)
+    tabellen = dag_tabellen(totaal_import, totaal_export, tariefband, grenzen, capaciteiten, knopen,
+                            punten, backend, vermogen, kalender)
+    tijd_tabellen = time.perf_counter() - start
+
+    start = time.perf_counter()
+    jaar = trek_dagen(dagen, aantal, jaarlengte, blok, seizoen, rng)
+    energie_zonder_batterij = tabellen['energie_zonder_batterij'][jaar].sum(axis=1)
+
+    # Platte tabellen; de index van monster s, capaciteit c, dag d en roosterpunt g is
+    # ((knoop[s] * C + c) * D + d) * G + g
+    aantal_cap, aantal_dagen = len(cap), len(grenzen)
+    eind_tabel = tabellen['eind_lading'].ravel()
+    energie_tabel = tabellen['energie'].reshape(-1, len(kalender.emmers))
+    basis = (knoop[:, None] * aantal_cap + np.arange(aantal_cap)[None, :]) * aantal_dagen
+
+    lading = np.broadcast_to(cap * 0.5, (aantal, aantal_cap)).copy()
+    energie_met_batterij = np.zeros((aantal, aantal_cap, energie_tabel.shape[1]))
+    stap = cap / (punten - 1)
+    for k in range(jaar.shape[1]):
+        positie = np.clip(lading / stap, 0, punten - 1)
+        links = np.minimum(positie.astype(np.int64), punten - 2)
+        gewicht = positie - links
+        index = (basis + jaar[:, k, None]) * punten + links
+        energie_met_batterij += (energie_tabel[index] * (1 - gewicht[..., None])
+                                 + energie_tabel[index + 1] * gewicht[..., None])
+        lading = eind_tabel[index] * (1 - gewicht) + eind_tabel[index + 1] * gewicht
+
+    # Prijs per monster en emmer, met een negatief teken voor de export
+    prijzen = kalender.prijs_vector(*tarieven)
+    kosten_zonder_batterij = (energie_zonder_batterij * prijzen).sum(axis=1)
+    kosten_met_batterij = (energie_met_batterij * prijzen[:, None, :]).sum(axis=2)
+    besparing = kosten_zonder_batterij[:, None] - kosten_met_batterij
+    investering = kosten_per_kwh[:, None] * cap[None, :]
+    with np.errstate(divide='ignore'):
+        terugverdientijd = np.where(besparing > 0, investering / besparing, np.inf)
+    tijd_monte_carlo = time.perf_counter() - start
+
+    besparing_percentielen = _kwantiel(besparing, percentielen)
+    terugverdien_percentielen = _kwantiel(terugverdientijd, percentielen)
+    resultaten = {}
+    for i, capaciteit in enumerate(capaciteiten):
+        resultaten[capaciteit] = {
+            'jaarlijkse_besparing': dict(zip(percentielen, besparing_percentielen[:, i].tolist())),
+            'terugverdientijd': dict(zip(percentielen, terugverdien_percentielen[:, i].tolist())),
+            'gemiddelde_besparing': float(besparing[:, i].mean()),
+            'kans_terugverdiend': float((terugverdientijd[:, i] <= batterij_levensduur).mean()),
+        }
+
+    uitkomst = {
+        'aantal': aantal,
+        'blok': blok,
+        'jaarlengte': jaarlengte,
+        'dagen_in_data': aantal_dagen,
+        'efficiënties': knopen.tolist(),
+        'percentielen': list(percentielen),
+        'resultaten': resultaten,
+        'tijd_tabellen': tijd_tabellen,
+        'tijd_monte_carlo': tijd_monte_carlo,
+    }
+    if bewaar_monsters:
+        uitkomst['jaarlijkse_besparing'] = besparing
+        uitkomst['terugverdientijd'] = terugverdientijd
+    return uitkomst
+
+
+def samenvatting(uitkomst):
+    """
+    Maak een leesbare tabel van een Monte Carlo uitkomst.
+
+    Returns:
+    str: Per capaciteit de laagste, middelste en hoogste percentielen van de besparing
+         en terugverdientijd en de kans om binnen de levensduur terug te verdienen.
+    """
+    laag, midden, hoog = uitkomst['percentielen'][0], 50, uitkomst['percentielen'][-1]
+    if midden not in uitkomst['percentielen']:
+        midden = uitkomst['percentielen'][len(uitkomst['percentielen']) // 2]
+
+    def jaren(waarde):
+        return f"{waarde:.1f}" if np.isfinite(waarde) else '-'
+
+    regels = [
+        f"{uitkomst['aantal']} synthetische jaren van {uitkomst['jaarlengte']} dagen, per {uitkomst['blok']} "
+        f"getrokken uit {uitkomst['dagen_in_data']} dagen data",
+        "",
+        f"{'Capaciteit (kWh)':<18} {'Besparing €/jaar (P' + str(laag) + ' / P' + str(midden) + ' / P' + str(hoog) + ')':>36} "
+        f"{'Terugverdientijd (jaren)':>28} {'Kans terugverdiend':>20}",
+        "-" * 105,
+    ]
+    for capaciteit, resultaat in uitkomst['resultaten'].items():
+        besparing = resultaat['jaarlijkse_besparing']
+        terug = resultaat['terugverdientijd']
+        regels.append(
+            f"{capaciteit:<18g} {besparing[laag]:>10.0f} / {besparing[midden]:>6.0f} / {besparing[hoog]:>6.0f}       "
+            f"{jaren(terug[laag]):>8} / {jaren(terug[midden]):>6} / {jaren(terug[hoog]):>6} "
+            f"{resultaat['kans_terugverdiend']:>19.0%}"
+        )
+    return "\n".join(regels)
@@ -0,0 +1,246 @@
+import os
+
+import numpy as np
+
+import thuisbatterij_lui
+
+# pandas is alleen nodig voor de dag- en weekweergave; matplotlib wordt pas bij het renderen geladen
+pd = thuisbatterij_lui.module('pandas')
+
+
+# Mogelijke weergaven: elk interval (gedecimeerd) of per dag/week samengevat
+WEERGAVEN = ('interval', 'dag', 'week')
+_PERIODES = {'dag': 'D', 'week': 'W-MON'}
+
+# Standaard aantal punten per lijn, ruim genoeg voor de breedte van een figuur
+STANDAARD_PUNTEN = 4000
+
+
+def min_max_indices(waarden, punten=STANDAARD_PUNTEN):
+    """
+    Kies per emmer de indices van het minimum en maximum (min/max decimatie).
+
+    Pieken en dalen blijven zichtbaar, terwijl het aantal punten hooguit 'punten' is.
+    Volledig gevectoriseerd en lineair in de lengte van de reeks.
+
+    Parameters:
+    waarden (ndarray): De te decimeren reeks.
+    punten (int): Maximaal aantal punten na decimatie.
+
+    Returns:
+    ndarray: Oplopende indices in de oorspronkelijke reeks.
+    """
+    aantal = len(waarden)
+    emmers = max(1, punten // 2)
+    if aantal <= punten:
+        return np.arange(aantal)
+
+    grootte = -(-aantal // emmers)
+    aanvulling = emmers * grootte - aantal
+    # Vul aan met de laatste waarde, zodat elke emmer even groot is
+    blokken = np.concatenate((waarden, np.repeat(waarden[-1:], aanvulling))).reshape(emmers, grootte)
+    basis = np.arange(emmers) * grootte
+    indices = np.concatenate((basis + np.argmin(blokken, axis=1), basis + np.argmax(blokken, axis=1)))
+    indices = np.minimum(indices, aantal - 1)
+    # Eerste en laatste punt altijd meenemen, zodat de as volledig is
+    return np.unique(np.concatenate(([0, aantal - 1], indices)))
+
+
+def lttb_indices(x, y, punten=STANDAARD_PUNTEN):
+    """
+    Kies punten met Largest-Triangle-Three-Buckets, dat de vorm van de lijn goed behoudt.
+
+    Per emmer wordt het punt gekozen dat met het vorige gekozen punt en het gemiddelde van
+    de volgende emmer de grootste driehoek vormt. Er wordt over de emmers gelust (niet over
+    de punten), dus de rekentijd hangt vooral van de lengte van de reeks af via numpy.
+
+    Parameters:
+    x (ndarray): X-waarden (bijv. tijd als getal), oplopend.
+    y (ndarray): Y-waarden.
+    punten (int): Aantal punten na decimatie (minimaal 3).
+
+    Returns:
+    ndarray: Oplopende indices in de oorspronkelijke reeks.
+    """
+    aantal = len(y)
+    if aantal <= punten or punten < 3:
+        return np.arange(aantal)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    grenzen = np.linspace(1, aantal - 1, punten - 1).astype(np.int64)
+    gekozen = np.empty(punten, dtype=np.int64)
+    gekozen[0] = 0
+    gekozen[-1] = aantal - 1
+
+    # Gemiddelde van elke emmer, voor de derde hoek van de driehoek
+    gemiddelde_x = np.add.reduceat(x[1:aantal - 1], grenzen[:-1] - 1) / np.diff(grenzen)
+    gemiddelde_y = np.add.reduceat(y[1:aantal - 1], grenzen[:-1] - 1) / np.diff(grenzen)
+
+    vorige = 0
+    for i in range(punten - 2):
+        begin, eind = grenzen[i], grenzen[i + 1]
+        if i + 1 < punten - 2:
+            volgende_x, volgende_y = gemiddelde_x[i + 1], gemiddelde_y[i + 1]
+        else:
+            volgende_x, volgende_y = x[-1], y[-1]
+        oppervlak = np.abs(
+            (x[vorige] - volgende_x) * (y[begin:eind] - y[vorige])
+            - (x[vorige] - x[begin:eind]) * (volgende_y - y[vorige])
+        )
+        vorige = begin + int(np.argmax(oppervlak))
+        gekozen[i + 1] = vorige
+    return gekozen
+
+
+def decimeer(tijden, waarden, punten=STANDAARD_PUNTEN, methode='minmax'):
+    """
+    Verklein een tijdreeks tot ongeveer 'punten' punten met behoud van de vorm.
+
+    Parameters:
+    tijden (ndarray): Tijdstippen (datetime64).
+    waarden (ndarray): Waarden per tijdstip.
+    punten (int): Gewenst aantal punten.
+    methode (str): 'minmax' (snel, behoudt pieken) of 'lttb' (behoudt de vorm van de lijn).
+
+    Returns:
+    tuple: (tijden, waarden) na decimatie.
+    """
+    if methode == 'minmax':
+        indices = min_max_indices(waarden, punten)
+    elif methode == 'lttb':
+        indices = lttb_indices(tijden.astype('datetime64[ns]').astype(np.int64), waarden, punten)
+    else:
+        raise ValueError(f"Onbekende decimatiemethode '{methode}', kies 'minmax' of 'lttb'.")
+    return tijden[indices], waarden[indices]
+
+
+def aggregeer(tijden, laadstatus, originele_kosten, nieuwe_kosten, weergave):
+    """
+    Vat de reeksen per dag of week samen.
+
+    Returns:
+    DataFrame: Per periode de minimale, gemiddelde en maximale lading en de
+               cumulatieve kosten zonder en met batterij aan het einde van de periode.
+    """
+    frame = pd.DataFrame(
+        {'lading': laadstatus, 'zonder': originele_kosten, 'met': nieuwe_kosten},
+        index=pd.DatetimeIndex(tijden)
+    )
+    periodes = frame.resample(_PERIODES[weergave])
+    samenvatting = periodes['lading'].agg(['min', 'mean', 'max'])
+    samenvatting['zonder'] = periodes['zonder'].sum().cumsum()
+    samenvatting['met'] = periodes['met'].sum().cumsum()
+    return samenvatting.dropna(subset=['mean'])
+
+
+def teken_resultaat(figuur, tijden, resultaat, capaciteit, weergave='interval',
+                    punten=STANDAARD_PUNTEN, methode='minmax'):
+    """
+    Teken de laadstatus en de cumulatieve kosten van een resultaat in een figuur.
+
+    De cumulatieve kosten worden over de volledige reeks berekend en pas daarna
+    gedecimeerd, zodat de lijnen exact blijven. Het aantal getekende punten is begrensd,
+    waardoor de tekentijd nauwelijks van de lengte van de data afhangt.
+
+    Parameters:
+    figuur (Figure): Figuur om in te tekenen (pyplot of Agg).
+    tijden (ndarray): Tijdstip per punt van de reeksen.
+    resultaat (dict): Resultaat met 'batterij_laadstatus', 'originele_kosten' en 'nieuwe_kosten'.
+    capaciteit (float): Capaciteit van de batterij in kWh.
+    weergave (str): 'interval', 'dag' of 'week'.
+    punten (int): Maximaal aantal punten per lijn bij 'interval'.
+    methode (str): Decimatiemethode bij 'interval', 'minmax' of 'lttb'.
+    """
+    if weergave not in WEERGAVEN:
+        raise ValueError(f"Onbekende weergave '{weergave}', kies uit: {', '.join(WEERGAVEN)}")
+
+    laadstatus = np.asarray(resultaat['batterij_laadstatus'])
+    originele_kosten = np.asarray(resultaat['originele_kosten'])
+    nieuwe_kosten = np.asarray(resultaat['nieuwe_kosten'])
+
+    as_lading, as_kosten = figuur.subplots(2, 1)
+
+    # Plot 1: Laadstatus van de batterij
+    if weergave == 'interval':
+        x, y = decimeer(tijden, laadstatus, punten, methode)
+        as_lading.plot(x, y, label=f'Batterijlading ({capaciteit} kWh)')
+    else:
+        samenvatting = aggregeer(tijden, laadstatus, originele_kosten, nieuwe_kosten, weergave)
+        as_lading.fill_between(samenvatting.index, samenvatting['min'], samenvatting['max'],
+                               alpha=0.3, label='Minimum - maximum')
+        as_lading.plot(samenvatting.index, samenvatting['mean'], label=f'Gemiddelde lading ({capaciteit} kWh)')
+    as_lading.axhline(y=capaciteit, color='r', linestyle='--', label='Max capaciteit')
+    titel = {'interval': '', 'dag': ' (per dag)', 'week': ' (per week)'}[weergave]
+    as_lading.set_title(f'Batterijlading over tijd - {capaciteit} kWh capaciteit{titel}')
+    as_lading.set_ylabel('Lading (kWh)')
+    as_lading.legend()
+    as_lading.grid(True)
+
+    # Plot 2: Vergelijking kosten
+    if weergave == 'interval':
+        for kosten, label in ((originele_kosten, 'Zonder batterij'), (nieuwe_kosten, 'Met batterij')):
+            x, y = decimeer(tijden, np.cumsum(kosten), punten, methode)
+            as_kosten.plot(x, y, label=label)
+    else:
+        as_kosten.plot(samenvatting.index, samenvatting['zonder'], label='Zonder batterij')
+        as_kosten.plot(samenvatting.index, samenvatting['met'], label='Met batterij')
+    as_kosten.set_title('Cumulatieve energiekosten')
+    as_kosten.set_xlabel('Tijd')
+    as_kosten.set_ylabel('Cumulatieve kosten (€)')
+    as_kosten.legend()
+    as_kosten.grid(True)
+
+    figuur.tight_layout()
+
+
+def render_bestand(pad, tijden, resultaat, capaciteit, weergave='interval',
+                   punten=STANDAARD_PUNTEN, methode='minmax', figsize=(15, 10), dpi=100):
+    """
+    Render een resultaat zonder scherm (Agg) naar een bestand, bijv. PNG of SVG.
+
+    Er wordt geen pyplot gebruikt, dus er blijft geen figuur open en er is geen
+    grafische omgeving nodig.
+
+    Parameters:
+    pad (str): Doelbestand; de extensie bepaalt het formaat.
+    tijden, resultaat, capaciteit, weergave, punten, methode: Zie teken_resultaat().
+    figsize (tuple): Grootte van de figuur in inches.
+    dpi (int): Resolutie bij rasterformaten.
+
+    Returns:
+    str: Het pad van het geschreven bestand.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figuur = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figuur)
+    teken_resultaat(figuur, tijden, resultaat, capaciteit, weergave, punten, methode)
+    figuur.savefig(pad)
+    return pad
+
+
+def render_alle(resultaten, tijden_per_resultaat, map_pad='.', formaat='png', weergave='interval',
+                punten=STANDAARD_PUNTEN, methode='minmax'):
+    """
+    Render voor alle capaciteiten een figuur naar een bestand in een enkele aanroep.
+
+    Parameters:
+    resultaten (dict): Resultaten per capaciteit, zoals batterij_resultaten.
+    tijden_per_resultaat (callable): Geeft voor een resultaat de tijdstippen van de reeksen.
+    map_pad (str): Map waarin de bestanden komen.
+    formaat (str): 'png' of 'svg' (of een ander formaat dat matplotlib kent).
+    weergave, punten, methode: Zie teken_resultaat().
+
+    Returns:
+    list: Paden van de geschreven bestanden.
+    """
+    os.makedirs(map_pad, exist_ok=True)
+    achtervoegsel = '' if weergave == 'interval' else f'_{weergave}'
+    paden = []
+    for capaciteit, resultaat in resultaten.items():
+        pad = os.path.join(map_pad, f'batterij_simulatie_{capaciteit}kWh{achtervoegsel}.{formaat}')
+        paden.append(render_bestand(pad, tijden_per_resultaat(resultaat), resultaat, capaciteit,
+                                    weergave, punten, methode))
+    return paden
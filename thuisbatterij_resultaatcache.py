@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+import thuisbatterij_data
+import thuisbatterij_simulatie
+import thuisbatterij_tarieven
+
+
+# Standaard locatie van de resultaatcache, naast de cache met geparste data
+STANDAARD_RESULTAAT_MAP = os.path.join(os.path.expanduser('~'), '.cache', 'thuisbatterij-resultaten')
+STANDAARD_MAX_MB = 64
+
+# Modules waarvan de broncode bepaalt wat een simulatie oplevert; een wijziging maakt alle resultaten ongeldig
+_MODEL_MODULES = (thuisbatterij_simulatie, thuisbatterij_data, thuisbatterij_tarieven)
+
+_code_versie = None
+
+
+def code_versie():
+    """
+    Bepaal de versie van het rekenmodel: MODEL_VERSIE plus een hash van de broncode.
+
+    Zo worden resultaten ook ongeldig na een codewijziging waarbij niemand eraan
+    dacht MODEL_VERSIE te verhogen.
+
+    Returns:
+    str: Hexadecimale versie.
+    """
+    global _code_versie
+    if _code_versie is None:
+        h = hashlib.blake2b(str(thuisbatterij_simulatie.MODEL_VERSIE).encode('utf-8'), digest_size=16)
+        for module in _MODEL_MODULES:
+            try:
+                with open(module.__file__, 'rb') as f:
+                    h.update(f.read())
+            except (OSError, AttributeError, TypeError):
+                # Bijv. een bevroren installatie zonder bronbestanden; MODEL_VERSIE blijft gelden
+                h.update(module.__name__.encode('utf-8'))
+        _code_versie = h.hexdigest()
+    return _code_versie
+
+
+def data_vingerafdruk(data):
+    """
+    Bereken een vingerafdruk van de data die de simulatie te zien krijgt.
+
+    De hash gaat over de inhoud van de compacte kolommen, niet over het pad van het
+    bestand. Een kopie van een meterexport geeft dus dezelfde vingerafdruk, en een
+    ander tijdformaat, resample-interval of datatype geeft vanzelf een andere.
+
+    Parameters:
+    data (DataFrame of dict): Kolommen zoals in thuisbatterij_data.compacte_kolommen().
+
+    Returns:
+    str: Hexadecimale vingerafdruk.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for naam in (*thuisbatterij_data.INTERVAL_KOLOMMEN, *thuisbatterij_data.FASE_KOLOMMEN):
+        if naam not in data:
+            continue
+        kolom = data[naam]
+        if naam == 'time':
+            if getattr(getattr(kolom, 'dt', None), 'tz', None) is not None:
+                kolom = kolom.dt.tz_convert('UTC').dt.tz_localize(None)
+            array = np.asarray(kolom).astype('datetime64[ns]').view(np.int64)
+        else:
+            array = np.ascontiguousarray(np.asarray(kolom))
+        h.update(f"{naam}:{array.dtype.str}:{len(array)};".encode('utf-8'))
+        h.update(memoryview(array).cast('B'))
+    return h.hexdigest()
+
+
+class ResultaatCache:
+    """
+    Cache op schijf met de energie per tariefemmer van gesimuleerde capaciteiten.
+
+    Elke capaciteit is een klein JSON bestand met als naam een hash van de vingerafdruk
+    van de data, de capaciteit, de instellingen die de simulatie beïnvloeden en de
+    versie van het rekenmodel. Tarieven, batterijkosten en levensduur horen daar niet
+    bij: die worden na het ophalen doorgerekend, net als bij herprijzen. Boven de
+    grens aan de grootte worden de minst recent gebruikte resultaten verwijderd.
+    """
+
+    def __init__(self, map_pad=STANDAARD_RESULTAAT_MAP, max_mb=STANDAARD_MAX_MB):
+        """
+        Parameters:
+        map_pad (str): Map met de resultaten.
+        max_mb (float): Grens aan de totale grootte van de map in MB.
+        """
+        self.map_pad = map_pad
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.verwijderd = 0
+        self._slot = threading.Lock()
+
+    @staticmethod
+    def sleutel(vingerafdruk, capaciteit, instellingen):
+        """
+        Bepaal de sleutel van een capaciteit.
+
+        Parameters:
+        vingerafdruk (str): Zie data_vingerafdruk().
+        capaciteit (float): Capaciteit in kWh.
+        instellingen (dict): Instellingen die de simulatie beïnvloeden, bijv. de laadefficiëntie.
+
+        Returns:
+        str: Hexadecimale sleutel.
+        """
+        onderdelen = {
+            'model': code_versie(),
+            'data': vingerafdruk,
+            'capaciteit': float(capaciteit),
+            'instellingen': instellingen,
+        }
+        tekst = json.dumps(onderdelen, sort_keys=True, default=lambda waarde: np.asarray(waarde).tolist())
+        return hashlib.blake2b(tekst.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _pad(self, sleutel):
+        return os.path.join(self.map_pad, f'{sleutel}.json')
+
+    def haal(self, sleutels):
+        """
+        Lees de opgeslagen resultaten van een aantal sleutels.
+
+        Parameters:
+        sleutels (list): Sleutels uit sleutel().
+
+        Returns:
+        dict: Per gevonden sleutel de opgeslagen waarde; ontbrekende sleutels ontbreken.
+        """
+        gevonden = {}
+        for sleutel in sleutels:
+            pad = self._pad(sleutel)
+            try:
+                with open(pad, 'r', encoding='utf-8') as f:
+                    gevonden[sleutel] = json.load(f)
+                # De wijzigingstijd houdt bij wanneer een resultaat voor het laatst gebruikt is
+                os.utime(pad)
+            except (OSError, ValueError):
+                continue
+        with self._slot:
+            self.hits += len(gevonden)
+            self.misses += len(sleutels) - len(gevonden)
+        return gevonden
+
+    def bewaar(self, waarden):
+        """
+        Sla resultaten op en ruim daarna zo nodig oude resultaten op.
+
+        Parameters:
+        waarden (dict): Per sleutel een JSON-serialiseerbare waarde.
+        """
+        if not waarden:
+            return
+        try:
+            os.makedirs(self.map_pad, exist_ok=True)
+            for sleutel, waarde in waarden.items():
+                # Schrijf eerst naar een tijdelijk bestand, zodat een lezer nooit een half resultaat ziet
+                descriptor, tijdelijk = tempfile.mkstemp(dir=self.map_pad, prefix='.schrijven-')
+                try:
+                    with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+                        json.dump(waarde, f)
+                    os.replace(tijdelijk, self._pad(sleutel))
+                except BaseException:
+                    os.unlink(tijdelijk)
+                    raise
+        except OSError as e:
+            print(f"Kon de resultaatcache niet schrijven naar {self.map_pad}: {e}")
+            return
+        self._ruim_op()
+
+    def _bestanden(self):
+        """Geef (laatst gebruikt, grootte, pad) van elk opgeslagen resultaat."""
+        bestanden = []
+        try:
+            with os.scandir(self.map_pad) as items:
+                for item in items:
+                    if item.name.endswith('.json') and not item.name.startswith('.'):
+                        try:
+                            status = item.stat()
+                        except OSError:
+                            continue
+                        bestanden.append((status.st_mtime_ns, status.st_size, item.path))
+        except OSError:
+            pass
+        return bestanden
+
+    def _ruim_op(self):
+        """Verwijder de minst recent gebruikte resultaten tot de map onder de grens zit."""
+        bestanden = self._bestanden()
+        totaal = sum(grootte for _, grootte, _ in bestanden)
+        if totaal <= self.max_bytes:
+            return
+        for _, grootte, pad in sorted(bestanden):
+            if totaal <= self.max_bytes:
+                break
+            try:
+                os.remove(pad)
+            except OSError:
+                continue
+            totaal -= grootte
+            with self._slot:
+                self.verwijderd += 1
+
+    def leeg(self):
+        """Verwijder alle opgeslagen resultaten."""
+        for _, _, pad in self._bestanden():
+            try:
+                os.remove(pad)
+            except OSError:
+                pass
+
+    def status(self):
+        """
+        Returns:
+        dict: Aantal resultaten, grootte in bytes, hits, misses, hit rate en het aantal verwijderde resultaten.
+        """
+        bestanden = self._bestanden()
+        opvragingen = self.hits + self.misses
+        return {
+            'resultaten': len(bestanden),
+            'bytes': sum(grootte for _, grootte, _ in bestanden),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / opvragingen if opvragingen else None,
+            'verwijderd': self.verwijderd,
+        }
@@ -0,0 +1,188 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import thuisbatterij_lui
+import thuisbatterij_simulatie
+
+pd = thuisbatterij_lui.module('pandas')
+
+
+# Kolommen van de intervaldata die de workers nodig hebben
+_KOLOMMEN = ('totaal_import', 'totaal_export', 'tariefband')
+
+# Intervaldata per worker proces, gevuld door _init_worker
+_worker_data = {}
+_worker_geheugen = []
+
+
+# Arrays van het vermogensmodel die ook via gedeeld geheugen gaan
+_VERMOGEN_ARRAYS = ('uren', 'fase')
+
+
+def _deel_arrays(arrays):
+    """
+    Kopieer de benodigde arrays eenmalig naar gedeeld geheugen.
+
+    Returns:
+    tuple: (lijst met SharedMemory blokken, beschrijving per array voor de workers)
+    """
+    blokken = []
+    beschrijving = {}
+    for kolom, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        blok = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=blok.buf)[:] = array
+        blokken.append(blok)
+        beschrijving[kolom] = (blok.name, array.shape, array.dtype.str)
+    return blokken, beschrijving
+
+
+def _init_worker(beschrijving, backend, vermogen_instellingen, kalender):
+    """Koppel een worker proces aan de gedeelde intervaldata."""
+    gedeeld = {}
+    for kolom, (naam, vorm, dtype) in beschrijving.items():
+        blok = shared_memory.SharedMemory(name=naam)
+        _worker_geheugen.append(blok)
+        gedeeld[kolom] = np.ndarray(vorm, dtype=np.dtype(dtype), buffer=blok.buf)
+    _worker_data.update({kolom: gedeeld[kolom] for kolom in _KOLOMMEN})
+    _worker_data['backend'] = backend
+    _worker_data['kalender'] = kalender
+    _worker_data['vermogen'] = None
+    if vermogen_instellingen is not None:
+        _worker_data['vermogen'] = {**vermogen_instellingen,
+                                    **{naam: gedeeld.get(naam) for naam in _VERMOGEN_ARRAYS}}
+
+
+def _simuleer_energie(data, capaciteiten, laad_efficiëntie, backend, vermogen=None, kalender=None):
+    """
+    Simuleer alle capaciteiten voor een enkele laadefficiëntie.
+
+    De tarieven sturen de batterij niet, dus alleen de energie per tariefemmer is nodig;
+    de prijzen worden daarna in het hoofdproces toegepast.
+
+    Returns:
+    dict: Energie per tariefemmer met batterij, een array per emmer met een waarde per capaciteit.
+    """
+    simulatie = thuisbatterij_simulatie.simuleer_batch(
+        data['totaal_import'], data['totaal_export'], data['tariefband'],
+        capaciteiten, 0.0, 0.0, 0.0, laad_efficiëntie,
+        backend=backend, detailniveau='samenvatting', vermogen=vermogen, kalender=kalender
+    )
+    return simulatie['energie']
+
+
+def _simuleer_efficiëntie(capaciteiten, laad_efficiëntie):
+    """Simuleer in een worker proces op de gedeelde intervaldata (zie _simuleer_energie)."""
+    return _simuleer_energie(_worker_data, capaciteiten, laad_efficiëntie, _worker_data['backend'],
+                             _worker_data['vermogen'], _worker_data['kalender'])
+
+
+def scenario_grid(calculator, capaciteiten, tarief_dag=None, tarief_nacht=None, teruglever_tarief=None,
+                  laad_efficiëntie=None, batterij_kosten_per_kwh=None, max_workers=None):
+    """
+    Simuleer een raster van scenario's over tarieven, efficiëntie en batterijkosten.
+
+    Elke parameter accepteert een lijst met waarden; None betekent dat de huidige waarde
+    van de calculator wordt gebruikt. De intervaldata wordt eenmalig in gedeeld geheugen
+    gezet, zodat per taak alleen de parameters naar de workers gaan. Er wordt alleen per
+    laadefficiëntie gesimuleerd; tarieven en batterijkosten worden daarna uit de energie
+    per tariefemmer doorgerekend.
+
+    Parameters:
+    calculator (ThuisbatterijCalculator): Calculator met geladen data.
+    capaciteiten (list): Te simuleren batterijcapaciteiten in kWh.
+    tarief_dag (list, optional): Dagtarieven (€/kWh).
+    tarief_nacht (list, optional): Nachttarieven (€/kWh).
+    teruglever_tarief (list, optional): Teruglevertarieven (€/kWh).
+    laad_efficiëntie (list, optional): Laadefficiënties (0-1).
+    batterij_kosten_per_kwh (list, optional): Batterijkosten per kWh (€).
+    max_workers (int, optional): Aantal processen, standaard het aantal CPU's.
+                                 Bij 1 wordt alles in het huidige proces uitgevoerd.
+
+    Returns:
+    DataFrame: Een rij per scenario en capaciteit met de parameters en de ROI-resultaten.
+    """
+    if calculator.data is None:
+        print("Laad eerst de data met de laad_data() methode.")
+        return None
+
+    def bereik(waarden, standaard):
+        return [standaard] if waarden is None else list(np.atleast_1d(waarden))
+
+    capaciteiten = list(capaciteiten)
+    kosten_bereik = bereik(batterij_kosten_per_kwh, calculator.batterij_kosten_per_kwh)
+
+    # Alleen de efficiëntie beïnvloedt de simulatie; tarieven en batterijkosten worden achteraf toegepast
+    efficiënties = bereik(laad_efficiëntie, calculator.laad_efficiëntie)
+    scenarios = list(itertools.product(
+        bereik(tarief_dag, calculator.tarief_dag),
+        bereik(tarief_nacht, calculator.tarief_nacht),
+        bereik(teruglever_tarief, calculator.teruglever_tarief),
+        kosten_bereik
+    ))
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(efficiënties)))
+
+    tariefband = calculator.tariefbanden()
+    kalender = calculator.kalender()
+    energie_zonder_batterij = thuisbatterij_simulatie.bereken_energie(
+        calculator.data['totaal_import'].to_numpy(),
+        calculator.data['totaal_export'].to_numpy(),
+        tariefband,
+        kalender
+    )
+
+    data = {kolom: calculator.data[kolom].to_numpy() for kolom in _KOLOMMEN}
+    vermogen = calculator.vermogensmodel()
+    if max_workers == 1:
+        # In het huidige proces is gedeeld geheugen niet nodig; dit pad is ook thread-safe
+        energie = [
+            _simuleer_energie(data, capaciteiten, efficiëntie, calculator.simulatie_backend, vermogen, kalender)
+            for efficiëntie in efficiënties
+        ]
+    else:
+        # De arrays van het vermogensmodel gaan mee in gedeeld geheugen, de instellingen als argument
+        vermogen_instellingen = None
+        if vermogen is not None:
+            vermogen_instellingen = {naam: waarde for naam, waarde in vermogen.items() if naam not in _VERMOGEN_ARRAYS}
+            data.update({naam: vermogen[naam] for naam in _VERMOGEN_ARRAYS if vermogen[naam] is not None})
+        blokken, beschrijving = _deel_arrays(data)
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(beschrijving, calculator.simulatie_backend,
+                                               vermogen_instellingen, kalender)) as pool:
+                taken = [pool.submit(_simuleer_efficiëntie, capaciteiten, efficiëntie) for efficiëntie in efficiënties]
+                energie = [taak.result() for taak in taken]
+        finally:
+            for blok in blokken:
+                blok.close()
+                blok.unlink()
+
+    rijen = []
+    for efficiëntie, energie_met_batterij in zip(efficiënties, energie):
+        for dag, nacht, teruglever, kosten_per_kwh in scenarios:
+            originele_kosten = thuisbatterij_simulatie.prijs_energie(energie_zonder_batterij, dag, nacht, teruglever, kalender)
+            besparingen = originele_kosten - thuisbatterij_simulatie.prijs_energie(
+                energie_met_batterij, dag, nacht, teruglever, kalender
+            )
+            for capaciteit, jaarlijkse_besparing in zip(capaciteiten, besparingen.tolist()):
+                rijen.append({
+                    'tarief_dag': dag,
+                    'tarief_nacht': nacht,
+                    'teruglever_tarief': teruglever,
+                    'laad_efficiëntie': efficiëntie,
+                    'batterij_kosten_per_kwh': kosten_per_kwh,
+                    'capaciteit': capaciteit,
+                    'jaarlijkse_besparing': jaarlijkse_besparing,
+                    **thuisbatterij_simulatie.bereken_roi(
+                        capaciteit, jaarlijkse_besparing, kosten_per_kwh, calculator.batterij_levensduur
+                    )
+                })
+
+    return pd.DataFrame(rijen)
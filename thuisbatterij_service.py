@@ -0,0 +1,532 @@
+import argparse
+import asyncio
+import collections
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+
+import thuisbatterij_scenario
+import thuisbatterij_simulatie
+from thuisbatterij_calculator import ThuisbatterijCalculator
+
+
+# Instellingen die bepalen hoe een dataset wordt ingelezen; ze horen bij de sleutel in de cache.
+# De tariefkalender hoort erbij omdat de tariefbanden en de energie per emmer ervan afhangen.
+DATA_INSTELLINGEN = ('tijd_formaat', 'simulatie_interval', 'tarief_kalender')
+
+# Instellingen die per verzoek mogen verschillen zonder de dataset opnieuw te laden
+REKEN_INSTELLINGEN = (
+    'tarief_dag', 'tarief_nacht', 'teruglever_tarief',
+    'batterij_kosten_per_kwh', 'batterij_levensduur', 'laad_efficiëntie', 'simulatie_backend',
+) + thuisbatterij_simulatie.VERMOGEN_INSTELLINGEN
+
+# Parameters van een sweep die een lijst met waarden accepteren
+SWEEP_PARAMETERS = ('tarief_dag', 'tarief_nacht', 'teruglever_tarief', 'laad_efficiëntie', 'batterij_kosten_per_kwh')
+
+STANDAARD_POORT = 8765
+STANDAARD_GEHEUGEN_MB = 2048
+
+# Aantal bewaarde latenties per methode voor de percentielen
+_LATENTIE_VENSTER = 10_000
+
+# Grootste geaccepteerde verzoek in bytes
+_MAX_VERZOEK = 1024 * 1024
+
+
+class ServiceFout(Exception):
+    """Fout in een verzoek, met de HTTP status die de client terugkrijgt."""
+
+    def __init__(self, melding, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(melding)
+        self.status = status
+
+
+class Dataset:
+    """Een geladen dataset in de cache, met de energie per tariefemmer van eerder gesimuleerde capaciteiten."""
+
+    def __init__(self, sleutel, calculator):
+        self.sleutel = sleutel
+        self.calculator = calculator
+        self.grootte = int(calculator.data.memory_usage(deep=True).sum())
+        # energie_sleutel() -> energie met batterij, voor herprijzen zonder simulatie
+        self.energie = {}
+        self.energie_zonder_batterij = calculator._energie_zonder_batterij()
+
+    @staticmethod
+    def energie_sleutel(calculator, capaciteit):
+        """
+        Sleutel van de gesimuleerde energie van een capaciteit: alles wat de simulatie stuurt
+        behalve de tarieven, dus de laadefficiëntie en de vermogensgrenzen.
+        """
+        # Een fase_limiet per fase komt als lijst binnen en is niet hashbaar; de JSON tekst wel
+        vermogen = tuple(json.dumps(getattr(calculator, naam))
+                         for naam in thuisbatterij_simulatie.VERMOGEN_INSTELLINGEN)
+        return (capaciteit, calculator.laad_efficiëntie, vermogen)
+
+    def calculator_voor(self, instellingen):
+        """
+        Geef een calculator voor een enkel verzoek, die de data van de dataset deelt.
+
+        De data wordt alleen gelezen; tarieven en andere instellingen staan op de eigen
+        calculator, zodat gelijktijdige verzoeken elkaar niet beïnvloeden.
+        """
+        calculator = ThuisbatterijCalculator(self.calculator.csv_file)
+        calculator.data = self.calculator.data
+        calculator.tarief_kalender = self.calculator.tarief_kalender
+        calculator._data_kalender = self.calculator._data_kalender
+        calculator.metingen = None
+        for naam, waarde in instellingen.items():
+            setattr(calculator, naam, waarde)
+        return calculator
+
+
+class DatasetCache:
+    """
+    LRU cache van geladen datasets met een grens aan het geheugengebruik.
+
+    Een dataset wordt herkend aan het pad, de grootte en de wijzigingstijd van het
+    bestand en de inleesinstellingen; een gewijzigd bestand wordt dus opnieuw geladen.
+    Gelijktijdige verzoeken voor dezelfde dataset wachten op een enkele laadactie.
+    """
+
+    def __init__(self, max_bytes, pool):
+        """
+        Parameters:
+        max_bytes (int): Grens aan het totale geheugengebruik van de datasets.
+        pool (Executor): Pool waarin het laden wordt uitgevoerd.
+        """
+        self.max_bytes = max_bytes
+        self.pool = pool
+        self.datasets = collections.OrderedDict()
+        self.bezig = {}
+        self.hits = 0
+        self.misses = 0  # alleen verzoeken die een laadactie starten
+        self.gedeeld = 0  # verzoeken die op een al lopende laadactie wachten
+        self.verwijderd = 0
+
+    @staticmethod
+    def sleutel(csv_file, data_instellingen):
+        """Bepaal de cachesleutel van een bestand met inleesinstellingen."""
+        try:
+            status = os.stat(csv_file)
+        except OSError as e:
+            raise ServiceFout(f"Bestand niet gevonden: {csv_file} ({e.strerror})", HTTPStatus.NOT_FOUND)
+        # Een tariefkalender als dict is niet hashbaar; de JSON tekst wel
+        waarden = tuple(json.dumps(waarde, sort_keys=True) if isinstance(waarde, dict) else waarde
+                        for waarde in (data_instellingen.get(naam) for naam in DATA_INSTELLINGEN))
+        return (os.path.abspath(csv_file), status.st_size, status.st_mtime_ns, waarden)
+
+    def gebruikt(self):
+        """Totaal geheugengebruik van de datasets in bytes."""
+        return sum(dataset.grootte for dataset in self.datasets.values())
+
+    async def haal(self, csv_file, data_instellingen):
+        """
+        Geef de dataset voor een bestand, en laad hem als hij nog niet in de cache staat.
+
+        Returns:
+        tuple: (Dataset, True bij een cache hit). Wachten op een lopende laadactie telt
+               als gedeeld en niet als hit.
+        """
+        sleutel = self.sleutel(csv_file, data_instellingen)
+        if sleutel in self.datasets:
+            self.hits += 1
+            self.datasets.move_to_end(sleutel)
+            return self.datasets[sleutel], True
+
+        taak = self.bezig.get(sleutel)
+        if taak is not None:
+            self.gedeeld += 1
+        else:
+            self.misses += 1
+            taak = asyncio.ensure_future(self._laad(sleutel, data_instellingen))
+            self.bezig[sleutel] = taak
+            taak.add_done_callback(lambda _: self.bezig.pop(sleutel, None))
+        return await asyncio.shield(taak), False
+
+    async def _laad(self, sleutel, data_instellingen):
+        def laad():
+            calculator = ThuisbatterijCalculator(sleutel[0])
+            calculator.metingen = None
+            for naam, waarde in data_instellingen.items():
+                setattr(calculator, naam, waarde)
+            if not calculator.laad_data():
+                raise ServiceFout(f"Kon {sleutel[0]} niet laden.", HTTPStatus.UNPROCESSABLE_ENTITY)
+            # De service rekent alleen op de (eventueel geresamplede) data
+            calculator.ruwe_data = None
+            return Dataset(sleutel, calculator)
+
+        dataset = await asyncio.get_running_loop().run_in_executor(self.pool, laad)
+
+        # Oudere versies van hetzelfde bestand zijn niet meer nodig
+        for oud in [oud for oud in self.datasets if oud[0] == sleutel[0] and oud != sleutel]:
+            del self.datasets[oud]
+        self.datasets[sleutel] = dataset
+        self._ruim_op()
+        return dataset
+
+    def _ruim_op(self):
+        """Verwijder de minst recent gebruikte datasets tot het geheugengebruik onder de grens zit."""
+        # De nieuwste dataset blijft altijd staan, ook als hij alleen al over de grens gaat
+        while len(self.datasets) > 1 and self.gebruikt() > self.max_bytes:
+            self.datasets.popitem(last=False)
+            self.verwijderd += 1
+
+    def status(self):
+        """Statistieken van de cache."""
+        # Een verzoek dat op een lopende laadactie wacht hoeft zelf niets te laden
+        verzoeken = self.hits + self.gedeeld + self.misses
+        return {
+            'datasets': len(self.datasets),
+            'geheugen_mb': self.gebruikt() / 1024 ** 2,
+            'max_geheugen_mb': self.max_bytes / 1024 ** 2,
+            'hits': self.hits,
+            'misses': self.misses,
+            'gedeeld': self.gedeeld,
+            'hit_rate': (self.hits + self.gedeeld) / verzoeken if verzoeken else None,
+            'verwijderd': self.verwijderd,
+            'bestanden': [
+                {'bestand': dataset.sleutel[0], 'rijen': len(dataset.calculator.data),
+                 'geheugen_mb': dataset.grootte / 1024 ** 2, 'capaciteiten': len(dataset.energie)}
+                for dataset in self.datasets.values()
+            ],
+        }
+
+
+def _json_waarde(waarde):
+    """Zet numpy types en oneindige getallen om naar waarden die in JSON passen."""
+    if isinstance(waarde, dict):
+        return {str(sleutel): _json_waarde(w) for sleutel, w in waarde.items()}
+    if isinstance(waarde, (list, tuple)):
+        return [_json_waarde(w) for w in waarde]
+    if isinstance(waarde, np.ndarray):
+        return _json_waarde(waarde.tolist())
+    if isinstance(waarde, np.generic):
+        waarde = waarde.item()
+    if isinstance(waarde, float) and not math.isfinite(waarde):
+        return None
+    return waarde
+
+
+def _percentielen(latenties):
+    """Latentie percentielen in milliseconden."""
+    if not latenties:
+        return {'aantal': 0}
+    waarden = np.asarray(latenties) * 1000
+    p50, p90, p95, p99 = np.percentile(waarden, [50, 90, 95, 99])
+    return {'aantal': len(waarden), 'p50_ms': p50, 'p90_ms': p90, 'p95_ms': p95, 'p99_ms': p99,
+            'max_ms': float(waarden.max())}
+
+
+class Service:
+    """
+    Rekenservice die datasets in het geheugen houdt en verzoeken gelijktijdig afhandelt.
+
+    De event loop verwerkt alleen de verzoeken; het rekenwerk gaat naar een pool van
+    threads. De numba kernel en de grote NumPy bewerkingen geven de GIL vrij, en threads
+    delen de datasets in de cache zonder ze per worker te kopiëren.
+    """
+
+    def __init__(self, max_geheugen_mb=STANDAARD_GEHEUGEN_MB, max_workers=None, instellingen=None):
+        """
+        Parameters:
+        max_geheugen_mb (float): Grens aan het geheugengebruik van de datasetcache in MB.
+        max_workers (int, optional): Aantal rekenthreads, standaard het aantal CPU's.
+        instellingen (dict, optional): Standaardinstellingen voor alle verzoeken.
+        """
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                                       thread_name_prefix='thuisbatterij')
+        self.cache = DatasetCache(int(max_geheugen_mb * 1024 ** 2), self.pool)
+        self.instellingen = dict(instellingen or {})
+        self.latenties = collections.defaultdict(lambda: collections.deque(maxlen=_LATENTIE_VENSTER))
+        self.fouten = collections.Counter()
+        self.start = time.time()
+        self.methoden = {
+            'simuleer': self.simuleer,
+            'herprijs': self.herprijs,
+            'sweep': self.sweep,
+            'status': self.status,
+        }
+
+    def _instellingen(self, parameters):
+        """Splits de instellingen van een verzoek in inlees- en rekeninstellingen."""
+        instellingen = {**self.instellingen, **parameters.get('instellingen', {})}
+        onbekend = set(instellingen) - set(DATA_INSTELLINGEN) - set(REKEN_INSTELLINGEN)
+        if onbekend:
+            raise ServiceFout(f"Onbekende instellingen: {', '.join(sorted(onbekend))}")
+        data_instellingen = {naam: instellingen[naam] for naam in DATA_INSTELLINGEN if naam in instellingen}
+        reken_instellingen = {naam: instellingen[naam] for naam in REKEN_INSTELLINGEN if naam in instellingen}
+        return data_instellingen, reken_instellingen
+
+    async def _dataset(self, parameters):
+        if 'bestand' not in parameters:
+            raise ServiceFout("Parameter 'bestand' ontbreekt.")
+        data_instellingen, reken_instellingen = self._instellingen(parameters)
+        dataset, hit = await self.cache.haal(parameters['bestand'], data_instellingen)
+        return dataset, dataset.calculator_voor(reken_instellingen), hit
+
+    @staticmethod
+    def _capaciteiten(parameters):
+        try:
+            capaciteiten = [float(capaciteit) for capaciteit in parameters.get('capaciteiten', [3, 5, 7, 10, 15])]
+        except (TypeError, ValueError):
+            raise ServiceFout("'capaciteiten' moet een lijst met getallen zijn.")
+        if not capaciteiten or min(capaciteiten) <= 0:
+            raise ServiceFout("Geef een of meer positieve capaciteiten op.")
+        return capaciteiten
+
+    async def _reken(self, functie, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, functie, *args)
+
+    @staticmethod
+    def _resultaat_rij(resultaat):
+        return {naam: resultaat[naam] for naam in (
+            'capaciteit', 'jaarlijkse_besparing', 'batterij_investering',
+            'terugverdientijd', 'totale_besparing_levensduur'
+        )}
+
+    async def simuleer(self, parameters):
+        """
+        Simuleer capaciteiten voor een dataset.
+
+        Parameters: 'bestand', 'capaciteiten' en optioneel 'instellingen'.
+        """
+        dataset, calculator, hit = await self._dataset(parameters)
+        capaciteiten = self._capaciteiten(parameters)
+        resultaten = await self._reken(calculator.simuleer_batterijen, capaciteiten, 'samenvatting')
+        for capaciteit, resultaat in resultaten.items():
+            dataset.energie[dataset.energie_sleutel(calculator, capaciteit)] = resultaat['energie']['met_batterij']
+        return {
+            'bestand': parameters['bestand'],
+            'rijen': len(calculator.data),
+            'cache_hit': hit,
+            'resultaten': [self._resultaat_rij(resultaat) for resultaat in resultaten.values()],
+        }
+
+    async def herprijs(self, parameters):
+        """
+        Bereken resultaten met andere tarieven of batterijkosten uit eerder gesimuleerde energie.
+
+        Alleen capaciteiten die voor deze laadefficiëntie en vermogensgrenzen nog niet
+        gesimuleerd zijn worden gesimuleerd; de rest wordt in O(1) per capaciteit opnieuw geprijsd.
+
+        Parameters: 'bestand', 'capaciteiten' en optioneel 'instellingen'.
+        """
+        dataset, calculator, hit = await self._dataset(parameters)
+        capaciteiten = self._capaciteiten(parameters)
+        sleutels = {capaciteit: dataset.energie_sleutel(calculator, capaciteit) for capaciteit in capaciteiten}
+
+        ontbrekend = [capaciteit for capaciteit in capaciteiten if sleutels[capaciteit] not in dataset.energie]
+        if ontbrekend:
+            resultaten = await self._reken(calculator.simuleer_batterijen, ontbrekend, 'samenvatting')
+            for capaciteit, resultaat in resultaten.items():
+                dataset.energie[sleutels[capaciteit]] = resultaat['energie']['met_batterij']
+
+        resultaten = [
+            calculator._maak_resultaat(capaciteit, dataset.energie_zonder_batterij, dataset.energie[sleutels[capaciteit]])
+            for capaciteit in capaciteiten
+        ]
+        return {
+            'bestand': parameters['bestand'],
+            'rijen': len(calculator.data),
+            'cache_hit': hit,
+            'gesimuleerd': ontbrekend,
+            'resultaten': [self._resultaat_rij(resultaat) for resultaat in resultaten],
+        }
+
+    async def sweep(self, parameters):
+        """
+        Reken een raster van scenario's door (zie thuisbatterij_scenario.scenario_grid).
+
+        Parameters: 'bestand', 'capaciteiten', optioneel 'instellingen' en per parameter uit
+        SWEEP_PARAMETERS een lijst met waarden.
+        """
+        dataset, calculator, hit = await self._dataset(parameters)
+        capaciteiten = self._capaciteiten(parameters)
+        bereiken = {naam: parameters[naam] for naam in SWEEP_PARAMETERS if naam in parameters}
+        # Een enkele rekenthread per verzoek; gelijktijdige verzoeken verdelen de pool
+        rijen = await self._reken(
+            lambda: thuisbatterij_scenario.scenario_grid(calculator, capaciteiten, max_workers=1, **bereiken)
+        )
+        return {
+            'bestand': parameters['bestand'],
+            'rijen': len(calculator.data),
+            'cache_hit': hit,
+            'scenarios': rijen.to_dict(orient='records'),
+        }
+
+    async def status(self, parameters=None):
+        """Statistieken van de cache, de latenties per methode en de pool."""
+        return {
+            'looptijd_s': time.time() - self.start,
+            'workers': self.pool._max_workers,
+            'cache': self.cache.status(),
+            'latentie': {methode: _percentielen(list(latenties)) for methode, latenties in self.latenties.items()},
+            'fouten': dict(self.fouten),
+        }
+
+    async def verwerk(self, methode, parameters):
+        """
+        Voer een methode uit en meet de latentie.
+
+        Returns:
+        dict: Het resultaat.
+        """
+        if methode not in self.methoden:
+            raise ServiceFout(f"Onbekende methode '{methode}', kies uit: {', '.join(self.methoden)}",
+                              HTTPStatus.NOT_FOUND)
+        if not isinstance(parameters, dict):
+            raise ServiceFout("De parameters moeten een JSON object zijn.")
+        start = time.perf_counter()
+        try:
+            return await self.methoden[methode](parameters)
+        except Exception:
+            self.fouten[methode] += 1
+            raise
+        finally:
+            self.latenties[methode].append(time.perf_counter() - start)
+
+    async def verwerk_rpc(self, verzoek):
+        """Verwerk een JSON-RPC 2.0 verzoek en geef het antwoord terug."""
+        if not isinstance(verzoek, dict):
+            return {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': "Ongeldig verzoek."}}
+        antwoord = {'jsonrpc': '2.0', 'id': verzoek.get('id')}
+        if verzoek.get('method') not in self.methoden:
+            antwoord['error'] = {'code': -32601, 'message': f"Onbekende methode '{verzoek.get('method')}'."}
+            return antwoord
+        try:
+            antwoord['result'] = await self.verwerk(verzoek['method'], verzoek.get('params', {}))
+        except ServiceFout as e:
+            antwoord['error'] = {'code': -32602, 'message': str(e)}
+        except Exception as e:
+            antwoord['error'] = {'code': -32000, 'message': str(e)}
+        return antwoord
+
+    async def _verwerk_http(self, methode, pad, body):
+        """Geef status en antwoord voor een HTTP verzoek."""
+        try:
+            parameters = json.loads(body) if body else {}
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {'fout': f"Ongeldige JSON: {e}"}
+
+        if pad == '/rpc' and methode == 'POST':
+            if isinstance(parameters, list):
+                return HTTPStatus.OK, list(await asyncio.gather(*(self.verwerk_rpc(v) for v in parameters)))
+            return HTTPStatus.OK, await self.verwerk_rpc(parameters)
+
+        naam = pad.strip('/')
+        if methode not in ('GET', 'POST') or (methode == 'GET' and naam != 'status'):
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'fout': f"{methode} wordt niet ondersteund voor {pad}."}
+        try:
+            return HTTPStatus.OK, await self.verwerk(naam, parameters)
+        except ServiceFout as e:
+            return e.status, {'fout': str(e)}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'fout': str(e)}
+
+    async def verbinding(self, reader, writer):
+        """Handel de HTTP/1.1 verzoeken op een verbinding af, met keep-alive."""
+        try:
+            while True:
+                regel = await reader.readline()
+                if not regel:
+                    break
+                try:
+                    methode, pad, versie = regel.decode('latin-1').split()
+                except ValueError:
+                    await self._stuur(writer, HTTPStatus.BAD_REQUEST, {'fout': "Ongeldige verzoekregel."}, False)
+                    break
+
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    naam, _, waarde = header.decode('latin-1').partition(':')
+                    headers[naam.strip().lower()] = waarde.strip()
+
+                lengte = int(headers.get('content-length', 0) or 0)
+                if lengte > _MAX_VERZOEK:
+                    await self._stuur(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'fout': "Verzoek te groot."}, False)
+                    break
+                body = await reader.readexactly(lengte) if lengte else b''
+
+                open_houden = (headers.get('connection', '').lower() != 'close'
+                               and versie.upper() != 'HTTP/1.0')
+                status, antwoord = await self._verwerk_http(methode.upper(), pad.split('?', 1)[0], body)
+                await self._stuur(writer, status, antwoord, open_houden)
+                if not open_houden:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _stuur(writer, status, antwoord, open_houden):
+        body = json.dumps(_json_waarde(antwoord), ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if open_houden else 'close'}\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+
+    async def serveer(self, host='127.0.0.1', poort=STANDAARD_POORT, bestanden=()):
+        """
+        Start de HTTP server en blijf verzoeken afhandelen.
+
+        Parameters:
+        host (str): Adres om op te luisteren; standaard alleen lokaal.
+        poort (int): TCP poort.
+        bestanden (list): Datasets die bij het starten al in de cache worden geladen.
+        """
+        for csv_file in bestanden:
+            await self.cache.haal(csv_file, self._instellingen({})[0])
+
+        server = await asyncio.start_server(self.verbinding, host, poort)
+        adressen = ', '.join(f"{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.sockets)
+        print(f"Thuisbatterij service luistert op {adressen}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argumenten=None):
+    """Command line interface voor de service."""
+    parser = argparse.ArgumentParser(description="Start een lokale HTTP/JSON-RPC service voor batterijsimulaties.")
+    parser.add_argument('--host', default='127.0.0.1', help="adres om op te luisteren")
+    parser.add_argument('-p', '--poort', type=int, default=STANDAARD_POORT, help="TCP poort")
+    parser.add_argument('--geheugen', type=float, default=STANDAARD_GEHEUGEN_MB,
+                        help="maximaal geheugengebruik van de datasetcache in MB")
+    parser.add_argument('-j', '--workers', type=int, help="aantal rekenthreads (standaard het aantal CPU's)")
+    parser.add_argument('--interval', help="simuleer op een grover interval, bijv. 5min of 15min")
+    parser.add_argument('--backend', choices=['auto', 'numba', 'numpy'], help="simulatiekern")
+    parser.add_argument('--laad', nargs='*', default=[], help="CSV bestanden om bij het starten te laden")
+    args = parser.parse_args(argumenten)
+
+    instellingen = {}
+    if args.interval:
+        instellingen['simulatie_interval'] = args.interval
+    if args.backend:
+        instellingen['simulatie_backend'] = args.backend
+
+    service = Service(args.geheugen, args.workers, instellingen)
+    try:
+        asyncio.run(service.serveer(args.host, args.poort, args.laad))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
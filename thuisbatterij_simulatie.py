@@ -0,0 +1,591 @@
+import importlib.util
+
+import numpy as np
+
+import thuisbatterij_tarieven
+
+# numba is optioneel, zonder valt de simulatie terug op pure NumPy. De import kost
+# meer tijd dan het opstarten van de rest, dus numba wordt pas bij de eerste
+# simulatie geladen en hier alleen opgezocht.
+_NUMBA_BESCHIKBAAR = importlib.util.find_spec('numba') is not None
+
+
+BACKENDS = ('auto', 'numba', 'numpy')
+
+# Verhoog dit nummer als het gedrag van de simulatie verandert; opgeslagen resultaten vervallen dan
+MODEL_VERSIE = 2
+
+# Hoeveel van de tijdreeksen een simulatie bewaart
+DETAILNIVEAUS = ('samenvatting', 'gedownsampled', 'volledig')
+
+
+# Instellingen van het vermogensmodel, zie vermogensmodel()
+VERMOGEN_INSTELLINGEN = ('laadvermogen', 'ontlaadvermogen', 'c_rate', 'standby_vermogen', 'fase_limiet', 'batterij_fase')
+
+# Fasen waarop de omvormer kan zijn aangesloten
+BATTERIJ_FASEN = ('L1', 'L2', 'L3', 'driefasig')
+
+
+# Maximaal aantal elementen (capaciteiten x intervallen) per blok in de NumPy scan
+_SCAN_BLOK = 2 ** 24
+
+# Maximaal aantal elementen (capaciteiten x intervallen) per tijdsblok in simuleer_batch
+_TIJD_BLOK = 2 ** 20
+
+
+def _laadstatus_lus(delta, capaciteiten, lading, laadstatus):
+    """
+    Referentie-implementatie van de laadstatus: een enkele lus over de intervallen,
+    waarbij per interval alle capaciteiten tegelijk worden bijgewerkt.
+    Wordt alleen gebruikt als gecompileerde kernel via numba.
+    """
+    for i in range(delta.shape[0]):
+        for j in range(capaciteiten.shape[0]):
+            nieuwe_lading = lading[j] + delta[i]
+            if nieuwe_lading < 0.0:
+                nieuwe_lading = 0.0
+            elif nieuwe_lading > capaciteiten[j]:
+                nieuwe_lading = capaciteiten[j]
+            lading[j] = nieuwe_lading
+            laadstatus[i, j] = nieuwe_lading
+
+
+def _laadstatus_begrensd_lus(netto_verbruik, uren, fase_vermogen, laadvermogen, ontlaadvermogen,
+                             laad_efficiëntie, capaciteiten, lading, laadstatus):
+    """
+    Als _laadstatus_lus, maar met een begrensd vermogen. De stroom in of uit de batterij
+    wordt per interval en capaciteit begrensd door het eigen vermogen (kW per capaciteit)
+    en de ruimte op de fase (kW per interval), omgerekend met de duur van het interval.
+    Wordt alleen gebruikt als gecompileerde kernel via numba.
+    """
+    for i in range(netto_verbruik.shape[0]):
+        fase_max = fase_vermogen[i] * uren[i]
+        for j in range(capaciteiten.shape[0]):
+            if netto_verbruik[i] > 0.0:
+                stroom = min(netto_verbruik[i], ontlaadvermogen[j] * uren[i], fase_max)
+                nieuwe_lading = lading[j] - stroom
+            else:
+                stroom = min(-netto_verbruik[i], laadvermogen[j] * uren[i], fase_max)
+                nieuwe_lading = lading[j] + stroom * laad_efficiëntie
+            if nieuwe_lading < 0.0:
+                nieuwe_lading = 0.0
+            elif nieuwe_lading > capaciteiten[j]:
+                nieuwe_lading = capaciteiten[j]
+            lading[j] = nieuwe_lading
+            laadstatus[i, j] = nieuwe_lading
+
+
+_numba_kernels = {}
+
+
+def _numba_kernel(begrensd=False):
+    """Compileer een numba kernel bij het eerste gebruik (uit de cache van numba als die er is)."""
+    if begrensd not in _numba_kernels:
+        import numba
+        lus = _laadstatus_begrensd_lus if begrensd else _laadstatus_lus
+        _numba_kernels[begrensd] = numba.njit(cache=True, nogil=True)(lus)
+    return _numba_kernels[begrensd]
+
+
+def _laadstatus_scan(delta, capaciteiten, begin_lading):
+    """
+    Bereken de laadstatus met pure NumPy via een parallelle prefix-scan.
+
+    Elke stap is een functie f(x) = min(max(x + a, lo), hi). De samenstelling van twee
+    van zulke functies heeft weer dezelfde vorm, dus alle prefixen kunnen in log2(n)
+    gevectoriseerde rondes worden berekend in plaats van met een Python-lus. De
+    verschuiving a is een rij die voor alle capaciteiten gelijk is, of bij een vermogen
+    dat van de capaciteit afhangt een rij per capaciteit; lo en hi verschillen altijd.
+    """
+    a = np.array(delta, dtype=np.float64)
+    aantal = a.shape[-1]
+    lo = np.zeros((len(capaciteiten), aantal))
+    hi = np.repeat(capaciteiten[:, None], aantal, axis=1)
+
+    stap = 1
+    while stap < aantal:
+        # Stel de latere functie (b, lo2, hi2) samen met de eerdere (a1, lo1, hi1)
+        b, lo2, hi2 = a[..., stap:], lo[:, stap:], hi[:, stap:]
+        nieuw_a = a[..., :-stap] + b
+        nieuw_lo = np.minimum(np.maximum(lo[:, :-stap] + b, lo2), hi2)
+        nieuw_hi = np.minimum(np.maximum(hi[:, :-stap] + b, lo2), hi2)
+        a[..., stap:] = nieuw_a
+        lo[:, stap:] = nieuw_lo
+        hi[:, stap:] = nieuw_hi
+        stap *= 2
+
+    return np.minimum(np.maximum(begin_lading[:, None] + a, lo), hi)
+
+
+def kies_backend(backend='auto'):
+    """
+    Bepaal welke rekenkern gebruikt wordt.
+
+    Parameters:
+    backend (str): 'auto', 'numba' of 'numpy'.
+
+    Returns:
+    str: De daadwerkelijk te gebruiken backend ('numba' of 'numpy').
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Onbekende backend '{backend}', kies uit {', '.join(BACKENDS)}.")
+    if backend == 'numba' and not _NUMBA_BESCHIKBAAR:
+        raise ValueError("De numba backend is gevraagd maar numba is niet geïnstalleerd.")
+    if backend == 'auto':
+        return 'numba' if _NUMBA_BESCHIKBAAR else 'numpy'
+    return backend
+
+
+def bereken_netto_kosten(totaal_import, totaal_export, tariefband, tarief_dag, tarief_nacht, teruglever_tarief,
+                         kalender=None):
+    """
+    Bereken de kosten zonder batterij per interval.
+
+    Parameters:
+    totaal_import (ndarray): Geïmporteerde energie per interval in kWh.
+    totaal_export (ndarray): Geëxporteerde energie per interval in kWh.
+    tariefband (ndarray): Band per interval uit de tariefkalender (of True voor dagtarief).
+    tarief_dag (float): Prijs per kWh overdag (€).
+    tarief_nacht (float): Prijs per kWh 's nachts (€).
+    teruglever_tarief (float): Teruglevertarief per kWh (€).
+    kalender (TariefKalender, optional): Kalender van de banden, standaard dag 7-23 uur.
+
+    Returns:
+    ndarray: Netto kosten per interval (€).
+    """
+    kalender = thuisbatterij_tarieven.maak_kalender(kalender)
+    import_prijs, export_prijs = kalender.prijs_per_interval(
+        thuisbatterij_tarieven.als_tariefband(tariefband, kalender), tarief_dag, tarief_nacht, teruglever_tarief
+    )
+    import_kosten = np.asarray(totaal_import, dtype=np.float64) * import_prijs
+    export_opbrengst = np.asarray(totaal_export, dtype=np.float64) * export_prijs
+    return import_kosten - export_opbrengst
+
+
+def vermogen_begrensd(instellingen):
+    """
+    Geef aan of vermogensinstellingen iets begrenzen of verbruiken.
+
+    Parameters:
+    instellingen (dict): Waarden van (een deel van) VERMOGEN_INSTELLINGEN.
+
+    Returns:
+    bool: False als er geen vermogensmodel nodig is.
+    """
+    begrensd = (instellingen.get(naam) for naam in ('laadvermogen', 'ontlaadvermogen', 'c_rate', 'fase_limiet'))
+    return any(waarde is not None for waarde in begrensd) or bool(instellingen.get('standby_vermogen'))
+
+
+def verbruik_met_standby(netto_verbruik, vermogen):
+    """Tel het standby verbruik van de omvormer op bij het netto verbruik per interval."""
+    if vermogen is None or not vermogen['standby_vermogen']:
+        return netto_verbruik
+    # De omvormer verbruikt altijd iets, uit de batterij of anders van het net
+    return netto_verbruik + vermogen['standby_vermogen'] * vermogen['uren']
+
+
+def vermogensmodel(interval_uren, fase_vermogens=None, laadvermogen=None, ontlaadvermogen=None, c_rate=None,
+                   standby_vermogen=0.0, fase_limiet=None, batterij_fase='L1'):
+    """
+    Stel de vermogensgrenzen van de batterij per interval samen.
+
+    Zonder grenzen neemt de batterij in elk interval alle energie op of levert hij alles
+    wat nodig is. Met dit model wordt de stroom begrensd door het laad- en
+    ontlaadvermogen (in kW of als C-rate), en door de aansluitwaarde van de fase waarop
+    de omvormer zit. Het gemeten maximum per fase telt daarbij als al bezet, dus alleen
+    de resterende ruimte is beschikbaar (een voorzichtige schatting). Het standby
+    verbruik van de omvormer telt als extra verbruik achter de meter.
+
+    Parameters:
+    interval_uren (ndarray): Duur van elk interval in uren.
+    fase_vermogens (ndarray, optional): Maximaal vermogen per fase in W (intervallen x 3),
+                                        nodig voor fase_limiet.
+    laadvermogen (float, optional): Maximaal laadvermogen in kW.
+    ontlaadvermogen (float, optional): Maximaal ontlaadvermogen in kW.
+    c_rate (float, optional): Maximaal vermogen als deel van de capaciteit per uur, bijv. 0.5.
+    standby_vermogen (float): Verbruik van de omvormer in kW.
+    fase_limiet (float of tuple, optional): Aansluitwaarde per fase in W, of een waarde per fase.
+    batterij_fase (str): 'L1', 'L2', 'L3' of 'driefasig' (vermogen gelijk verdeeld over de fasen).
+
+    Returns:
+    dict: De grenzen voor simuleer_batch(), of None als er niets begrensd is.
+    """
+    if not vermogen_begrensd({'laadvermogen': laadvermogen, 'ontlaadvermogen': ontlaadvermogen, 'c_rate': c_rate,
+                              'fase_limiet': fase_limiet, 'standby_vermogen': standby_vermogen}):
+        return None
+    if batterij_fase not in BATTERIJ_FASEN:
+        raise ValueError(f"Onbekende fase '{batterij_fase}', kies uit {', '.join(BATTERIJ_FASEN)}.")
+    for naam, waarde in (('laadvermogen', laadvermogen), ('ontlaadvermogen', ontlaadvermogen), ('c_rate', c_rate)):
+        if waarde is not None and waarde < 0:
+            raise ValueError(f"{naam} mag niet negatief zijn, niet {waarde}.")
+
+    uren = np.asarray(interval_uren, dtype=np.float64)
+    if np.any(uren <= 0):
+        raise ValueError("De duur van elk interval moet positief zijn.")
+
+    fase = None
+    if fase_limiet is not None:
+        if fase_vermogens is None:
+            raise ValueError("Voor een fase_limiet zijn de kolommen met het vermogen per fase nodig.")
+        # Ruimte per fase in kW: de aansluitwaarde min wat er al gemeten is
+        ruimte = np.maximum(np.asarray(fase_limiet, dtype=np.float64)
+                            - np.asarray(fase_vermogens, dtype=np.float64), 0.0) / 1000
+        if batterij_fase == 'driefasig':
+            fase = 3 * ruimte.min(axis=1)
+        else:
+            fase = ruimte[:, BATTERIJ_FASEN.index(batterij_fase)]
+        fase = np.ascontiguousarray(np.nan_to_num(fase, nan=np.inf))
+
+    return {
+        'uren': uren,
+        'fase': fase,
+        'laadvermogen': laadvermogen,
+        'ontlaadvermogen': ontlaadvermogen,
+        'c_rate': c_rate,
+        'standby_vermogen': float(standby_vermogen or 0.0),
+    }
+
+
+def vermogen_blok(vermogen, begin, eind):
+    """Geef het vermogensmodel voor de intervallen begin tot eind (None blijft None)."""
+    if vermogen is None:
+        return None
+    return {**vermogen, 'uren': vermogen['uren'][begin:eind],
+            'fase': None if vermogen['fase'] is None else vermogen['fase'][begin:eind]}
+
+
+def _max_vermogen(vermogen, capaciteiten):
+    """Maximaal laad- en ontlaadvermogen in kW per capaciteit (oneindig als onbegrensd)."""
+    grenzen = []
+    for naam in ('laadvermogen', 'ontlaadvermogen'):
+        grens = np.full(len(capaciteiten), np.inf if vermogen[naam] is None else float(vermogen[naam]))
+        if vermogen['c_rate'] is not None:
+            grens = np.minimum(grens, vermogen['c_rate'] * capaciteiten)
+        grenzen.append(grens)
+    return grenzen
+
+
+def max_stroom(vermogen, capaciteit):
+    """
+    Bepaal hoeveel energie een batterij per interval maximaal kan laden en ontladen.
+
+    Parameters:
+    vermogen (dict): Vermogensgrenzen, zie vermogensmodel().
+    capaciteit (float): Capaciteit van de batterij in kWh.
+
+    Returns:
+    tuple: (laden, ontladen) in kWh per interval aan de netzijde, oneindig als onbegrensd.
+    """
+    laadvermogen, ontlaadvermogen = _max_vermogen(vermogen, np.array([capaciteit], dtype=np.float64))
+    fase = vermogen['fase'] if vermogen['fase'] is not None else np.inf
+    return (np.minimum(laadvermogen[0], fase) * vermogen['uren'],
+            np.minimum(ontlaadvermogen[0], fase) * vermogen['uren'])
+
+
+def bereken_laadstatus(netto_verbruik, capaciteiten, laad_efficiëntie, begin_lading=None, backend='auto',
+                       vermogen=None):
+    """
+    Bereken de lading van een of meer batterijen na elk interval.
+
+    Parameters:
+    netto_verbruik (ndarray): Import min export per interval in kWh (positief = import).
+    capaciteiten (list): Capaciteiten van de batterijen in kWh.
+    laad_efficiëntie (float): Laadefficiëntie (0-1).
+    begin_lading (list, optional): Lading per batterij bij de start, standaard 50% van de capaciteit.
+    backend (str): 'auto', 'numba' of 'numpy'.
+    vermogen (dict, optional): Vermogensgrenzen voor dezelfde intervallen, zie vermogensmodel().
+
+    Returns:
+    ndarray: Lading (kWh) per capaciteit (rij) na elk interval (kolom).
+    """
+    netto_verbruik = np.asarray(netto_verbruik, dtype=np.float64)
+    capaciteiten = np.atleast_1d(np.asarray(capaciteiten, dtype=np.float64))
+    if begin_lading is None:
+        begin_lading = capaciteiten * 0.5
+    begin_lading = np.broadcast_to(np.asarray(begin_lading, dtype=np.float64), capaciteiten.shape)
+    numba_backend = kies_backend(backend) == 'numba'
+
+    if vermogen is None:
+        # Ontladen gaat verliesvrij, bij laden gaat een deel van het overschot verloren
+        delta = np.where(netto_verbruik > 0, -netto_verbruik, -netto_verbruik * laad_efficiëntie)
+    else:
+        laadvermogen, ontlaadvermogen = _max_vermogen(vermogen, capaciteiten)
+        uren = vermogen['uren']
+        fase = vermogen['fase'] if vermogen['fase'] is not None else np.full(len(netto_verbruik), np.inf)
+        if numba_backend:
+            laadstatus = np.empty((len(netto_verbruik), len(capaciteiten)))
+            _numba_kernel(begrensd=True)(netto_verbruik, uren, fase, laadvermogen, ontlaadvermogen,
+                                         laad_efficiëntie, capaciteiten, begin_lading.copy(), laadstatus)
+            return laadstatus.T
+
+        # Hangt het vermogen niet van de capaciteit af, dan is de verschuiving voor alle capaciteiten gelijk
+        if np.all(laadvermogen == laadvermogen[0]) and np.all(ontlaadvermogen == ontlaadvermogen[0]):
+            laadvermogen, ontlaadvermogen = laadvermogen[:1], ontlaadvermogen[:1]
+        fase_max = fase * uren
+        ontladen = np.minimum(np.minimum(netto_verbruik, ontlaadvermogen[:, None] * uren), fase_max)
+        laden = np.minimum(np.minimum(-netto_verbruik, laadvermogen[:, None] * uren), fase_max)
+        delta = np.where(netto_verbruik > 0, -ontladen, laden * laad_efficiëntie)
+        if len(delta) == 1:
+            delta = delta[0]
+
+    if numba_backend:
+        laadstatus = np.empty((len(delta), len(capaciteiten)))
+        _numba_kernel()(delta, capaciteiten, begin_lading.copy(), laadstatus)
+        return laadstatus.T
+
+    # Verdeel de capaciteiten in blokken zodat de scan binnen een vaste geheugengrens blijft
+    laadstatus = np.empty((len(capaciteiten), len(netto_verbruik)))
+    blok = max(1, _SCAN_BLOK // max(len(netto_verbruik), 1))
+    for begin in range(0, len(capaciteiten), blok):
+        eind = begin + blok
+        blok_delta = delta if delta.ndim == 1 else delta[begin:eind]
+        laadstatus[begin:eind] = _laadstatus_scan(blok_delta, capaciteiten[begin:eind], begin_lading[begin:eind])
+    return laadstatus
+
+
+# Energiestromen per tariefemmer waarmee de kosten achteraf berekend worden, bij de standaard
+# tariefkalender; een andere kalender heeft zijn eigen emmers (TariefKalender.emmers)
+ENERGIE_EMMERS = thuisbatterij_tarieven.STANDAARD_KALENDER.emmers
+
+
+def _simuleer_blok(totaal_import, totaal_export, capaciteiten, laad_efficiëntie, begin_lading, backend, vermogen=None):
+    """
+    Simuleer een blok intervallen.
+
+    Returns:
+    tuple: (laadstatus, resterende import, resterende export) per capaciteit en interval in float64.
+    """
+    netto_verbruik = verbruik_met_standby(totaal_import - totaal_export, vermogen)
+    laadstatus = bereken_laadstatus(netto_verbruik, capaciteiten, laad_efficiëntie, begin_lading, backend, vermogen)
+
+    # Verandering van de lading per interval (negatief = ontladen), zonder kopie van de vorige lading
+    verschil = np.empty_like(laadstatus)
+    np.subtract(laadstatus[:, :1], begin_lading[:, None], out=verschil[:, :1])
+    np.subtract(laadstatus[:, 1:], laadstatus[:, :-1], out=verschil[:, 1:])
+
+    # Wat de batterij niet opvangt wordt alsnog geïmporteerd of geëxporteerd; de export
+    # hergebruikt de buffer van het verschil zodat er per blok maar drie arrays zijn
+    ontladen = netto_verbruik > 0
+    resterende_import = verschil + netto_verbruik
+    resterende_import *= ontladen
+    resterende_export = np.multiply(verschil, -1.0 / laad_efficiëntie, out=verschil)
+    resterende_export -= netto_verbruik
+    resterende_export *= ~ontladen
+    return laadstatus, resterende_import, resterende_export
+
+
+def bereken_energie(totaal_import, totaal_export, tariefband, kalender=None):
+    """
+    Tel import en export op per tariefemmer.
+
+    Parameters:
+    totaal_import (ndarray): Geïmporteerde energie per interval in kWh (laatste as is de tijd).
+    totaal_export (ndarray): Geëxporteerde energie per interval in kWh.
+    tariefband (ndarray): Band per interval uit de tariefkalender (of True voor dagtarief).
+    kalender (TariefKalender, optional): Kalender van de banden, standaard dag 7-23 uur.
+
+    Returns:
+    dict: Energie in kWh per emmer van de kalender, standaard 'import_dag', 'import_nacht' en 'export'.
+    """
+    kalender = thuisbatterij_tarieven.maak_kalender(kalender)
+    return kalender.energie(totaal_import, totaal_export, thuisbatterij_tarieven.als_tariefband(tariefband, kalender))
+
+
+def prijs_energie(energie, tarief_dag, tarief_nacht, teruglever_tarief, kalender=None):
+    """
+    Bereken de kosten van de energiestromen per tariefemmer.
+
+    Omdat de batterij niet op prijzen stuurt, kunnen tarieven zo achteraf worden
+    aangepast zonder de simulatie opnieuw uit te voeren.
+
+    Parameters:
+    energie (dict): Energie per emmer van de kalender in kWh (getallen of arrays).
+    tarief_dag (float): Prijs per kWh overdag (€).
+    tarief_nacht (float): Prijs per kWh 's nachts (€).
+    teruglever_tarief (float): Teruglevertarief per kWh (€).
+    kalender (TariefKalender, optional): Kalender met de emmers en eventuele eigen prijzen.
+
+    Returns:
+    float of ndarray: Netto kosten (€).
+    """
+    return thuisbatterij_tarieven.maak_kalender(kalender).prijs(energie, tarief_dag, tarief_nacht, teruglever_tarief)
+
+
+def reeks_grenzen(aantal, reeks_stap):
+    """
+    Bepaal de laatste intervalindex van elke emmer bij gedownsamplede reeksen.
+
+    Parameters:
+    aantal (int): Aantal intervallen.
+    reeks_stap (int): Aantal intervallen per emmer.
+
+    Returns:
+    ndarray: Index van het laatste interval per emmer.
+    """
+    return np.minimum(np.arange(reeks_stap - 1, aantal + reeks_stap - 1, reeks_stap), aantal - 1)
+
+
+def downsample_kosten(kosten, reeks_stap):
+    """
+    Tel kosten per emmer van reeks_stap intervallen op, zodat de cumulatieve som behouden blijft.
+
+    Parameters:
+    kosten (ndarray): Kosten per interval (laatste as is de tijd).
+    reeks_stap (int): Aantal intervallen per emmer.
+
+    Returns:
+    ndarray: Kosten per emmer.
+    """
+    if reeks_stap == 1:
+        return kosten
+    return np.add.reduceat(kosten, np.arange(0, kosten.shape[-1], reeks_stap), axis=-1)
+
+
+def simuleer_batch(totaal_import, totaal_export, tariefband, capaciteiten, tarief_dag, tarief_nacht,
+                   teruglever_tarief, laad_efficiëntie, begin_lading=None, backend='auto',
+                   detailniveau='volledig', reeks_stap=1, reeks_dtype='float64',
+                   laadstatus_uit=None, kosten_uit=None, vermogen=None, kalender=None, bij_blok=None):
+    """
+    Simuleer meerdere batterijcapaciteiten in een enkele doorloop van de data.
+
+    Het gedrag is gelijk aan de oorspronkelijke rij-voor-rij simulatie: bij netto import
+    wordt de batterij ontladen, bij netto export wordt de batterij geladen. De data wordt
+    in tijdsblokken verwerkt, zodat het werkgeheugen begrensd blijft als er geen
+    volledige reeksen nodig zijn.
+
+    Parameters:
+    totaal_import (ndarray): Geïmporteerde energie per interval in kWh.
+    totaal_export (ndarray): Geëxporteerde energie per interval in kWh.
+    tariefband (ndarray): Band per interval uit de tariefkalender (of True voor dagtarief).
+    capaciteiten (list): Capaciteiten van de batterijen in kWh.
+    tarief_dag (float): Prijs per kWh overdag (€).
+    tarief_nacht (float): Prijs per kWh 's nachts (€).
+    teruglever_tarief (float): Teruglevertarief per kWh (€).
+    laad_efficiëntie (float): Laadefficiëntie (0-1).
+    begin_lading (list, optional): Lading per batterij bij de start, standaard 50% van de capaciteit.
+    backend (str): 'auto', 'numba' of 'numpy'.
+    detailniveau (str): 'samenvatting' (alleen totalen), 'gedownsampled' (een waarde per
+                        reeks_stap intervallen) of 'volledig' (elk interval).
+    reeks_stap (int): Aantal intervallen per emmer bij 'gedownsampled'.
+    reeks_dtype (str): Datatype van de bewaarde reeksen, bijv. 'float64' of 'float32'.
+    laadstatus_uit (ndarray, optional): Array (bijv. een memmap) om de laadstatus in op te slaan.
+    kosten_uit (ndarray, optional): Array (bijv. een memmap) om de nieuwe kosten in op te slaan.
+    vermogen (dict, optional): Grenzen aan het laad- en ontlaadvermogen, zie vermogensmodel().
+    kalender (TariefKalender, optional): Kalender van de banden, standaard dag 7-23 uur.
+    bij_blok (callable, optional): Wordt na elk tijdsblok aangeroepen met (verwerkt, aantal)
+                                   intervallen, bijv. voor een voortgangsbalk; een uitzondering
+                                   daarin breekt de simulatie af.
+
+    Returns:
+    dict: 'batterij_laadstatus' en 'nieuwe_kosten' als arrays (capaciteiten x emmers, of None
+          bij 'samenvatting'), 'energie' met de import en export per tariefemmer, en
+          'totale_nieuwe_kosten' en 'eind_lading' per capaciteit.
+    """
+    if detailniveau not in DETAILNIVEAUS:
+        raise ValueError(f"Onbekend detailniveau '{detailniveau}', kies uit {', '.join(DETAILNIVEAUS)}.")
+
+    # Compacte (bijv. float32) data wordt per tijdsblok omgezet, niet in een keer
+    totaal_import = np.asarray(totaal_import)
+    totaal_export = np.asarray(totaal_export)
+    kalender = thuisbatterij_tarieven.maak_kalender(kalender)
+    tariefband = thuisbatterij_tarieven.als_tariefband(tariefband, kalender)
+    capaciteiten = np.atleast_1d(np.asarray(capaciteiten, dtype=np.float64))
+    if begin_lading is None:
+        begin_lading = capaciteiten * 0.5
+    lading = np.array(np.broadcast_to(np.asarray(begin_lading, dtype=np.float64), capaciteiten.shape))
+
+    aantal = len(totaal_import)
+    reeks_stap = 1 if detailniveau == 'volledig' else max(1, int(reeks_stap))
+    aantal_emmers = -(-aantal // reeks_stap)
+
+    laadstatus = kosten = None
+    if detailniveau != 'samenvatting':
+        laadstatus = laadstatus_uit if laadstatus_uit is not None else np.empty((len(capaciteiten), aantal_emmers), dtype=reeks_dtype)
+        kosten = kosten_uit if kosten_uit is not None else np.empty((len(capaciteiten), aantal_emmers), dtype=reeks_dtype)
+
+    # Blokgrootte in intervallen, een veelvoud van de emmergrootte
+    blok = max(reeks_stap, (_TIJD_BLOK // len(capaciteiten)) // reeks_stap * reeks_stap)
+    energie = {emmer: np.zeros(len(capaciteiten)) for emmer in kalender.emmers}
+
+    for begin in range(0, aantal, blok):
+        eind = min(begin + blok, aantal)
+        blok_laadstatus, blok_import, blok_export = _simuleer_blok(
+            totaal_import[begin:eind].astype(np.float64, copy=False), totaal_export[begin:eind].astype(np.float64, copy=False),
+            capaciteiten, laad_efficiëntie, lading, backend,
+            vermogen_blok(vermogen, begin, eind)
+        )
+        lading = blok_laadstatus[:, -1].copy()
+        for emmer, waarde in kalender.energie(blok_import, blok_export, tariefband[begin:eind]).items():
+            energie[emmer] += waarde
+
+        if detailniveau != 'samenvatting':
+            import_prijs, export_prijs = kalender.prijs_per_interval(
+                tariefband[begin:eind], tarief_dag, tarief_nacht, teruglever_tarief
+            )
+            blok_kosten = blok_import * import_prijs - blok_export * export_prijs
+            emmers = slice(begin // reeks_stap, -(-eind // reeks_stap))
+            laadstatus[:, emmers] = blok_laadstatus[:, reeks_grenzen(eind - begin, reeks_stap)]
+            kosten[:, emmers] = downsample_kosten(blok_kosten, reeks_stap)
+
+        if bij_blok is not None:
+            bij_blok(eind, aantal)
+
+    return {
+        'batterij_laadstatus': laadstatus,
+        'nieuwe_kosten': kosten,
+        'energie': energie,
+        'totale_nieuwe_kosten': kalender.prijs(energie, tarief_dag, tarief_nacht, teruglever_tarief),
+        'eind_lading': lading
+    }
+
+
+def simuleer(totaal_import, totaal_export, tariefband, capaciteit, tarief_dag, tarief_nacht,
+             teruglever_tarief, laad_efficiëntie, begin_lading=None, backend='auto', kalender=None):
+    """
+    Simuleer een enkele batterij op basis van arrays met import, export en tariefband.
+
+    Parameters:
+    capaciteit (float): Capaciteit van de batterij in kWh.
+    begin_lading (float, optional): Lading bij de start, standaard 50% van de capaciteit.
+    Overige parameters zijn gelijk aan simuleer_batch().
+
+    Returns:
+    dict: 'batterij_laadstatus' en 'nieuwe_kosten' als arrays, en de 'eind_lading'.
+    """
+    if begin_lading is None:
+        begin_lading = capaciteit * 0.5
+
+    batch = simuleer_batch(
+        totaal_import, totaal_export, tariefband, [capaciteit], tarief_dag, tarief_nacht,
+        teruglever_tarief, laad_efficiëntie, [begin_lading], backend, kalender=kalender
+    )
+
+    return {
+        'batterij_laadstatus': batch['batterij_laadstatus'][0],
+        'nieuwe_kosten': batch['nieuwe_kosten'][0],
+        'eind_lading': float(batch['eind_lading'][0])
+    }
+
+
+def bereken_roi(capaciteit, jaarlijkse_besparing, batterij_kosten_per_kwh, batterij_levensduur):
+    """
+    Bereken investering, terugverdientijd en totale besparing voor een capaciteit.
+
+    Parameters:
+    capaciteit (float): Capaciteit van de batterij in kWh.
+    jaarlijkse_besparing (float): Besparing per jaar (€).
+    batterij_kosten_per_kwh (float): Aanschafkosten per kWh batterijcapaciteit (€).
+    batterij_levensduur (float): Levensduur in jaren.
+
+    Returns:
+    dict: 'batterij_investering', 'terugverdientijd' en 'totale_besparing_levensduur'.
+    """
+    batterij_investering = capaciteit * batterij_kosten_per_kwh
+    terugverdientijd = batterij_investering / jaarlijkse_besparing if jaarlijkse_besparing > 0 else float('inf')
+    totale_besparing_levensduur = jaarlijkse_besparing * batterij_levensduur - batterij_investering
+
+    return {
+        'batterij_investering': batterij_investering,
+        'terugverdientijd': terugverdientijd,
+        'totale_besparing_levensduur': totale_besparing_levensduur
+    }
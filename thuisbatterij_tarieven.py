@@ -0,0 +1,342 @@
+import hashlib
+import json
+
+import numpy as np
+
+
+# Dagsoorten van de kalender: de dagen van de week en een feestdag
+DAGSOORTEN = ('ma', 'di', 'wo', 'do', 'vr', 'za', 'zo', 'feestdag')
+
+# Resolutie van de kalender binnen een dag
+KWARTIEREN_PER_DAG = 96
+_SLOTS = len(DAGSOORTEN) * KWARTIEREN_PER_DAG
+_NS_PER_KWARTIER = 15 * 60 * 10 ** 9
+
+# De bekende dag/nacht regel: 7-23 uur dagtarief, ook in het weekend
+STANDAARD_SPECIFICATIE = {
+    'banden': ['dag', 'nacht'],
+    'standaard': 'nacht',
+    'regels': [{'band': 'dag', 'van': '07:00', 'tot': '23:00'}],
+}
+
+# 1970-01-01 was een donderdag; zo wordt maandag dag 0
+_WEEKDAG_VERSCHUIVING = 3
+
+
+def _pasen(jaar):
+    """Bepaal de datum van eerste paasdag (Gregoriaanse kalender)."""
+    a, b, c = jaar % 19, jaar // 100, jaar % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    maand = (h + l - 7 * m + 90) // 25
+    dag = (h + l - 7 * m + 33 * maand + 19) % 32
+    return np.datetime64(f'{jaar:04d}-{maand:02d}-{dag:02d}')
+
+
+def feestdagen_nl(jaar):
+    """
+    Geef de Nederlandse feestdagen van een jaar waarop energieleveranciers meestal het laagste tarief rekenen.
+
+    Parameters:
+    jaar (int): Het jaar.
+
+    Returns:
+    list: Datums als datetime64[D].
+    """
+    pasen = _pasen(jaar)
+    koningsdag = np.datetime64(f'{jaar:04d}-04-27')
+    if (koningsdag.astype(np.int64) + _WEEKDAG_VERSCHUIVING) % 7 == 6:
+        # Valt Koningsdag op zondag, dan wordt hij op zaterdag gevierd
+        koningsdag -= 1
+    return [
+        np.datetime64(f'{jaar:04d}-01-01'),
+        pasen, pasen + 1,
+        koningsdag,
+        pasen + 39,
+        pasen + 49, pasen + 50,
+        np.datetime64(f'{jaar:04d}-12-25'), np.datetime64(f'{jaar:04d}-12-26'),
+    ]
+
+
+_FEESTDAG_BRONNEN = {'nl': feestdagen_nl}
+
+
+def _kwartier(tijd):
+    """Zet 'uu:mm' om naar een kwartier van de dag; '24:00' is het einde van de dag."""
+    uur, _, minuut = str(tijd).partition(':')
+    minuten = int(uur) * 60 + int(minuut or 0)
+    if minuten % 15 or not 0 <= minuten <= 24 * 60:
+        raise ValueError(f"Tijd '{tijd}' moet een heel kwartier tussen 00:00 en 24:00 zijn.")
+    return minuten // 15
+
+
+def _dagsoorten(dagen):
+    """Zet een lijst dagen ('ma', 'za', 'feestdag', 'werkdag', 'weekend') om naar indices in DAGSOORTEN."""
+    if dagen is None:
+        return list(range(len(DAGSOORTEN)))
+    groepen = {'werkdag': DAGSOORTEN[:5], 'weekend': DAGSOORTEN[5:7]}
+    indices = []
+    for dag in [dagen] if isinstance(dagen, str) else dagen:
+        for naam in groepen.get(dag, (dag,)):
+            if naam not in DAGSOORTEN:
+                raise ValueError(f"Onbekende dag '{naam}', kies uit {', '.join(DAGSOORTEN)}, werkdag of weekend.")
+            indices.append(DAGSOORTEN.index(naam))
+    return indices
+
+
+class TariefKalender:
+    """
+    Kalender die elk interval een tariefband geeft, gecompileerd tot een opzoektabel.
+
+    Een specificatie bestaat uit importbanden (bijv. dag en nacht, of piek, dal en
+    superdal), regels die per dag van de week, feestdag en kwartier een band kiezen, en
+    optioneel perioden vanaf een datum met eigen regels of prijzen (bijv. een nieuw
+    contract of het einde van de salderingsregeling). De regels worden eenmalig
+    vertaald naar een tabel van perioden x dagsoorten x kwartieren; elk interval krijgt
+    daarna zijn band met een enkele indexering in die tabel.
+
+    Een band is de combinatie van periode en importband. Per band wordt de import
+    opgeteld, per periode de export; met de prijzen per band kunnen de kosten achteraf
+    berekend worden, net als bij herprijzen.
+    """
+
+    def __init__(self, specificatie=None):
+        """
+        Parameters:
+        specificatie (dict, optional): Zie STANDAARD_SPECIFICATIE en de README; standaard de 7-23 uur regel.
+        """
+        self.specificatie = json.loads(json.dumps(specificatie or STANDAARD_SPECIFICATIE))
+        spec = self.specificatie
+        self.banden = tuple(spec.get('banden', ()))
+        if not self.banden or len(set(self.banden)) != len(self.banden):
+            raise ValueError("Geef een of meer verschillende banden op.")
+
+        basis = {'regels': spec.get('regels', []), 'standaard': spec.get('standaard', self.banden[-1]),
+                 'prijzen': spec.get('prijzen', {}), 'teruglever_tarief': spec.get('teruglever_tarief')}
+        perioden = [{**basis, 'vanaf': None}]
+        for periode in sorted(spec.get('perioden', []), key=lambda p: str(p['vanaf'])):
+            # Een periode erft wat hij niet zelf opgeeft van de vorige
+            vorige = perioden[-1]
+            perioden.append({
+                'vanaf': str(np.datetime64(periode['vanaf'], 'D')),
+                'regels': periode.get('regels', vorige['regels']),
+                'standaard': periode.get('standaard', vorige['standaard']),
+                'prijzen': {**vorige['prijzen'], **periode.get('prijzen', {})},
+                'teruglever_tarief': periode.get('teruglever_tarief', vorige['teruglever_tarief']),
+            })
+        self.perioden = perioden
+        if len(perioden) * len(self.banden) > np.iinfo(np.uint8).max:
+            raise ValueError("Te veel combinaties van perioden en banden (maximaal 255).")
+
+        self.tabel = np.empty((len(perioden), _SLOTS), dtype=np.uint8)
+        for p, periode in enumerate(perioden):
+            self.tabel[p] = self._compileer(periode['regels'], periode['standaard']) + p * len(self.banden)
+        self.grenzen = np.array([periode['vanaf'] for periode in perioden[1:]], dtype='datetime64[D]').view(np.int64)
+
+        feestdagen = spec.get('feestdagen', [])
+        self._feestdag_bron = _FEESTDAG_BRONNEN.get(feestdagen) if isinstance(feestdagen, str) else None
+        if isinstance(feestdagen, str) and self._feestdag_bron is None:
+            raise ValueError(f"Onbekende feestdagen '{feestdagen}', kies uit {', '.join(_FEESTDAG_BRONNEN)} of geef datums op.")
+        self._feestdagen = np.array([] if self._feestdag_bron else feestdagen, dtype='datetime64[D]')
+
+        # Namen van de energie per band, zoals in thuisbatterij_simulatie.ENERGIE_EMMERS bij de standaardkalender
+        achtervoegsel = ['' if p == 0 else f"_{periode['vanaf']}" for p, periode in enumerate(perioden)]
+        self.import_emmers = tuple(f'import_{band}{a}' for a in achtervoegsel for band in self.banden)
+        self.export_emmers = tuple(f'export{a}' for a in achtervoegsel)
+        self.emmers = self.import_emmers + self.export_emmers
+        self._sleutel = None
+
+    def _compileer(self, regels, standaard):
+        """Vertaal de regels van een periode naar een band per dagsoort en kwartier."""
+        tabel = np.full((len(DAGSOORTEN), KWARTIEREN_PER_DAG), self._band(standaard), dtype=np.uint8)
+        # Latere regels gaan voor eerdere
+        for regel in regels:
+            van, tot = _kwartier(regel.get('van', '00:00')), _kwartier(regel.get('tot', '24:00'))
+            kwartieren = np.arange(van, tot) if van < tot else np.r_[np.arange(van, KWARTIEREN_PER_DAG), np.arange(0, tot)]
+            tabel[np.ix_(_dagsoorten(regel.get('dagen')), kwartieren)] = self._band(regel['band'])
+        return tabel.ravel()
+
+    def _band(self, naam):
+        if naam not in self.banden:
+            raise ValueError(f"Onbekende band '{naam}', kies uit {', '.join(self.banden)}.")
+        return self.banden.index(naam)
+
+    @property
+    def aantal_banden(self):
+        """Aantal combinaties van periode en importband."""
+        return len(self.perioden) * len(self.banden)
+
+    def sleutel(self):
+        """
+        Bepaal een sleutel van de indeling in banden, zonder de prijzen.
+
+        Returns:
+        str: Hexadecimale sleutel; gelijk voor kalenders die dezelfde energie per band opleveren.
+        """
+        if self._sleutel is None:
+            indeling = {'tabel': self.tabel.tolist(), 'grenzen': self.grenzen.tolist(), 'emmers': self.emmers,
+                        'feestdagen': self.specificatie.get('feestdagen', [])}
+            self._sleutel = hashlib.blake2b(json.dumps(indeling, sort_keys=True, default=str).encode('utf-8'),
+                                            digest_size=16).hexdigest()
+        return self._sleutel
+
+    def _feestdagen_tussen(self, eerste, laatste):
+        if self._feestdag_bron is None:
+            return self._feestdagen
+        jaren = range(int(str(np.datetime64(eerste, 'Y'))), int(str(np.datetime64(laatste, 'Y'))) + 1)
+        return np.array([dag for jaar in jaren for dag in self._feestdag_bron(jaar)], dtype='datetime64[D]')
+
+    def tariefband(self, tijden):
+        """
+        Geef de band van elk tijdstip.
+
+        Per kalenderdag in de data wordt eenmalig de periode en dagsoort bepaald; daarna
+        krijgen alle intervallen hun band met een enkele indexering in de tabel.
+
+        Parameters:
+        tijden (Series of ndarray): Tijdstippen als datetime (de lokale kloktijd telt), of
+                                    als datetime64 array in lokale tijd.
+
+        Returns:
+        ndarray: Band per tijdstip (uint8), een index in import_emmers.
+        """
+        if not isinstance(tijden, np.ndarray):
+            if getattr(tijden.dt, 'tz', None) is not None:
+                tijden = tijden.dt.tz_localize(None)
+            tijden = tijden.to_numpy()
+        kwartieren = np.asarray(tijden).astype('datetime64[ns]', copy=False).view(np.int64) // _NS_PER_KWARTIER
+        if len(kwartieren) == 0:
+            return np.empty(0, dtype=np.uint8)
+
+        dag_nummers, kwartier = np.divmod(kwartieren, KWARTIEREN_PER_DAG)
+        eerste, laatste = int(dag_nummers.min()), int(dag_nummers.max())
+
+        alle_dagen = np.arange(eerste, laatste + 1)
+        dagsoort = (alle_dagen + _WEEKDAG_VERSCHUIVING) % 7
+        feestdagen = self._feestdagen_tussen(np.datetime64(eerste, 'D'), np.datetime64(laatste, 'D')).view(np.int64)
+        dagsoort[np.isin(alle_dagen, feestdagen)] = DAGSOORTEN.index('feestdag')
+        periode = np.searchsorted(self.grenzen, alle_dagen, side='right')
+        dag_basis = periode * _SLOTS + dagsoort * KWARTIEREN_PER_DAG
+
+        return self.tabel.ravel()[dag_basis[dag_nummers - eerste] + kwartier]
+
+    def prijs_vector(self, tarief_dag, tarief_nacht, teruglever_tarief):
+        """
+        Geef de prijs van elke emmer, met een negatief teken voor de export.
+
+        Banden zonder eigen prijs in de kalender krijgen tarief_dag of tarief_nacht
+        (alleen voor banden met die naam), perioden zonder eigen teruglevertarief
+        krijgen teruglever_tarief. Tarieven mogen arrays zijn, bijv. getrokken monsters.
+
+        Returns:
+        ndarray: Prijzen (€/kWh) met de emmers op de laatste as, in de volgorde van emmers.
+        """
+        standaard = {'dag': tarief_dag, 'nacht': tarief_nacht}
+        prijzen = []
+        for periode in self.perioden:
+            for band in self.banden:
+                prijs = periode['prijzen'].get(band, standaard.get(band))
+                if prijs is None:
+                    raise ValueError(f"Geen prijs voor band '{band}' in de tariefkalender.")
+                prijzen.append(prijs)
+        for periode in self.perioden:
+            teruglever = periode['teruglever_tarief']
+            prijzen.append(-(teruglever_tarief if teruglever is None else teruglever))
+        prijzen = np.broadcast_arrays(*(np.asarray(prijs, dtype=np.float64) for prijs in prijzen))
+        return np.stack(prijzen, axis=-1)
+
+    def prijs_per_interval(self, tariefband, tarief_dag, tarief_nacht, teruglever_tarief):
+        """
+        Geef de importprijs en het teruglevertarief van elk interval.
+
+        Returns:
+        tuple: (importprijs, teruglevertarief) per interval als arrays.
+        """
+        prijzen = self.prijs_vector(tarief_dag, tarief_nacht, teruglever_tarief)
+        import_prijzen = prijzen[:self.aantal_banden]
+        export_prijzen = -prijzen[self.aantal_banden:]
+        tariefband = np.asarray(tariefband)
+        return import_prijzen[tariefband], export_prijzen[tariefband // len(self.banden)]
+
+    def energie(self, totaal_import, totaal_export, tariefband):
+        """
+        Tel import en export op per emmer.
+
+        Parameters:
+        totaal_import (ndarray): Geïmporteerde energie per interval in kWh (laatste as is de tijd).
+        totaal_export (ndarray): Geëxporteerde energie per interval in kWh.
+        tariefband (ndarray): Band per interval, zie tariefband().
+
+        Returns:
+        dict: Energie in kWh per naam uit emmers.
+        """
+        tariefband = np.asarray(tariefband)
+        totaal_import = np.asarray(totaal_import, dtype=np.float64)
+        totaal_export = np.asarray(totaal_export, dtype=np.float64)
+        energie = {}
+        for band, naam in enumerate(self.import_emmers):
+            energie[naam] = totaal_import @ (tariefband == band).astype(np.float64)
+        if len(self.perioden) == 1:
+            energie[self.export_emmers[0]] = totaal_export.sum(axis=-1)
+        else:
+            periode = tariefband // len(self.banden)
+            for p, naam in enumerate(self.export_emmers):
+                energie[naam] = totaal_export @ (periode == p).astype(np.float64)
+        return energie
+
+    def prijs(self, energie, tarief_dag, tarief_nacht, teruglever_tarief):
+        """
+        Bereken de kosten van de energie per emmer.
+
+        Parameters:
+        energie (dict): Energie per emmer in kWh (getallen of arrays).
+
+        Returns:
+        float of ndarray: Netto kosten (€).
+        """
+        prijzen = self.prijs_vector(tarief_dag, tarief_nacht, teruglever_tarief)
+        return sum(energie[naam] * prijzen[..., i] for i, naam in enumerate(self.emmers))
+
+
+STANDAARD_KALENDER = TariefKalender()
+
+
+def maak_kalender(kalender=None):
+    """
+    Maak een tariefkalender van een specificatie, een JSON bestand of een bestaande kalender.
+
+    Parameters:
+    kalender (None, dict, str of TariefKalender): None geeft de standaard 7-23 uur regel.
+
+    Returns:
+    TariefKalender: De kalender.
+    """
+    if kalender is None:
+        return STANDAARD_KALENDER
+    if isinstance(kalender, TariefKalender):
+        return kalender
+    if isinstance(kalender, str):
+        with open(kalender, 'r', encoding='utf-8') as f:
+            kalender = json.load(f)
+    return TariefKalender(kalender)
+
+
+def als_tariefband(waarden, kalender=None):
+    """
+    Zet een band per interval om naar een array, ook vanuit het oude is_dagtarief.
+
+    Booleans (True = dagtarief) horen bij de standaardkalender: dag is band 0, nacht band 1.
+
+    Returns:
+    ndarray: Band per interval.
+    """
+    waarden = np.asarray(waarden)
+    if waarden.dtype == np.bool_:
+        if maak_kalender(kalender).banden[:2] != ('dag', 'nacht'):
+            raise ValueError("Dag/nacht booleans passen alleen bij een kalender met de banden dag en nacht.")
+        return np.where(waarden, 0, 1).astype(np.uint8)
+    return waarden
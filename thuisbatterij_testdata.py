@@ -0,0 +1,172 @@
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+import thuisbatterij_data
+
+
+# Verbruik per uur van de dag (relatief, wordt genormaliseerd) per huishoudtype
+PROFIELEN = {
+    'gezin': [0.5, 0.4, 0.4, 0.4, 0.4, 0.5, 0.9, 1.4, 1.2, 0.9, 0.8, 0.8,
+              0.9, 0.8, 0.8, 0.9, 1.1, 1.6, 2.0, 1.9, 1.7, 1.4, 1.0, 0.7],
+    'thuiswerker': [0.5, 0.4, 0.4, 0.4, 0.4, 0.5, 0.8, 1.1, 1.3, 1.3, 1.3, 1.2,
+                    1.4, 1.3, 1.3, 1.3, 1.3, 1.5, 1.8, 1.7, 1.5, 1.2, 0.9, 0.7],
+    'warmtepomp': [0.9, 0.9, 0.9, 0.9, 1.0, 1.1, 1.3, 1.4, 1.2, 1.0, 0.9, 0.9,
+                   0.9, 0.9, 0.9, 1.0, 1.1, 1.4, 1.6, 1.5, 1.4, 1.2, 1.0, 0.9],
+}
+
+# Seizoensinvloed op het verbruik (amplitude rond het gemiddelde, hoogste in januari)
+_SEIZOEN = {'gezin': 0.15, 'thuiswerker': 0.2, 'warmtepomp': 0.6}
+
+# Breedtegraad van Nederland en de jaarlijkse opbrengst per kWp
+_BREEDTEGRAAD = np.radians(52.0)
+_OPBRENGST_PER_KWP = 900.0
+
+# Bewolking per dag: 0.15 + 0.85 * Beta(a, b); het gemiddelde wordt gebruikt voor de kalibratie
+_BEWOLKING = (1.2, 1.0)
+
+# Aantal regels per gegenereerd blok; elk blok heeft een eigen toevalsgenerator
+_BLOK = 500_000
+
+
+def _zonnestand(tijden):
+    """Sinus van de zonshoogte per tijdstip (negatief als de zon onder is)."""
+    dag = tijden.dayofyear.to_numpy()
+    uur = tijden.hour.to_numpy() + tijden.minute.to_numpy() / 60 + tijden.second.to_numpy() / 3600
+    declinatie = np.radians(23.44) * np.sin(2 * np.pi * (284 + dag) / 365)
+    uurhoek = np.radians(15.0 * (uur - 12.5))
+    return (np.sin(_BREEDTEGRAAD) * np.sin(declinatie)
+            + np.cos(_BREEDTEGRAAD) * np.cos(declinatie) * np.cos(uurhoek))
+
+
+def _pv_kalibratie():
+    """Schaalfactor zodat een kWp gemiddeld _OPBRENGST_PER_KWP kWh per jaar oplevert."""
+    uren = pd.date_range('2023-01-01', periods=8760, freq='h')
+    helder = np.clip(_zonnestand(uren + pd.Timedelta(minutes=30)), 0, None) ** 1.2
+    a, b = _BEWOLKING
+    gemiddelde_bewolking = 0.15 + 0.85 * a / (a + b)
+    return _OPBRENGST_PER_KWP / (helder.sum() * gemiddelde_bewolking)
+
+
+def _genereer_blok(tijden, interval, rng, pv_kwp, jaarverbruik, profiel, pv_schaal, bewolking):
+    """Genereer import, export en fasevermogens voor een blok opeenvolgende tijdstippen."""
+    uren = interval / 3600
+
+    # Verbruik: basisprofiel per uur, seizoen, ruis en korte pieken van apparaten
+    vorm = np.asarray(PROFIELEN[profiel], dtype=np.float64)
+    vorm = vorm / vorm.mean()
+    uur = tijden.hour.to_numpy() + tijden.minute.to_numpy() / 60
+    profiel_factor = np.interp(uur, np.arange(25), np.append(vorm, vorm[0]))
+    seizoen = 1 + _SEIZOEN[profiel] * np.cos(2 * np.pi * (tijden.dayofyear.to_numpy() - 15) / 365)
+    verbruik_kw = jaarverbruik / 8760 * profiel_factor * seizoen * rng.lognormal(-0.06, 0.35, len(tijden))
+    pieken = rng.random(len(tijden)) < min(1.0, interval / 1800)
+    verbruik_kw += pieken * rng.uniform(1.0, 2.5, len(tijden))
+
+    # Opwek: zonnestand, bewolking per dag en wisselende bewolking binnen de dag
+    dagnummers = tijden.normalize()
+    dag_bewolking = bewolking(dagnummers)
+    wolken = np.clip(dag_bewolking + rng.normal(0, 0.15, len(tijden)) * (1 - dag_bewolking), 0.05, 1.0)
+    helder = np.clip(_zonnestand(tijden), 0, None) ** 1.2
+    pv_kw = pv_kwp * pv_schaal * helder * wolken
+
+    netto_kw = verbruik_kw - pv_kw
+    import_kwh = np.clip(netto_kw, 0, None) * uren
+    export_kwh = np.clip(-netto_kw, 0, None) * uren
+
+    # Maximaal vermogen per fase, ongelijk verdeeld over de drie fasen
+    verdeling = rng.dirichlet((4, 3, 3), len(tijden))
+    fasen = np.abs(netto_kw)[:, None] * 1000 * verdeling * rng.uniform(1.0, 1.3, (len(tijden), 1))
+    return import_kwh, export_kwh, fasen.astype(np.float32)
+
+
+def genereer_p1_csv(pad, dagen=365, interval=10, pv_kwp=4.0, jaarverbruik=3500.0, profiel='gezin',
+                    start='2024-01-01', seed=0):
+    """
+    Schrijf een realistische, synthetische P1 export met cumulatieve meterstanden.
+
+    Het verbruik volgt een dagprofiel met seizoensinvloed, ruis en korte pieken; de
+    opwek volgt de zonnestand in Nederland met wisselende bewolking per dag. Import en
+    export worden per tariefperiode opgeteld (T1 = dagtarief) en, net als bij een echte
+    meter, op drie decimalen afgerond. Het bestand wordt in blokken geschreven, dus ook
+    meerdere jaren op 10 seconden passen zonder veel geheugen. Met dezelfde parameters
+    en seed ontstaat steeds precies hetzelfde bestand.
+
+    Parameters:
+    pad (str): Doelbestand.
+    dagen (float): Lengte van de reeks in dagen.
+    interval (int): Interval tussen de metingen in seconden.
+    pv_kwp (float): Vermogen van de zonnepanelen in kWp (0 = geen panelen).
+    jaarverbruik (float): Jaarlijks verbruik van het huishouden in kWh.
+    profiel (str): Verbruiksprofiel, een van PROFIELEN.
+    start (str): Eerste tijdstip.
+    seed (int): Startwaarde van de toevalsgenerator, voor reproduceerbare bestanden.
+
+    Returns:
+    int: Aantal geschreven regels.
+    """
+    if profiel not in PROFIELEN:
+        raise ValueError(f"Onbekend profiel '{profiel}', kies uit: {', '.join(PROFIELEN)}")
+
+    aantal = int(round(dagen * 86400 / interval))
+    begin = pd.Timestamp(start)
+    pv_schaal = _pv_kalibratie()
+
+    # Bewolking per kalenderdag, vooraf getrokken zodat een dag over een blokgrens dezelfde bewolking houdt
+    eerste_dag = begin.normalize()
+    a, b = _BEWOLKING
+    bewolking_per_dag = 0.15 + 0.85 * np.random.default_rng([seed, 0]).beta(a, b, int(np.ceil(dagen)) + 2)
+
+    def bewolking(dagnummers):
+        return bewolking_per_dag[((dagnummers - eerste_dag) // pd.Timedelta(days=1)).to_numpy()]
+
+    standen = np.array([12345.678, 9876.543, 2345.678, 1234.567])
+    kolommen = ['time', *thuisbatterij_data.METER_KOLOMMEN, *thuisbatterij_data.FASE_KOLOMMEN]
+
+    with open(pad, 'w', encoding='utf-8', newline='') as f:
+        for nummer, blok_start in enumerate(range(0, aantal, _BLOK), start=1):
+            lengte = min(_BLOK, aantal - blok_start)
+            rng = np.random.default_rng([seed, nummer])
+            tijden = begin + pd.to_timedelta(np.arange(blok_start, blok_start + lengte) * interval, unit='s')
+            import_kwh, export_kwh, fasen = _genereer_blok(
+                tijden, interval, rng, pv_kwp, jaarverbruik, profiel, pv_schaal, bewolking
+            )
+            is_dag = thuisbatterij_data.bepaal_dagtarief(pd.Series(tijden))
+            stappen = np.column_stack((
+                np.where(is_dag, import_kwh, 0.0), np.where(is_dag, 0.0, import_kwh),
+                np.where(is_dag, export_kwh, 0.0), np.where(is_dag, 0.0, export_kwh),
+            ))
+            meterstanden = standen + np.cumsum(stappen, axis=0)
+            standen = meterstanden[-1]
+
+            # Een meter telt in hele Wh; afronden vooraf is ook veel sneller dan een float_format
+            blok = pd.DataFrame(np.round(meterstanden, 3), columns=list(thuisbatterij_data.METER_KOLOMMEN))
+            blok.insert(0, 'time', tijden)
+            for i, kolom in enumerate(thuisbatterij_data.FASE_KOLOMMEN):
+                blok[kolom] = np.rint(fasen[:, i]).astype(np.int32)
+            blok[kolommen].to_csv(f, header=blok_start == 0, index=False, date_format='%Y-%m-%d %H:%M:%S')
+    return aantal
+
+
+def main(argumenten=None):
+    """Command line interface voor het genereren van een synthetische P1 export."""
+    parser = argparse.ArgumentParser(description="Genereer een synthetische P1 export met cumulatieve meterstanden.")
+    parser.add_argument('pad', help="doelbestand (CSV)")
+    parser.add_argument('--dagen', type=float, default=365, help="lengte in dagen")
+    parser.add_argument('--interval', type=int, default=10, help="interval in seconden")
+    parser.add_argument('--pv', type=float, default=4.0, help="zonnepanelen in kWp")
+    parser.add_argument('--verbruik', type=float, default=3500.0, help="jaarverbruik in kWh")
+    parser.add_argument('--profiel', choices=list(PROFIELEN), default='gezin', help="verbruiksprofiel")
+    parser.add_argument('--start', default='2024-01-01', help="eerste tijdstip")
+    parser.add_argument('--seed', type=int, default=0, help="startwaarde van de toevalsgenerator")
+    args = parser.parse_args(argumenten)
+
+    aantal = genereer_p1_csv(args.pad, args.dagen, args.interval, args.pv, args.verbruik,
+                             args.profiel, args.start, args.seed)
+    print(f"{aantal} regels geschreven naar: {args.pad}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
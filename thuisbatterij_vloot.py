@@ -0,0 +1,204 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from thuisbatterij_calculator import ThuisbatterijCalculator
+
+
+# Parameters van de calculator die per vloot-run ingesteld kunnen worden
+INSTELLINGEN = (
+    'tarief_dag', 'tarief_nacht', 'teruglever_tarief', 'tarief_kalender',
+    'batterij_kosten_per_kwh', 'batterij_levensduur', 'laad_efficiëntie',
+    'laadvermogen', 'ontlaadvermogen', 'c_rate', 'standby_vermogen', 'fase_limiet', 'batterij_fase',
+    'simulatie_backend', 'cache_map', 'tijd_formaat', 'simulatie_interval',
+)
+
+
+def verzamel_bestanden(bron):
+    """
+    Bepaal welke CSV bestanden bij de vloot horen.
+
+    Parameters:
+    bron (str): Een map met CSV bestanden, of een manifest (tekstbestand met een pad per
+                regel; relatieve paden zijn relatief aan het manifest, '#' begint commentaar).
+
+    Returns:
+    list: Paden naar de CSV bestanden.
+    """
+    if os.path.isdir(bron):
+        return sorted(
+            os.path.join(bron, naam) for naam in os.listdir(bron) if naam.lower().endswith('.csv')
+        )
+
+    basis = os.path.dirname(os.path.abspath(bron))
+    bestanden = []
+    with open(bron, 'r', encoding='utf-8') as f:
+        for regel in f:
+            regel = regel.split('#', 1)[0].strip()
+            if regel:
+                bestanden.append(regel if os.path.isabs(regel) else os.path.join(basis, regel))
+    return bestanden
+
+
+def _simuleer_huishouden(csv_file, capaciteiten, instellingen):
+    """Simuleer alle capaciteiten voor een enkel huishouden en geef de tabelrijen terug."""
+    huishouden = os.path.splitext(os.path.basename(csv_file))[0]
+    calculator = ThuisbatterijCalculator(csv_file)
+    for naam, waarde in instellingen.items():
+        setattr(calculator, naam, waarde)
+
+    # De calculator meldt elke stap met print, dat is per huishouden alleen ruis
+    uitvoer = io.StringIO()
+    with contextlib.redirect_stdout(uitvoer):
+        geladen = calculator.laad_data()
+        resultaten = calculator.simuleer_batterijen(capaciteiten, detailniveau='samenvatting') if geladen else {}
+
+    if not geladen:
+        melding = uitvoer.getvalue().strip().splitlines()
+        return [{'huishouden': huishouden, 'bestand': csv_file, 'fout': melding[-1] if melding else 'onbekende fout'}]
+
+    # Beste capaciteit: de kortste terugverdientijd binnen de levensduur van de batterij
+    rendabel = [r for r in resultaten.values() if r['terugverdientijd'] <= calculator.batterij_levensduur]
+    beste = min(rendabel, key=lambda r: r['terugverdientijd'])['capaciteit'] if rendabel else None
+
+    rijen = []
+    for capaciteit, resultaat in resultaten.items():
+        rijen.append({
+            'huishouden': huishouden,
+            'bestand': csv_file,
+            'datapunten': len(calculator.data),
+            'capaciteit': capaciteit,
+            'jaarlijkse_besparing': resultaat['jaarlijkse_besparing'],
+            'batterij_investering': resultaat['batterij_investering'],
+            'terugverdientijd': resultaat['terugverdientijd'],
+            'totale_besparing_levensduur': resultaat['totale_besparing_levensduur'],
+            'beste': capaciteit == beste,
+            'fout': None,
+        })
+    return rijen
+
+
+def _simuleer_batch(bestanden, capaciteiten, instellingen):
+    """Simuleer een groep huishoudens in een worker, zodat de overhead per taak wordt gedeeld."""
+    rijen = []
+    for csv_file in bestanden:
+        try:
+            rijen.extend(_simuleer_huishouden(csv_file, capaciteiten, instellingen))
+        except Exception as e:
+            rijen.append({'huishouden': os.path.splitext(os.path.basename(csv_file))[0], 'bestand': csv_file, 'fout': str(e)})
+    return len(bestanden), rijen
+
+
+def simuleer_vloot(bron, capaciteiten=[3, 5, 7, 10, 15, 20], uitvoer=None, max_workers=None,
+                   batchgrootte=8, instellingen=None, toon_voortgang=True):
+    """
+    Simuleer een vloot van huishoudens vanuit een map of manifest met P1 exports.
+
+    Huishoudens worden in groepjes over een pool van processen verdeeld. Per huishouden
+    worden alle capaciteiten in een enkele doorloop gesimuleerd.
+
+    Parameters:
+    bron (str): Map met CSV bestanden of een manifest (zie verzamel_bestanden).
+    capaciteiten (list): Te simuleren batterijcapaciteiten in kWh.
+    uitvoer (str, optional): Pad van het CSV bestand met de samengevoegde resultaten.
+    max_workers (int, optional): Aantal processen, standaard het aantal CPU's.
+    batchgrootte (int): Aantal huishoudens per taak.
+    instellingen (dict, optional): Calculator parameters, bijv. {'tarief_dag': 0.28}.
+    toon_voortgang (bool): Toon voortgang en doorvoer (huishoudens per seconde).
+
+    Returns:
+    DataFrame: Een rij per huishouden en capaciteit, met 'beste' voor de beste capaciteit.
+    """
+    instellingen = dict(instellingen or {})
+    onbekend = set(instellingen) - set(INSTELLINGEN)
+    if onbekend:
+        raise ValueError(f"Onbekende instellingen: {', '.join(sorted(onbekend))}")
+
+    bestanden = verzamel_bestanden(bron)
+    capaciteiten = list(capaciteiten)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    batches = [bestanden[i:i + batchgrootte] for i in range(0, len(bestanden), batchgrootte)]
+
+    rijen = []
+    klaar = 0
+    start = time.perf_counter()
+
+    def meld_voortgang():
+        if toon_voortgang:
+            verstreken = time.perf_counter() - start
+            snelheid = klaar / verstreken if verstreken > 0 else 0.0
+            print(f"\r{klaar}/{len(bestanden)} huishoudens ({snelheid:.1f} huishoudens/s)", end='', flush=True)
+
+    if max_workers == 1 or len(batches) <= 1:
+        for batch in batches:
+            aantal, batch_rijen = _simuleer_batch(batch, capaciteiten, instellingen)
+            klaar += aantal
+            rijen.extend(batch_rijen)
+            meld_voortgang()
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            taken = [pool.submit(_simuleer_batch, batch, capaciteiten, instellingen) for batch in batches]
+            for taak in as_completed(taken):
+                aantal, batch_rijen = taak.result()
+                klaar += aantal
+                rijen.extend(batch_rijen)
+                meld_voortgang()
+
+    if toon_voortgang:
+        print()
+
+    resultaten = pd.DataFrame(rijen)
+    if not resultaten.empty:
+        resultaten = resultaten.sort_values(['huishouden', 'capaciteit'], na_position='last', ignore_index=True)
+    if uitvoer:
+        resultaten.to_csv(uitvoer, index=False)
+        print(f"Resultaten van {len(bestanden)} huishoudens opgeslagen in: {uitvoer}")
+    return resultaten
+
+
+def main(argumenten=None):
+    """Command line interface voor het simuleren van een vloot huishoudens."""
+    parser = argparse.ArgumentParser(description="Simuleer thuisbatterijen voor een map of manifest met P1 exports.")
+    parser.add_argument('bron', help="map met CSV bestanden of manifest met een pad per regel")
+    parser.add_argument('-o', '--uitvoer', default='vloot_resultaten.csv', help="pad van de resultatentabel")
+    parser.add_argument('-c', '--capaciteiten', type=float, nargs='+', default=[3, 5, 7, 10, 15, 20],
+                        help="te simuleren capaciteiten in kWh")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="aantal processen")
+    parser.add_argument('--batchgrootte', type=int, default=8, help="aantal huishoudens per taak")
+    parser.add_argument('--tarief-dag', type=float, help="dagtarief (€/kWh)")
+    parser.add_argument('--tarief-nacht', type=float, help="nachttarief (€/kWh)")
+    parser.add_argument('--teruglever-tarief', type=float, help="teruglevertarief (€/kWh)")
+    parser.add_argument('--kalender', help="tariefkalender als JSON bestand, standaard dag 7-23 uur")
+    parser.add_argument('--batterij-kosten', type=float, help="batterijkosten per kWh (€)")
+    parser.add_argument('--interval', help="simuleer op een grover interval, bijv. 5min of 15min")
+    args = parser.parse_args(argumenten)
+
+    instellingen = {
+        'tarief_dag': args.tarief_dag,
+        'tarief_nacht': args.tarief_nacht,
+        'teruglever_tarief': args.teruglever_tarief,
+        'tarief_kalender': args.kalender,
+        'batterij_kosten_per_kwh': args.batterij_kosten,
+        'simulatie_interval': args.interval,
+    }
+    instellingen = {naam: waarde for naam, waarde in instellingen.items() if waarde is not None}
+
+    resultaten = simuleer_vloot(
+        args.bron, args.capaciteiten, args.uitvoer, args.workers, args.batchgrootte, instellingen
+    )
+    if 'fout' in resultaten and resultaten['fout'].notna().any():
+        mislukt = resultaten.loc[resultaten['fout'].notna(), 'huishouden'].nunique()
+        print(f"Let op: {mislukt} huishoudens konden niet worden gesimuleerd, zie de kolom 'fout'.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())